@@ -0,0 +1,63 @@
+"""
+Measure the cost of building a wide select (150 columns) and of
+chaining methods on it (each call clones the select).
+"""
+
+from time import perf_counter
+
+from nagra import Schema, Table, Transaction
+from nagra.select import Select
+from nagra.sexpr import parse_cache
+from nagra.utils import pretty_nb
+
+
+NB_COLS = 150
+ROUNDS = 1_000
+
+
+def bench(title, fn):
+    start = perf_counter()
+    for _ in range(ROUNDS):
+        fn()
+    delta = (perf_counter() - start) / ROUNDS
+    print(f"{title:<35} {pretty_nb(delta)}s / call")
+
+
+def run():
+    schema = Schema()
+    columns = {f"col_{i}": "int" for i in range(NB_COLS)}
+    wide = Table("wide", columns=columns, natural_key=["col_0"], schema=schema)
+    names = list(columns)
+
+    with Transaction("sqlite://"):
+        select = wide.select(*names)
+
+        def build_no_cache():
+            parse_cache.clear()
+            wide.select(*names)
+
+        bench("build (empty parse cache)", build_no_cache)
+        bench("build", lambda: wide.select(*names))
+
+        # What clone did before sharing columns: create a new select
+        # and evaluate every column again
+        bench(
+            "re-evaluate columns",
+            lambda: Select(wide, *names, trn=select.trn, env=select.env.clone()),
+        )
+        bench("clone", select.clone)
+        bench(
+            "where + orderby + limit",
+            lambda: select.where("(= col_1 {})").orderby("col_2").limit(10),
+        )
+
+
+if __name__ == "__main__":
+    run()
+
+    # Example output
+    # build (empty parse cache)           1.05ms / call
+    # build                               381.70us / call
+    # re-evaluate columns                 450.67us / call
+    # clone                               4.80us / call
+    # where + orderby + limit             19.68us / call
@@ -0,0 +1,81 @@
+"""
+Compare a repeated aggregation on a sqlite table with and without
+`Select.cached`, and the cost of invalidation by writes.
+"""
+
+from time import perf_counter
+
+from nagra import Transaction, Schema
+from nagra.cache import result_cache
+from nagra.utils import pretty_nb
+
+
+schema_toml = """
+[city]
+natural_key = ["name"]
+[city.columns]
+name = "varchar"
+country = "varchar"
+
+[temperature]
+natural_key = ["city", "step"]
+[temperature.columns]
+city = "bigint"
+step = "int"
+value = "float"
+[temperature.foreign_keys]
+city = "city"
+"""
+
+ROUNDS = 1_000
+
+
+def bench(title, fn):
+    start = perf_counter()
+    for _ in range(ROUNDS):
+        fn()
+    delta = (perf_counter() - start) / ROUNDS
+    print(f"{title:<40} {pretty_nb(delta)}s / call")
+
+
+def run():
+    schema = Schema.from_toml(schema_toml)
+    city = schema.get("city")
+    temperature = schema.get("temperature")
+    with Transaction("sqlite://") as trn:
+        schema.create_tables()
+        city.upsert("name", "country").executemany(
+            (f"city-{i}", f"country-{i % 10}") for i in range(100)
+        )
+        temperature.upsert("city.name", "step", "value").executemany(
+            (f"city-{i % 100}", i // 100, i % 37) for i in range(100_000)
+        )
+        trn.commit()
+
+        select = (
+            temperature.select("city.country", "(avg value)")
+            .where("(> value {})")
+            .orderby("city.country")
+        )
+        bench("select.execute", lambda: select.execute(10).fetchall())
+
+        cached = select.cached(ttl=60)
+        bench("select.cached().execute", lambda: cached.execute(10).fetchall())
+
+        def with_write():
+            city.upsert("name", "country").execute("city-0", "country-0")
+            trn.commit()
+            return cached.execute(10).fetchall()
+
+        bench("write + select.cached().execute", with_write)
+        print(result_cache.stats())
+
+
+if __name__ == "__main__":
+    run()
+
+    # Example output
+    # select.execute                           37.71ms / call
+    # select.cached().execute                  53.39us / call
+    # write + select.cached().execute          38.69ms / call
+    # {'hits': 999, 'misses': 1001, 'evictions': 0, 'invalidations': 1000, 'size': 1, 'bytes': 1500, 'max_bytes': 67108864}
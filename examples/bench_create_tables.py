@@ -0,0 +1,46 @@
+"""
+Measure `Schema.create_tables` on a database with many tables: first
+call, repeated call (fingerprint lookup) and forced call (full
+introspection). Usage: `python bench_create_tables.py [dsn]`
+(defaults to an in-memory sqlite database).
+"""
+
+import sys
+from time import perf_counter
+
+from nagra import Transaction, Schema, Table
+from nagra.utils import pretty_nb
+
+NB_TABLES = 500
+
+
+def timed(title, fn):
+    start = perf_counter()
+    fn()
+    delta = perf_counter() - start
+    print(f"{title:<40} {pretty_nb(delta)}s")
+
+
+def run(dsn):
+    schema = Schema()
+    for i in range(NB_TABLES):
+        Table(
+            f"bench_{i}",
+            columns={"name": "varchar", "parent": "bigint", "value": "float"},
+            natural_key=["name"],
+            foreign_keys={"parent": f"bench_{max(i - 1, 0)}"},
+            schema=schema,
+        )
+    with Transaction(dsn, rollback=True):
+        timed(f"create_tables ({NB_TABLES} tables)", schema.create_tables)
+        timed("create_tables (unchanged)", schema.create_tables)
+        timed("create_tables (forced)", lambda: schema.create_tables(force=True))
+
+
+if __name__ == "__main__":
+    run(sys.argv[1] if len(sys.argv) > 1 else "sqlite://")
+
+    # Example output (sqlite)
+    # create_tables (500 tables)               1.48s
+    # create_tables (unchanged)                3.61ms
+    # create_tables (forced)                   15.83ms
@@ -0,0 +1,82 @@
+"""
+Measure the import time of nagra (best of several cold imports, each
+in a fresh interpreter) and fail if it exceeds the budget or if one of
+the lazily imported dependencies is loaded. Usage: `python
+bench_import.py [budget in ms]` (defaults to $NAGRA_IMPORT_BUDGET or
+150ms).
+"""
+
+import os
+import subprocess
+import sys
+
+ROUNDS = 5
+# Only imported when needed (cli, toml schemas, templates, dataframes)
+LAZY_MODULES = [
+    "importlib.metadata",
+    "jinja2",
+    "numpy",
+    "pandas",
+    "polars",
+    "rich",
+    "toml",
+]
+CHECK_MODULES = (
+    "import sys, nagra;"
+    f"print(*(m for m in {LAZY_MODULES!r} if m in sys.modules))"
+)
+
+
+def import_time(module):
+    # Return the cumulative import time of `module` in microseconds
+    # and the top level modules it imports
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    children = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not name.startswith("  "):
+            # Top level import, children are listed before it
+            if name.strip() == module:
+                return int(cumulative), sorted(children, reverse=True)
+            children = []
+        elif not name.startswith("    "):
+            children.append((int(cumulative), name.strip()))
+    raise RuntimeError(f"{module} not found in import times")
+
+
+def run(budget_ms):
+    timings = [import_time("nagra") for _ in range(ROUNDS)]
+    total, children = min(timings)
+    print(f"import nagra (best of {ROUNDS}): {total / 1000:.2f}ms")
+    for cumulative, name in children[:5]:
+        print(f"  {name:<30} {cumulative / 1000:.2f}ms")
+
+    loaded = subprocess.run(
+        [sys.executable, "-c", CHECK_MODULES],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout.split()
+    if loaded:
+        sys.exit(f"Modules imported eagerly: {', '.join(loaded)}")
+    if total / 1000 > budget_ms:
+        sys.exit(f"Import time over budget ({budget_ms}ms)")
+
+
+if __name__ == "__main__":
+    default = os.environ.get("NAGRA_IMPORT_BUDGET", 150)
+    run(float(sys.argv[1] if len(sys.argv) > 1 else default))
+
+    # Example output
+    # import nagra (best of 5): 49.99ms
+    #   nagra.statement                32.44ms
+    #   nagra.schema                   10.33ms
+    #   nagra.table                    5.24ms
+    #   nagra.view                     0.17ms
@@ -0,0 +1,86 @@
+"""
+Compare lookups on a foreign key column and a partial expression
+index with and without declared indexes (`indexes` and `index_fk` in
+table definitions). Usage: `python bench_indexes.py [dsn]` (defaults
+to an in-memory sqlite database).
+"""
+
+import sys
+from time import perf_counter
+
+from nagra import Schema, Transaction
+from nagra.utils import pretty_nb
+
+
+schema_toml = """
+[station]
+natural_key = ["name"]
+[station.columns]
+name = "varchar"
+
+[measure]
+natural_key = ["step", "station"]
+{options}
+[measure.columns]
+step = "int"
+station = "bigint"
+value = "float"
+[measure.foreign_keys]
+station = "station"
+"""
+
+indexes = """
+index_fk = true
+[measure.indexes.measure_abs_idx]
+columns = ["(abs value)"]
+where = "(< value 0)"
+"""
+
+ROUNDS = 200
+NB_STATIONS = 1000
+
+
+def bench(title, select, args):
+    start = perf_counter()
+    for i in range(ROUNDS):
+        select.execute(*args(i)).fetchall()
+    delta = (perf_counter() - start) / ROUNDS
+    print(f"{title:<40} {pretty_nb(delta)}s / query")
+
+
+def run(dsn, options):
+    schema = Schema.from_toml(schema_toml.format(options=options))
+    station = schema.get("station")
+    measure = schema.get("measure")
+    with Transaction(dsn, rollback=True):
+        schema.create_tables()
+        station.upsert("name").executemany(
+            [(f"station-{i}",) for i in range(NB_STATIONS)]
+        )
+        measure.upsert("step", "station", "value").executemany(
+            (i // NB_STATIONS, 1 + i % NB_STATIONS, i - 100_000.0)
+            for i in range(200_000)
+        )
+        label = "indexed" if options else "no index"
+        bench(
+            f"fk lookup ({label})",
+            measure.select("value").where("(= station {})"),
+            lambda i: (1 + i % NB_STATIONS,),
+        )
+        bench(
+            f"partial expression ({label})",
+            measure.select("step").where("(< value 0)", "(= (abs value) {})"),
+            lambda i: (1.0 + i * 37 % 99_999,),
+        )
+
+
+if __name__ == "__main__":
+    dsn = sys.argv[1] if len(sys.argv) > 1 else "sqlite://"
+    run(dsn, "")
+    run(dsn, indexes)
+
+    # Example output (sqlite)
+    # fk lookup (no index)                     11.08ms / query
+    # partial expression (no index)            16.53ms / query
+    # fk lookup (indexed)                      420.51us / query
+    # partial expression (indexed)             9.11us / query
@@ -0,0 +1,57 @@
+"""
+Measure join resolution on deep dotted paths (like
+`parent.parent.parent.name`), the joins are resolved when a select
+is built and when its types are evaluated.
+"""
+
+from time import perf_counter
+
+from nagra import Schema, Table
+from nagra.utils import pretty_nb
+
+
+ROUNDS = 10_000
+DEPTH = 8
+
+
+def bench(title, fn):
+    start = perf_counter()
+    for _ in range(ROUNDS):
+        fn()
+    delta = (perf_counter() - start) / ROUNDS
+    print(f"{title:<35} {pretty_nb(delta)}s / call")
+
+
+def run():
+    schema = Schema()
+    person = Table(
+        "person",
+        columns={"name": "varchar", "parent": "bigint"},
+        foreign_keys={"parent": "person"},
+        natural_key=["name"],
+        schema=schema,
+    )
+    path = ("parent",) * DEPTH
+    column = ".".join(path) + ".name"
+    select = person.select(column)
+
+    def join_no_cache():
+        schema._join_paths.clear()
+        list(person.join(select.env))
+
+    # Equivalent to the previous lru_cache on join_on, that never hit
+    # across queries (it was keyed on the env of the query)
+    bench(f"join, depth {DEPTH} (no cache)", join_no_cache)
+    bench(f"join, depth {DEPTH}", lambda: list(person.join(select.env)))
+    bench("dtypes", select.dtypes)
+    bench("select", lambda: person.select(column).stm())
+
+
+if __name__ == "__main__":
+    run()
+
+    # Example output
+    # join, depth 8 (no cache)            14.66us / call
+    # join, depth 8                       7.06us / call
+    # dtypes                              8.67us / call
+    # select                              28.95us / call
@@ -0,0 +1,98 @@
+"""
+Compare query plans and timings of the joins generated by nagra
+(join elimination and inner joins on required foreign keys) with the
+previous form (a left join for every path). Needs a postgresql
+database, pass its dsn as first argument (default:
+postgresql:///nagra).
+"""
+
+import sys
+from datetime import datetime, timedelta
+from time import perf_counter
+
+from nagra import Schema, Transaction
+from nagra.utils import pretty_nb
+
+
+schema_toml = """
+[country]
+natural_key = ["name"]
+[country.columns]
+name = "varchar"
+
+[city]
+natural_key = ["name"]
+not_null = ["country"]
+[city.columns]
+name = "varchar"
+country = "bigint"
+[city.foreign_keys]
+country = "country"
+
+[temperature]
+natural_key = ["city", "timestamp"]
+[temperature.columns]
+city = "bigint"
+timestamp = "timestamp"
+value = "float"
+[temperature.foreign_keys]
+city = "city"
+"""
+
+ROUNDS = 20
+
+
+def left_joins(stm):
+    # Previous behaviour: every join is a left join
+    return stm.replace("INNER JOIN", "LEFT JOIN")
+
+
+def bench(title, sql, trn):
+    plan = trn.execute("EXPLAIN ANALYZE " + sql).fetchall()
+    start = perf_counter()
+    for _ in range(ROUNDS):
+        trn.execute(sql).fetchall()
+    delta = (perf_counter() - start) / ROUNDS
+    print(f"-- {title}: {pretty_nb(delta)}s / query")
+    for (line,) in plan:
+        print("  ", line)
+
+
+def run(dsn):
+    schema = Schema.from_toml(schema_toml)
+    country = schema.get("country")
+    city = schema.get("city")
+    temperature = schema.get("temperature")
+
+    with Transaction(dsn, rollback=True) as trn:
+        schema.create_tables()
+        country.upsert("name").executemany([(f"country-{i}",) for i in range(100)])
+        city.upsert("name", "country.name").executemany(
+            [(f"city-{i}", f"country-{i % 100}") for i in range(1000)]
+        )
+        start = datetime(2024, 1, 1)
+        temperature.upsert("city", "timestamp", "value").executemany(
+            (1 + i % 1000, start + timedelta(hours=i // 1000), i)
+            for i in range(200_000)
+        )
+        trn.execute("ANALYZE")
+
+        # Inner joins: temperature.city (natural key) and city.country
+        # (not null) are required
+        select = temperature.select("city.country.name", "(avg value)")
+        bench("inner joins", select.stm(), trn)
+        bench("left joins", left_joins(select.stm()), trn)
+
+        # Join elimination: city.id is temperature.city
+        select = temperature.select("city.id", "(max value)")
+        bench("join eliminated", select.stm(), trn)
+        sql = (
+            'SELECT "city_0"."id", max("temperature"."value") FROM "temperature" '
+            'LEFT JOIN "city" as "city_0" ON ("city_0"."id" = "temperature"."city") '
+            'GROUP BY "city_0"."id"'
+        )
+        bench("with join", sql, trn)
+
+
+if __name__ == "__main__":
+    run(sys.argv[1] if len(sys.argv) > 1 else "postgresql:///nagra")
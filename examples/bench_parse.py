@@ -0,0 +1,56 @@
+"""
+Measure s-expression parsing throughput: shlex based tokenizer
+(previous implementation), current tokenizer and parse cache.
+"""
+
+import shlex
+from time import perf_counter
+
+from nagra.sexpr import AST, Token, scan
+from nagra.utils import pretty_nb
+
+
+ROUNDS = 20_000
+EXPRESSIONS = [
+    "name",
+    "parent.parent.name",
+    "(= parent.name {})",
+    "(and (>= timestamp {}) (< timestamp {}) (in city 'Brussels' 'Paris'))",
+    "(date_bin '5 days' timestamp '2025-01-01')",
+]
+
+
+def shlex_parse(expr):
+    lexer = shlex.shlex(expr)
+    lexer.wordchars += ".!=<>:{}-|"
+    prev_tk = None
+    tokens = []
+    for value in lexer:
+        prev_tk = Token.from_value(value, prev_tk)
+        tokens.append(prev_tk)
+    res = scan(tokens)[0]
+    return AST([res] if isinstance(res, Token) else res)
+
+
+def bench(title, fn):
+    start = perf_counter()
+    for _ in range(ROUNDS):
+        for expr in EXPRESSIONS:
+            fn(expr)
+    delta = (perf_counter() - start) / (ROUNDS * len(EXPRESSIONS))
+    print(f"{title:<20} {pretty_nb(delta)}s / expression")
+
+
+def run():
+    bench("shlex", shlex_parse)
+    bench("tokenizer", AST._parse)
+    bench("parse cache", AST.parse)
+
+
+if __name__ == "__main__":
+    run()
+
+    # Example output
+    # shlex                50.48us / expression
+    # tokenizer            16.77us / expression
+    # parse cache          724.20ns / expression
@@ -0,0 +1,82 @@
+"""
+Compare the rendering throughput of the jinja templates against the
+python emitters (see `nagra.emitters`) used by `Statement`.
+"""
+
+from time import perf_counter
+
+from nagra.emitters import EMITTERS
+from nagra.utils import pretty_nb, template
+
+
+ROUNDS = 20_000
+JOINS = [
+    ("org", "org_0", "person", "id", "org", "LEFT"),
+    ("country", "country_1", "org_0", "id", "country", "LEFT"),
+]
+STATEMENTS = {
+    "select": dict(
+        table="person",
+        columns=['"person"."name"', '"org_0"."name"', '"country_1"."name"'],
+        joins=JOINS,
+        conditions=['"person"."name" = %s'],
+        limit=10,
+        offset=None,
+        groupby=[],
+        orderby=['"person"."name" asc'],
+        distinct_on=[],
+        distinct=False,
+    ),
+    "upsert": dict(
+        table="person",
+        columns={"name": None, "org": None, "parent": None},
+        conflict_key=["name"],
+        do_update=True,
+        returning=["id"],
+        set_identity=False,
+    ),
+    "update": dict(
+        table="person",
+        columns={"id": None, "name": None, "org": None},
+        condition_key=["id"],
+        returning=["id"],
+    ),
+    "delete": dict(table="person", conditions=['"person"."name" = %s']),
+    "delete-with-join": dict(
+        table="person", joins=JOINS, conditions=['"country_1"."name" = %s']
+    ),
+}
+
+
+def bench(fn):
+    start = perf_counter()
+    for _ in range(ROUNDS):
+        fn()
+    return (perf_counter() - start) / ROUNDS
+
+
+def run():
+    for flavor in ("postgresql", "sqlite", "mssql"):
+        for name, params in STATEMENTS.items():
+            key = f"{flavor}/{name}"
+            tpl = template(f"{key}.sql")
+            emitter = EMITTERS[key]
+            assert emitter(**params) == tpl.render(**params, _all_params=params)
+            jinja = bench(lambda: tpl.render(**params, _all_params=params))
+            python = bench(lambda: emitter(**params))
+            print(
+                f"{key:<30} jinja {pretty_nb(jinja)}s"
+                f"  emitter {pretty_nb(python)}s  (x{jinja / python:.1f})"
+            )
+
+
+if __name__ == "__main__":
+    run()
+
+    # Example output
+    # postgresql/select              jinja 33.00us  emitter 5.82us  (x5.7)
+    # postgresql/upsert              jinja 66.67us  emitter 12.46us  (x5.4)
+    # postgresql/update              jinja 39.75us  emitter 6.25us  (x6.4)
+    # postgresql/delete              jinja 21.85us  emitter 1.62us  (x13.5)
+    # postgresql/delete-with-join    jinja 25.64us  emitter 2.93us  (x8.8)
+    # ...
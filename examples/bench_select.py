@@ -0,0 +1,74 @@
+"""
+Measure the overhead of `Select.execute()` against a trivial sqlite
+table, with and without compiled statement memoization.
+"""
+
+from time import perf_counter
+
+from nagra import Transaction, Schema
+from nagra.statement import stm_cache
+from nagra.utils import pretty_nb
+
+
+schema_toml = """
+[city]
+natural_key = ["name"]
+[city.columns]
+name = "varchar"
+country = "varchar"
+"""
+
+ROUNDS = 10_000
+
+
+def bench(title, fn):
+    start = perf_counter()
+    for _ in range(ROUNDS):
+        fn()
+    delta = (perf_counter() - start) / ROUNDS
+    print(f"{title:<40} {pretty_nb(delta)}s / call")
+
+
+def run():
+    schema = Schema.from_toml(schema_toml)
+    city = schema.get("city")
+    with Transaction("sqlite://"):
+        schema.create_tables()
+        city.upsert("name", "country").execute("Brussels", "Belgium")
+
+        select = city.select("name").where("(= country {})").orderby("name")
+        # Baseline: raw query on the same connection
+        sql = select.stm()
+        trn = Transaction.current()
+        bench("raw sql", lambda: trn.execute(sql, ("Belgium",)).fetchall())
+
+        # Memoized on the select instance
+        bench(
+            "select.execute (same instance)",
+            lambda: select.execute("Belgium").fetchall(),
+        )
+
+        # Statement shared across instances with the same shape
+        def new_select():
+            slct = city.select("name").where("(= country {})").orderby("name")
+            return slct.execute("Belgium").fetchall()
+
+        bench("select.execute (new instance)", new_select)
+
+        # No memoization, statement is compiled on each call
+        def no_cache():
+            return trn.execute(select._compile(), ("Belgium",)).fetchall()
+
+        bench("select.execute (compiled each time)", no_cache)
+        print(stm_cache.stats())
+
+
+if __name__ == "__main__":
+    run()
+
+    # Example output
+    # raw sql                                  5.76us / call
+    # select.execute (same instance)           6.70us / call
+    # select.execute (new instance)            152.30us / call
+    # select.execute (compiled each time)      65.87us / call
+    # {'hits': 10000, 'misses': 2, 'size': 2, 'maxsize': 2048}
@@ -1,5 +1,3 @@
-from importlib.metadata import version
-
 from .statement import Statement
 from .schema import Schema
 from .table import Table
@@ -7,4 +5,11 @@ from .view import View
 from .transaction import Transaction
 
 
-__version__ = version("nagra")
+def __getattr__(name):
+    # importlib.metadata is slow to import, the version is resolved
+    # on first access
+    if name == "__version__":
+        from importlib.metadata import version
+
+        return version("nagra")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,359 @@
+import json
+import os
+import sys
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from hashlib import sha256
+from pathlib import Path
+from time import monotonic
+from typing import Callable, Iterable, Optional, TYPE_CHECKING
+from uuid import uuid4
+
+from nagra.exceptions import ValidationError
+
+if TYPE_CHECKING:
+    from nagra.select import Select
+    from nagra.table import Table
+    from nagra.transaction import Transaction
+    from pandas import DataFrame
+    from polars import LazyFrame
+
+
+class ResultCache:
+    """
+    Thread-safe cache of query results (see `Select.cached`). Entries
+    are keyed by database, statement and arguments and are evicted
+    in least recently used order once the estimated size of the
+    cached rows exceeds `max_bytes`. Each entry records the tables
+    read by the query, `ResultCache.invalidate` drops the entries
+    depending on a table and bumps its generation: results read
+    before an invalidation (see `ResultCache.generation`) are not
+    stored.
+
+    Results read by a transaction that started before a commit of
+    another one (under an isolation level based on snapshots, like
+    repeatable read) but executed after the invalidation can still be
+    outdated, use a `ttl` to bound their lifetime.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        # key -> (rows, tables, expires, nbytes)
+        self.data = OrderedDict()
+        # table name -> keys of entries reading it
+        self.by_table: dict[str, set] = {}
+        # table name -> number of invalidations
+        self.generations: dict[str, int] = {}
+        self.lock = threading.Lock()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key) -> Optional[tuple]:
+        with self.lock:
+            entry = self.data.get(key)
+            if entry is not None and entry[2] is not None and entry[2] <= monotonic():
+                self._pop(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.data.move_to_end(key)
+            return entry[0]
+
+    def generation(self, tables: Iterable[str]) -> tuple:
+        """
+        Return the current generation of `tables`, to be given to
+        `ResultCache.set` for results read after this call
+        """
+        with self.lock:
+            return tuple(self.generations.get(name, 0) for name in sorted(tables))
+
+    def set(
+        self,
+        key,
+        rows: tuple,
+        tables: Iterable[str],
+        ttl: Optional[float] = None,
+        generation: Optional[tuple] = None,
+    ):
+        """
+        Store `rows` under `key`. If `generation` is given, the rows
+        are only stored if none of the tables has been invalidated
+        since (the rows may be outdated).
+        """
+        nbytes = sizeof(rows)
+        if nbytes > self.max_bytes:
+            return
+        expires = None if ttl is None else monotonic() + ttl
+        tables = frozenset(tables)
+        with self.lock:
+            if generation is not None and generation != tuple(
+                self.generations.get(name, 0) for name in sorted(tables)
+            ):
+                return
+            if key in self.data:
+                self._pop(key)
+            self.data[key] = (rows, tables, expires, nbytes)
+            self.nbytes += nbytes
+            for name in tables:
+                self.by_table.setdefault(name, set()).add(key)
+            while self.nbytes > self.max_bytes:
+                self._pop(next(iter(self.data)))
+                self.evictions += 1
+
+    def invalidate(self, *tables: str):
+        """
+        Drop entries reading any of the given tables
+        """
+        with self.lock:
+            for name in tables:
+                self.generations[name] = self.generations.get(name, 0) + 1
+                for key in self.by_table.pop(name, ()):
+                    if key in self.data:
+                        self._pop(key)
+                        self.invalidations += 1
+
+    def _pop(self, key):
+        rows, tables, expires, nbytes = self.data.pop(key)
+        self.nbytes -= nbytes
+        for name in tables:
+            keys = self.by_table.get(name)
+            if keys is not None:
+                keys.discard(key)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+            self.by_table.clear()
+            self.generations.clear()
+            self.nbytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+            self.invalidations = 0
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "size": len(self.data),
+                "bytes": self.nbytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def __len__(self):
+        return len(self.data)
+
+
+def sizeof(rows: tuple) -> int:
+    # Estimated memory footprint of a list of rows
+    size = sys.getsizeof(rows)
+    for row in rows:
+        size += sys.getsizeof(row) + sum(map(sys.getsizeof, row))
+    return size
+
+
+def freeze(args: tuple) -> tuple:
+    # Make query arguments hashable (lists are passed for sequence
+    # parameters with postgresql)
+    return tuple(freeze(a) if isinstance(a, (list, tuple)) else a for a in args)
+
+
+# Process-level cache used by default by `Select.cached`
+result_cache = ResultCache()
+
+
+def default_cache_dir() -> Path:
+    if path := os.environ.get("NAGRA_CACHE_DIR"):
+        return Path(path)
+    return Path.home() / ".cache" / "nagra"
+
+
+class DataFrameCache:
+    """
+    On-disk cache of dataframes, stored as uncompressed Arrow IPC
+    files (see `Select.to_polars` and `Select.to_pandas`). Files are
+    memory-mapped on read and replaced atomically on write, on POSIX
+    an entry evicted or replaced by another process does not affect
+    the returned dataframes (the mapping keeps the file). Entries are keyed by database, statement,
+    arguments and a watermark of each table read by the query: the
+    row count and the max of the table version column (given in
+    `versions`, defaults to the primary key, materialized views only
+    have a row count). Views defined with `as_select` are opaque,
+    they are watermarked directly and require a version column in
+    `versions`. A change in one of the
+    tables gives a new key, outdated files are removed (least recently
+    used first) once the size of the directory exceeds `max_bytes`.
+    The pandas flavor requires pyarrow (`arrow` extra).
+    """
+
+    def __init__(
+        self,
+        path: Optional[str | Path] = None,
+        max_bytes: int = 10 * 1024**3,
+        versions: Optional[dict[str, str]] = None,
+    ):
+        self.path = Path(path) if path else default_cache_dir()
+        self.max_bytes = max_bytes
+        self.versions = versions or {}
+        self.hits = 0
+        self.misses = 0
+
+    def watermark(self, table: "Table", trn: "Transaction") -> tuple:
+        # Views have no primary key
+        default = None if table.is_view else table.primary_key
+        column = self.versions.get(table.name, default)
+        exprs = ["(count *)"]
+        if column:
+            exprs.append(f"(max {column})")
+        return tuple(table.select(*exprs, trn=trn).one())
+
+    def key(self, select: "Select", args: tuple, *extra) -> str:
+        schema = select.table.schema
+        watermarks = []
+        for name in sorted(select._read_tables(opaque=False)):
+            table = schema.tables.get(name)
+            if table is None:
+                continue
+            view = schema.views.get(name)
+            if view and view.as_select and not view.materialized:
+                if name not in self.versions:
+                    msg = f"DataFrameCache: no version column given for view '{name}'"
+                    raise ValidationError(msg)
+            elif view and not view.materialized:
+                # Underlying tables are listed by Select._read_tables
+                continue
+            watermarks.append((name, self.watermark(table, select.trn)))
+        content = (select.trn.cache_id, select.stm(), args, watermarks, extra)
+        return sha256(repr(content).encode()).hexdigest()
+
+    def to_polars(self, select: "Select", *args, **kwargs) -> "LazyFrame":
+        import polars
+
+        key = self.key(select, args, "polars", kwargs)
+        path = self.path / f"{key}.arrow"
+        # Uncompressed IPC files are memory-mapped by polars
+        df = self._read(path, lambda: polars.read_ipc(path))
+        if df is not None:
+            return df.lazy()
+        df = select.to_polars(*args, **kwargs).collect()
+        self._store(select, key, "polars", df.write_ipc)
+        return df.lazy()
+
+    def to_pandas(self, select: "Select", *args) -> "DataFrame":
+        from pyarrow import feather
+
+        key = self.key(select, args, "pandas")
+        path = self.path / f"{key}.arrow"
+        table = self._read(path, lambda: feather.read_table(path, memory_map=True))
+        if table is not None:
+            return table.to_pandas()
+        df = select.to_pandas(*args)
+        self._store(
+            select,
+            key,
+            "pandas",
+            lambda tmp: feather.write_feather(df, tmp, compression="uncompressed"),
+        )
+        return df
+
+    def _read(self, path: Path, read: Callable):
+        # Return the content of `path` with `read`, or None if the
+        # entry does not exist (or is evicted while being read)
+        try:
+            # Update modification time, used for eviction
+            os.utime(path)
+            res = read()
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return res
+
+    def _store(self, select: "Select", key: str, kind: str, write: Callable):
+        self.path.mkdir(parents=True, exist_ok=True)
+        meta = {
+            "kind": kind,
+            "tables": sorted(select.tables()),
+            "sql": select.stm(),
+            "created": datetime.now().isoformat(timespec="seconds"),
+        }
+        # Write to a temporary file first (unique across processes
+        # and threads), concurrent readers only see complete entries
+        tmp = self.path / f"{key}.{uuid4().hex}.tmp"
+        try:
+            write(tmp)
+            (self.path / f"{key}.json").write_text(json.dumps(meta))
+            os.replace(tmp, self.path / f"{key}.arrow")
+        finally:
+            tmp.unlink(missing_ok=True)
+        self.evict()
+
+    def entries(self) -> list[dict]:
+        """
+        Return cache entries, most recently used first
+        """
+        res = []
+        for path in self.path.glob("*.arrow"):
+            try:
+                stat = path.stat()
+                meta = json.loads(path.with_suffix(".json").read_text())
+            except FileNotFoundError:
+                continue
+            meta.update(
+                key=path.stem,
+                bytes=stat.st_size,
+                used=datetime.fromtimestamp(stat.st_mtime),
+            )
+            res.append(meta)
+        return sorted(res, key=lambda e: e["used"], reverse=True)
+
+    def evict(self):
+        """
+        Remove least recently used entries until the cache size is
+        lower than `max_bytes`
+        """
+        entries = self.entries()
+        total = sum(e["bytes"] for e in entries)
+        while entries and total > self.max_bytes:
+            entry = entries.pop()
+            self._remove(entry["key"])
+            total -= entry["bytes"]
+
+    def clear(self, *tables: str) -> int:
+        """
+        Remove all entries (or the ones reading from one of `tables`)
+        and return the number of entries removed
+        """
+        removed = 0
+        for entry in self.entries():
+            if tables and not set(tables) & set(entry["tables"]):
+                continue
+            self._remove(entry["key"])
+            removed += 1
+        return removed
+
+    def _remove(self, key: str):
+        for suffix in (".arrow", ".json"):
+            (self.path / f"{key}{suffix}").unlink(missing_ok=True)
+
+    def stats(self) -> dict:
+        entries = self.entries()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(entries),
+            "bytes": sum(e["bytes"] for e in entries),
+            "max_bytes": self.max_bytes,
+        }
@@ -1,9 +1,14 @@
 import argparse
+import logging
 import os
+from hashlib import sha256
 from itertools import chain
+from pathlib import Path
 
-from nagra import Transaction, Schema,  __version__
-from nagra.utils import print_table, partition
+import nagra
+from nagra import Transaction, Schema
+from nagra.cache import DataFrameCache, default_cache_dir
+from nagra.utils import fmt, print_table, partition, pretty_nb
 
 
 def select(args, schema):
@@ -89,11 +94,34 @@ def print_schema(args, schema):
     print_table(sorted(rows), headers, args.pivot, format=args.table_fmt)
 
 
+def cache(args, schema=None):
+    df_cache = DataFrameCache(args.dir)
+    if args.clear:
+        removed = df_cache.clear(*args.tables)
+        print(f"{removed} entries removed")
+        return
+
+    rows = [
+        (
+            e["key"][:12],
+            e["kind"],
+            ", ".join(e["tables"]),
+            f"{pretty_nb(e['bytes'])}B",
+            e["used"].isoformat(sep=" ", timespec="seconds"),
+        )
+        for e in df_cache.entries()
+        if not args.tables or set(args.tables) & set(e["tables"])
+    ]
+    headers = ["key", "kind", "tables", "size", "used"]
+    print_table(rows, headers, args.pivot, format=args.table_fmt)
+
+
 def show_version():
-    print(__version__)
+    print(nagra.__version__)
 
 
 def run():
+    logging.basicConfig(format=fmt)
     # top-level parser
     parser = argparse.ArgumentParser(
         prog="nagra",
@@ -102,6 +130,7 @@ def run():
 
     default_db = os.environ.get("NAGRA_DB")
     default_schema = os.environ.get("NAGRA_SCHEMA")
+    default_snapshot = os.environ.get("NAGRA_SNAPSHOT", "") not in ("", "0")
     parser.add_argument(
         "--db",
         "-d",
@@ -114,6 +143,15 @@ def run():
         default=default_schema,
         help=f"DB schema, (default: {default_schema})",
     )
+    parser.add_argument(
+        "--snapshot",
+        action="store_true",
+        default=default_snapshot,
+        help=(
+            "Re-use the schema pickled in the cache directory as long as "
+            "the schema is unchanged (default: $NAGRA_SNAPSHOT)"
+        ),
+    )
     parser.add_argument(
         "--pivot",
         "-p",
@@ -188,6 +226,17 @@ def run():
     )
     parser_schema.set_defaults(func=print_schema)
 
+    parser_cache = subparsers.add_parser(
+        "cache", help="Inspect or clear the dataframe cache"
+    )
+    parser_cache.add_argument("tables", nargs="*", help="Filter on tables")
+    parser_cache.add_argument(
+        "--dir",
+        help="Cache directory (default: $NAGRA_CACHE_DIR or ~/.cache/nagra)",
+    )
+    parser_cache.add_argument("--clear", action="store_true", help="Remove entries")
+    parser_cache.set_defaults(func=cache, no_db=True)
+
     # Parse args
     args = parser.parse_args()
     if args.version:
@@ -196,11 +245,21 @@ def run():
     if not args.command:
         parser.print_help()
         return
+    if getattr(args, "no_db", False):
+        args.func(args)
+        return
 
     try:
         with Transaction(args.db):
             if args.schema:
-                schema = Schema.from_toml(open(args.schema))
+                schema = Schema.from_toml(Path(args.schema), cache=args.snapshot)
+            elif args.snapshot:
+                # Snapshot is keyed by database, and refreshed when the
+                # catalog changes
+                key = sha256(str(args.db).encode()).hexdigest()[:16]
+                cache_path = default_cache_dir() / f"schema-db-{key}.pickle"
+                schema = Schema.from_db(cache_path=cache_path)
+                Schema.evict_snapshots(cache_path.parent)
             else:
                 schema = Schema.from_db()
             args.func(args, schema=schema)
@@ -22,6 +22,7 @@ def copy_from(
         raise NotImplementedError("COPY FROM not available for sqlite")
 
     stm = f'COPY "{table.name}" FROM STDIN'
+    trn.mark_written(table.name)
     cursor = trn.connection.cursor()
     it = iter(rows)
     with cursor.copy(stm) as copy:
@@ -31,6 +32,9 @@ def copy_from(
                 break
             content = serialize_chunk(chunk, table.columns)
             copy.write(content)
+    # Copied rows are not returned, recompute all the buckets
+    for rollup in table.rollups.values():
+        rollup.refresh(trn=trn)
 
 
 def serialize_chunk(rows, columns):
@@ -2,7 +2,7 @@ from collections.abc import Iterable
 from typing import Optional, TYPE_CHECKING
 
 from nagra import Statement
-from nagra.sexpr import AST
+from nagra.sexpr import AST, adapt_args, sequence_positions
 
 if TYPE_CHECKING:
     from nagra.table import Table, Env
@@ -17,6 +17,8 @@ class Delete:
         self.trn = trn
         self.env = env
         self._where = list(where)
+        # Memoized statement, see Delete.stm
+        self._stm = None
 
     def clone(
         self,
@@ -40,7 +42,27 @@ class Delete:
     def where(self, *conditions: str):
         return self.clone(where=conditions)
 
+    def shape(self) -> tuple:
+        """
+        Return a hashable description of the statement
+        """
+        return ("delete", self.table, self.trn.flavor, tuple(self._where))
+
     def stm(self):
+        if self._stm is None:
+            self._stm = self.table.schema.stm_cache.get_or_set(
+                self.shape(), self._compile
+            )
+        return self._stm
+
+    def sequence_params(self) -> tuple[int, ...]:
+        """
+        Return positions of the parameters expecting a sequence of
+        values (see `AST.is_in_sequence`)
+        """
+        return sequence_positions(AST.parse(cond) for cond in self._where)
+
+    def _compile(self):
         asts = [AST.parse(cond) for cond in self._where]
         eval_conditions = [ast.eval(self.env, flavor=self.trn.flavor) for ast in asts]
         joins = list(self.table.join(self.env))
@@ -56,9 +78,15 @@ class Delete:
         return self.execute()
 
     def execute(self, *args):
+        args = adapt_args(args, self.sequence_params(), self.trn.flavor)
+        self.trn.mark_written(self.table.name)
         return self.trn.execute(self.stm(), args)
 
     def executemany(self, args):
+        positions = self.sequence_params()
+        if positions:
+            args = [adapt_args(a, positions, self.trn.flavor) for a in args]
+        self.trn.mark_written(self.table.name)
         return self.trn.executemany(self.stm(), args)
 
     def __iter__(self):
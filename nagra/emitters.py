@@ -0,0 +1,316 @@
+"""
+Python emitters for the statements generated on each query
+(select, upsert, update, delete and delete-with-join). Each emitter
+produces exactly the same SQL as the corresponding jinja template
+(see the `template` directory) without the rendering overhead.
+`Statement` relies on templates for all the other statements (and
+flavors).
+"""
+
+from nagra.utils import autoquote
+
+
+def join(sep, items):
+    # Equivalent to jinja join filter
+    return sep.join(map(str, items))
+
+
+# Select
+
+
+def select_postgresql(
+    table,
+    columns,
+    joins,
+    conditions,
+    limit,
+    offset,
+    groupby,
+    orderby,
+    distinct_on,
+    distinct,
+    **_,
+):
+    res = ["SELECT"]
+    if distinct:
+        res.append(" DISTINCT ")
+    if distinct_on:
+        res.append(f"\n DISTINCT ON ({join(', ', map(autoquote, distinct_on))})")
+    res.append(f'\n  {join(", ", columns)}\nFROM "{table}"')
+    for next_table, alias, prev_table, alias_col, prev_col, join_type in joins:
+        res.append(
+            f'\n {join_type} JOIN "{next_table}" as "{alias}" ON (\n'
+            f'    "{alias}"."{alias_col}" = "{prev_table}"."{prev_col}"\n )'
+        )
+    if conditions:
+        res.append(f"\n WHERE\n {join(' AND ', conditions)}")
+    res.append("\n")
+    if groupby:
+        res.append(f"GROUP BY\n {join(', ', groupby)}")
+    res.append("\n")
+    if orderby:
+        res.append(f"ORDER BY\n {join(', ', orderby)}")
+    res.append("\n")
+    if limit:
+        res.append(f"LIMIT {limit}")
+    res.append("\n")
+    if offset:
+        res.append(f"OFFSET {offset}")
+    res.append("\n;")
+    return "".join(res)
+
+
+def select_sqlite(
+    table,
+    columns,
+    joins,
+    conditions,
+    limit,
+    offset,
+    groupby,
+    orderby,
+    distinct,
+    **_,
+):
+    res = ["SELECT"]
+    if distinct:
+        res.append(" DISTINCT ")
+    res.append(f'{join(", ", columns)}\nFROM "{table}"')
+    for next_table, alias, prev_table, alias_col, prev_col, join_type in joins:
+        res.append(
+            f'\n {join_type} JOIN "{next_table}" as "{alias}" ON (\n'
+            f'    "{alias}"."{alias_col}" = "{prev_table}"."{prev_col}"\n )'
+        )
+    if conditions:
+        res.append(f"WHERE\n {join(' AND ', conditions)}")
+    res.append("\n")
+    if groupby:
+        res.append(f"GROUP BY\n {join(', ', groupby)}")
+    if orderby:
+        res.append(f"ORDER BY\n {join(', ', orderby)}")
+    res.append("\n")
+    if limit:
+        res.append(f"LIMIT {limit}")
+    res.append("\n")
+    if offset:
+        res.append(f"OFFSET {offset}")
+    res.append(";")
+    return "".join(res)
+
+
+def select_mssql(
+    table,
+    columns,
+    joins,
+    conditions,
+    limit,
+    offset,
+    groupby,
+    orderby,
+    **_,
+):
+    use_offset = offset is not None
+    res = ["\nSELECT"]
+    if limit and not use_offset:
+        res.append(f" TOP {limit}")
+    res.append(f"\n  {join(', ', columns)}\nFROM [{table}]")
+    for next_table, alias, prev_table, alias_col, prev_col, join_type in joins:
+        res.append(
+            f"\n {join_type} JOIN [{next_table}] AS [{alias}] ON (\n"
+            f"    [{alias}].[{alias_col}] = [{prev_table}].[{prev_col}]\n )"
+        )
+    if conditions:
+        res.append(f"\n WHERE\n {join(' AND ', conditions)}")
+    res.append("\n")
+    if groupby:
+        res.append(f"GROUP BY\n {join(', ', groupby)}")
+    res.append("\n")
+    if orderby:
+        res.append(f"ORDER BY\n {join(', ', orderby)}\n")
+    elif use_offset:
+        res.append("ORDER BY (SELECT NULL)")
+    res.append("\n")
+    if use_offset:
+        res.append(f"OFFSET {offset or 0} ROWS\n ")
+        if limit:
+            res.append(f"\n FETCH NEXT {limit} ROWS ONLY\n ")
+    res.append("\n;")
+    return "".join(res)
+
+
+# Upsert
+
+
+def _upsert(placeholder, table, columns, conflict_key, do_update, returning, tail):
+    res = [
+        f'INSERT INTO "{table}" ({join(", ", map(autoquote, columns))})\n'
+        f"VALUES (\n  {join(',', (placeholder for _ in columns))}\n)\n\n"
+    ]
+    if conflict_key:
+        res.append(
+            "\n  ON CONFLICT (\n"
+            f"   {join(', ', map(autoquote, conflict_key))}\n  )\n  "
+        )
+        if do_update:
+            updates = (
+                f'"{col}" = EXCLUDED."{col}" '
+                for col in columns
+                if col not in conflict_key
+            )
+            res.append(f"\n  DO UPDATE SET\n    {join(', ', updates)}{tail}")
+        else:
+            res.append("\n  DO NOTHING\n  ")
+        res.append("\n")
+    res.append("\n\n")
+    if returning:
+        res.append(f"\nRETURNING {join(', ', map(autoquote, returning))}\n")
+    return res
+
+
+def upsert_postgresql(table, columns, conflict_key, do_update, returning, **_):
+    res = _upsert("%s", table, columns, conflict_key, do_update, returning, "\n  ")
+    res.append("\n\n")
+    return "".join(res)
+
+
+def upsert_sqlite(table, columns, conflict_key, do_update, returning, **_):
+    res = _upsert("?", table, columns, conflict_key, do_update, returning, "\n\n  ")
+    return "".join(res)
+
+
+def upsert_mssql(
+    table, columns, conflict_key, do_update, returning, set_identity, **_
+):
+    res = []
+    if set_identity:
+        res.append(f"\nSET IDENTITY_INSERT [{table}] ON;\n")
+
+    outputs = join(", ", (f"inserted.[{col}]" for col in returning))
+    if conflict_key:
+        sources = join(", ", (f"? AS [{col}]" for col in columns))
+        on = join(" AND ", (f"target.[{col}] = source.[{col}]" for col in conflict_key))
+        res.append(
+            f"MERGE INTO [{table}] AS target\n  USING\n    (SELECT\n    {sources}"
+            f"\n  ) AS source\n\n  ON (\n    {on}\n  )\n\n  "
+        )
+        if do_update:
+            updates = join(
+                ", ",
+                (f"[{col}] = source.[{col}]" for col in columns if col not in conflict_key),
+            )
+            res.append(
+                f"\n  WHEN MATCHED THEN\n    UPDATE SET\n    {updates}\n  "
+            )
+        names = join(", ", (f"[{col}]" for col in columns))
+        values = join(", ", (f"source.[{col}]" for col in columns))
+        res.append(
+            f"\n\n\n  WHEN NOT MATCHED THEN INSERT ({names}) VALUES ({values})\n\n  "
+        )
+        if returning:
+            res.append(f"\n   OUTPUT {outputs}\n  ")
+    else:
+        names = join(", ", (f"[{col}]" for col in columns))
+        res.append(f"INSERT INTO [{table}] (\n    {names}\n  )\n  ")
+        if returning:
+            res.append(f"\n   OUTPUT {outputs}\n  ")
+        values = join(", ", ("? " for _ in columns))
+        res.append(f"VALUES (\n    {values}\n  )")
+
+    res.append(";\n\n")
+    if set_identity:
+        res.append(f"\nSET IDENTITY_INSERT [{table}] OFF;\n")
+    return "".join(res)
+
+
+# Update
+
+
+def update_postgresql(table, columns, condition_key, returning, **_):
+    updates = join(",", (f'"{col}" = %s' for col in columns if col not in condition_key))
+    conditions = join(" AND ", (f'"{col}" = %s' for col in condition_key))
+    res = [f'UPDATE "{table}"\nSET\n  {updates}\n\nWHERE\n  {conditions}\n\n']
+    if returning:
+        res.append(f"\nRETURNING {join(', ', map(autoquote, returning))}\n")
+    res.append("\n")
+    return "".join(res)
+
+
+def update_sqlite(table, columns, condition_key, returning, **_):
+    updates = join(",", (f'"{col}" = ?' for col in columns if col not in condition_key))
+    conditions = join(" AND ", (f'"{col}" = ?' for col in condition_key))
+    return (
+        f'UPDATE "{table}"\nSET\n  {updates}\n\nWHERE\n  {conditions}\n\n'
+        f"RETURNING {join(', ', map(autoquote, returning))}\n"
+    )
+
+
+def update_mssql(table, columns, condition_key, returning, **_):
+    updates = join(", ", (f"[{col}] = ?" for col in columns if col not in condition_key))
+    conditions = join(" AND ", (f"[{col}] = ?" for col in condition_key))
+    res = [f"UPDATE [{table}]\nSET\n  {updates}\n"]
+    if returning:
+        outputs = join(", ", (f"inserted.[{col}]" for col in returning))
+        res.append(f"\nOUTPUT {outputs}\n")
+    res.append(f"\nWHERE\n  {conditions}\n;")
+    return "".join(res)
+
+
+# Delete
+
+
+def delete_postgresql(table, conditions, **_):
+    res = f'DELETE FROM "{table}"\n'
+    if conditions:
+        res += f"WHERE\n {join(' AND ', conditions)}"
+    return res
+
+
+def delete_mssql(table, conditions, **_):
+    res = f"DELETE FROM [{table}]\n"
+    if conditions:
+        res += f"WHERE\n {join(' AND ', conditions)}"
+    return res + "\n;"
+
+
+def delete_with_join_postgresql(table, joins, conditions, **_):
+    res = [f'DELETE FROM "{table}"\nWHERE "{table}".id IN (\n']
+    res.append(f'  SELECT "{table}".id from "{table}"')
+    for next_table, alias, prev_table, alias_col, prev_col, join_type in joins:
+        res.append(
+            f'\n   {join_type} JOIN "{next_table}" as {alias} ON (\n'
+            f'     {alias}."{alias_col}" = "{prev_table}"."{prev_col}"\n   )'
+        )
+    res.append(f"WHERE\n  {join(' AND ', conditions)}\n)")
+    return "".join(res)
+
+
+def delete_with_join_mssql(table, joins, conditions, **_):
+    res = [f"DELETE FROM [{table}]\nWHERE [{table}].[id] IN (\n"]
+    res.append(f"  SELECT [{table}].[id] FROM [{table}]")
+    for next_table, alias, prev_table, alias_col, prev_col, join_type in joins:
+        res.append(
+            f"\n   {join_type} JOIN [{next_table}] AS [{alias}] ON (\n"
+            f"     [{alias}].[{alias_col}] = [{prev_table}].[{prev_col}]\n   )"
+        )
+    res.append(f"WHERE\n  {join(' AND ', conditions)}\n);")
+    return "".join(res)
+
+
+# Emitters indexed by template path
+EMITTERS = {
+    "postgresql/select": select_postgresql,
+    "sqlite/select": select_sqlite,
+    "mssql/select": select_mssql,
+    "postgresql/upsert": upsert_postgresql,
+    "sqlite/upsert": upsert_sqlite,
+    "mssql/upsert": upsert_mssql,
+    "postgresql/update": update_postgresql,
+    "sqlite/update": update_sqlite,
+    "mssql/update": update_mssql,
+    "postgresql/delete": delete_postgresql,
+    "sqlite/delete": delete_postgresql,
+    "mssql/delete": delete_mssql,
+    "postgresql/delete-with-join": delete_with_join_postgresql,
+    "sqlite/delete-with-join": delete_with_join_postgresql,
+    "mssql/delete-with-join": delete_with_join_mssql,
+}
@@ -0,0 +1,118 @@
+from typing import Optional, TYPE_CHECKING
+
+from nagra.exceptions import IncorrectSchema
+from nagra.sexpr import AST, VarToken
+from nagra.statement import Statement
+
+if TYPE_CHECKING:
+    from nagra.table import Table
+
+# Index methods, postgresql only (see Index.stmt)
+METHODS = ("btree", "hash", "brin", "gin", "gist", "trigram")
+
+
+class Index:
+    """
+    Secondary index on `table`. Items of `columns` are column names
+    or s-expressions on the columns of the table, `where` makes it a
+    partial index and `include` adds non-key columns to the index
+    (ignored on sqlite), eg:
+
+    ``` toml
+    [temperature.indexes.temperature_day_idx]
+    columns = ["city", "(date_trunc 'day' timestamp)"]
+    where = "(> value 0)"
+    include = ["value"]
+    ```
+
+    `method` selects the postgresql index method: "brin", "gin",
+    "gist", "hash" or "trigram" (a gin index with the `gin_trgm_ops`
+    operator class of the pg_trgm extension). Indexes with a method
+    are only created on postgresql. Indexes on expressions are not
+    created on mssql (it only indexes columns).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        table: "Table",
+        columns: list[str],
+        where: Optional[str] = None,
+        include: Optional[list[str]] = None,
+        method: Optional[str] = None,
+        unique: bool = False,
+    ):
+        self.name = name
+        self.table = table
+        self.columns = columns
+        self.where = where
+        self.include = include or []
+        self.method = method
+        self.unique = unique
+        if method is not None and method not in METHODS:
+            msg = f"Index '{name}': unknown method '{method}'"
+            raise IncorrectSchema(msg)
+        if not columns:
+            raise IncorrectSchema(f"Index '{name}': no columns")
+
+        # Indexes can only reference columns of the table
+        known = {*table.columns, table.primary_key}
+        exprs = [*columns, *([where] if where else [])]
+        names = [
+            tk.value
+            for expr in exprs
+            for tk in AST.parse(expr).chain()
+            if isinstance(tk, VarToken)
+        ]
+        for col_name in names + self.include:
+            if col_name not in known:
+                msg = f"Index '{name}': unknown column '{col_name}'"
+                raise IncorrectSchema(msg)
+
+    def stmt(self, flavor: str) -> Optional[str]:
+        """
+        Return the create statement of the index for `flavor`, or
+        None if it is not supported
+        """
+        from nagra.table import Env
+
+        if self.method and flavor != "postgresql":
+            return None
+        if flavor == "mssql" and not all(
+            col in self.table.columns or col == self.table.primary_key
+            for col in self.columns
+        ):
+            return None
+        env = Env(self.table, qualified=False)
+        columns = [AST.parse(col).eval(env, flavor) for col in self.columns]
+        method = self.method
+        if method == "trigram":
+            method = "gin"
+            columns = [f"{col} gin_trgm_ops" for col in columns]
+        where = self.where and AST.parse(self.where).eval(env, flavor)
+        stmt = Statement(
+            "create_index",
+            flavor,
+            name=self.name,
+            table=self.table.name,
+            columns=columns,
+            where=where,
+            include=self.include,
+            method=method,
+            unique=self.unique,
+        )
+        return stmt()
+
+    def eq(self, other):
+        if not isinstance(other, Index):
+            return False
+        return all(
+            (
+                self.name == other.name,
+                self.columns == other.columns,
+                self.where == other.where,
+                self.include == other.include,
+                self.method == other.method,
+                self.unique == other.unique,
+            )
+        )
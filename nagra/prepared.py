@@ -0,0 +1,83 @@
+from typing import Optional, TYPE_CHECKING
+
+from nagra.exceptions import ValidationError
+from nagra.sexpr import adapt_args
+from nagra.transaction import Transaction, dummy_transaction
+
+if TYPE_CHECKING:
+    from nagra.select import Select
+    from nagra.transaction import ResultCursor
+
+
+class PreparedQuery:
+    """
+    Select compiled once and executed many times. Named parameters
+    (like `{name}`) are given as keyword arguments and anonymous ones
+    (`{}`) as positional arguments:
+
+    ``` python
+    query = person.select("name").where("(= parent.name {parent})").prepare()
+    query.execute(parent="Alice").fetchall()
+    ```
+
+    The arguments of the keyset predicate of `Select.after` are
+    bound to the query. A prepared query holds no state between
+    executions so it can be shared across threads. If the select was
+    created outside of a transaction, the current transaction is used
+    on each execution.
+    """
+
+    def __init__(self, select: "Select"):
+        self.select = select
+        self.params = select.params()
+        self.names = frozenset(p for p in self.params if p)
+        self.nb_anonymous = self.params.count("")
+        self.sequences = select.sequence_params()
+        # Compiled statements by flavor
+        self.stms = {select.trn.flavor: select.stm()}
+
+    def bind(self, *args, **kwargs) -> tuple:
+        """
+        Return query arguments, in the order of the placeholders
+        """
+        if len(args) != self.nb_anonymous:
+            raise ValidationError(
+                f"Expected {self.nb_anonymous} positional argument(s), "
+                f"got {len(args)}"
+            )
+        if unknown := kwargs.keys() - self.names:
+            raise ValidationError(f"Unexpected parameter(s): {', '.join(unknown)}")
+        if missing := self.names - kwargs.keys():
+            raise ValidationError(f"Missing parameter(s): {', '.join(missing)}")
+        if not self.names:
+            return args
+
+        positional = iter(args)
+        return tuple(kwargs[p] if p else next(positional) for p in self.params)
+
+    def stm(self, trn: "Transaction") -> str:
+        stm = self.stms.get(trn.flavor)
+        if stm is None:
+            stm = self.stms[trn.flavor] = self.select.clone(trn=trn).stm()
+        return stm
+
+    def execute(
+        self, *args, trn: Optional["Transaction"] = None, prepare=None, **kwargs
+    ) -> "ResultCursor":
+        """
+        Bind parameters and execute the query. See `Transaction.execute`
+        for the `prepare` argument (server-side prepared statement).
+        """
+        if trn is None:
+            trn = self.select.trn
+            if trn is dummy_transaction:
+                trn = Transaction.current()
+        args = self.select._bind_seek(self.bind(*args, **kwargs))
+        args = adapt_args(args, self.sequences, trn.flavor)
+        return trn.execute(self.stm(trn), args, prepare=prepare)
+
+    def one(self, *args, **kwargs):
+        return self.execute(*args, **kwargs).fetchone()
+
+    def __repr__(self):
+        return f"<PreparedQuery {self.select.table.name} {self.params}>"
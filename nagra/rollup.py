@@ -0,0 +1,170 @@
+from typing import Iterable, Optional, TYPE_CHECKING
+
+from nagra.exceptions import IncorrectSchema
+from nagra.sexpr import AST, VarToken
+from nagra.transaction import Transaction
+
+if TYPE_CHECKING:
+    from nagra.table import Table
+
+
+class Rollup:
+    """
+    Aggregates of `table` grouped by the `groupby` expressions,
+    stored in the table `name` (created with the schema). Both
+    `groupby` and `aggregates` map column names of the rollup table
+    to expressions on `table`, eg:
+
+    ``` toml
+    [temperature.rollups.temperature_daily]
+    groupby = {city = "city", day = "(date_trunc 'day' timestamp)"}
+    aggregates = {max = "(max value)", total = "(sum value)", nb = "(count *)"}
+    ```
+
+    Upserts and updates on `table` recompute the buckets of the
+    written rows (see `Rollup.update`), an update by primary key also
+    recomputes the buckets the rows belonged to before the write.
+    Group by expressions can only use columns of the natural key and
+    must not be nullable. Copies (see `Table.copy_from`) recompute all
+    the buckets, deletes are not tracked: `Rollup.refresh` recomputes
+    all the buckets.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        table: "Table",
+        groupby: dict[str, str],
+        aggregates: dict[str, str],
+    ):
+        from nagra.table import Env, Table
+
+        self.name = name
+        self.table = table
+        self.groupby = groupby
+        self.aggregates = aggregates
+        if not table.primary_key:
+            msg = f"Rollup '{name}': table '{table.name}' has no primary key"
+            raise IncorrectSchema(msg)
+        for expr in groupby.values():
+            for tk in AST.parse(expr).chain():
+                if not isinstance(tk, VarToken):
+                    continue
+                if tk.value.split(".")[0] not in table.natural_key:
+                    msg = (
+                        f"Rollup '{name}': group by expression '{expr}' "
+                        "must only use natural key columns"
+                    )
+                    raise IncorrectSchema(msg)
+            if AST.parse(expr).is_nullable(Env(table)):
+                msg = f"Rollup '{name}': group by expression '{expr}' is nullable"
+                raise IncorrectSchema(msg)
+
+        # Infer column types and create underlying table
+        select = table.select(*groupby.values(), *aggregates.values())
+        columns = {}
+        for col_name, (_, dt) in zip(self.columns, select.dtypes(with_optional=False)):
+            columns[col_name] = dt.__name__
+        foreign_keys = {
+            col_name: table.foreign_keys[expr]
+            for col_name, expr in groupby.items()
+            if expr in table.foreign_keys
+        }
+        for col_name in foreign_keys:
+            columns[col_name] = "bigint"
+        self.target = Table(
+            name,
+            columns=columns,
+            natural_key=list(groupby),
+            foreign_keys=foreign_keys,
+            schema=table.schema,
+        )
+
+    def eq(self, other):
+        if not isinstance(other, Rollup):
+            return False
+        return all(
+            (
+                self.name == other.name,
+                self.groupby == other.groupby,
+                self.aggregates == other.aggregates,
+            )
+        )
+
+    @property
+    def columns(self) -> list[str]:
+        return [*self.groupby, *self.aggregates]
+
+    def select(self, trn: Optional[Transaction] = None):
+        # Aggregation query on the base table
+        exprs = [*self.groupby.values(), *self.aggregates.values()]
+        return self.table.select(*exprs, trn=trn)
+
+    def keys(self, ids: Iterable[int], trn: Optional[Transaction] = None) -> set:
+        """
+        Return the keys (tuples of group by values) of the buckets of
+        the rows of `table` identified by `ids`
+        """
+        trn = trn or Transaction.current()
+        ids = [i for i in ids if i is not None]
+        keys = set()
+        if not ids:
+            return keys
+        keys_select = self.table.select(*self.groupby.values(), trn=trn).where(
+            f"(in {self.table.primary_key} {{ids...}})"
+        )
+        for start in range(0, len(ids), 10_000):
+            keys.update(keys_select.execute(ids[start : start + 10_000]))
+        return keys
+
+    def update(
+        self,
+        ids: Iterable[int],
+        trn: Optional[Transaction] = None,
+        previous_keys: Iterable[tuple] = (),
+    ):
+        """
+        Recompute the buckets of the rows of `table` identified by
+        `ids`, and the ones identified by `previous_keys` (buckets
+        of those rows before the write, see `Rollup.keys`)
+        """
+        trn = trn or Transaction.current()
+        keys = self.keys(ids, trn=trn)
+        keys.update(previous_keys)
+        self.update_keys(keys, trn=trn)
+
+    def update_keys(self, keys: Iterable[tuple], trn: Optional[Transaction] = None):
+        """
+        Recompute the buckets identified by `keys` (tuples of group by
+        values). Buckets are filtered on the values of each group by
+        expression, other existing buckets combining those values are
+        also recomputed. Buckets of `keys` without rows in `table` are
+        deleted.
+        """
+        trn = trn or Transaction.current()
+        keys = set(keys)
+        if not keys:
+            return
+        values = [list(set(column)) for column in zip(*keys)]
+        conditions = [
+            f"(in {expr} {{key_{pos}...}})"
+            for pos, expr in enumerate(self.groupby.values())
+        ]
+        rows = self.select(trn=trn).where(*conditions).execute(*values).fetchall()
+        self.target.upsert(*self.columns, trn=trn).executemany(rows)
+
+        # Remove emptied buckets
+        width = len(self.groupby)
+        empty = keys - {tuple(row[:width]) for row in rows}
+        if empty:
+            conditions = [f"(= {col} {{}})" for col in self.groupby]
+            self.target.delete(trn=trn).where(*conditions).executemany(list(empty))
+
+    def refresh(self, trn: Optional[Transaction] = None):
+        """
+        Recompute all the buckets
+        """
+        trn = trn or Transaction.current()
+        self.target.delete(trn=trn).execute()
+        rows = self.select(trn=trn).execute()
+        self.target.upsert(*self.columns, trn=trn).executemany(rows)
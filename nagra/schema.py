@@ -1,38 +1,107 @@
+import os
+import pickle
+import threading
+import time
 from itertools import chain, groupby
 from contextlib import contextmanager
 from collections import defaultdict
+from hashlib import sha256
 from pathlib import Path
 from io import IOBase
 from typing import Optional, TYPE_CHECKING
+from uuid import uuid4
 from warnings import warn
 
-import toml
+from nagra.sexpr import sequence_arg
 from nagra.statement import Statement
 from nagra.transaction import DummyTransaction, Transaction
-from nagra.utils import logger, snake_to_pascal, template
+from nagra.utils import LRUCache, logger, snake_to_pascal, template
 
 
 if TYPE_CHECKING:
     from nagra.table import Table
     from nagra.view import View
 
+# Metadata table, holds the fingerprint of the last schema created
+# and the definitions of the views (see Schema.create_tables)
+META_TABLE = "nagra_meta"
+# Prefix of the names of the view and index definitions in the
+# metadata table
+META_VIEW_PREFIX = "view:"
+META_INDEX_PREFIX = "index:"
+# Prefix of the names of the schema fingerprints in the metadata
+# table (see Schema.fingerprint_key)
+META_FINGERPRINT_PREFIX = "schema_fingerprint:"
+# Snapshots not used for this number of seconds are removed (see
+# Schema.evict_snapshots)
+SNAPSHOT_MAX_AGE = 30 * 24 * 3600
 MSSQL_ARRAY_MSG = (
     "MS SQL Server does not support array types. Table '{table}' "
     "with array columns is ignored."
 )
 
 
+def read_toml(toml_src: IOBase | Path | str) -> str:
+    match toml_src:
+        case IOBase():
+            return toml_src.read()
+        case Path():
+            with toml_src.open() as fh:
+                return fh.read()
+        case _:
+            return toml_src
+
+
+def plain(value):
+    # Convert toml inline tables (that can not be pickled) into dicts
+    if isinstance(value, dict):
+        return {k: plain(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [plain(v) for v in value]
+    return value
+
+
 class Schema:
     default: "Schema" = None
 
     def __init__(self, tables=None, views=None):
         self.tables: dict[str, Table] = tables or {}
         self.views: dict[str, View] = views or {}
+        # Resolved joins, keyed by table name and path (see join_path)
+        self._join_paths = {}
+        # Compiled statements of Select, Upsert, Update and Delete,
+        # keyed by query shape
+        self.stm_cache = LRUCache(size=2048)
+        # Lazy schemas introspect tables on first access (see from_db)
+        self.lazy = False
+        self._lock = None
+        # Names not found by lazy introspection
+        self._missing = set()
 
     @classmethod
-    def from_toml(cls, toml_src: IOBase | Path | str) -> "Schema":
-        schema = cls()
-        schema.load_toml(toml_src)
+    def from_toml(cls, toml_src: IOBase | Path | str, cache: bool = False) -> "Schema":
+        """
+        Instanciate a Schema from a toml definition. If `cache` is
+        true, the resulting schema is pickled in the cache directory
+        (see `nagra.cache.default_cache_dir`) and re-used as long as
+        the toml content is unchanged (see `Schema.load_snapshot`).
+        """
+        content = read_toml(toml_src)
+        if not cache:
+            schema = cls()
+            schema.load_toml(content)
+            return schema
+
+        from nagra.cache import default_cache_dir
+
+        fingerprint = cls._fingerprint(content)
+        path = default_cache_dir() / f"schema-{fingerprint}.pickle"
+        schema = cls.load_snapshot(path, fingerprint)
+        if schema is None:
+            schema = cls()
+            schema.load_toml(content)
+            schema.dump_snapshot(path, fingerprint)
+            cls.evict_snapshots(path.parent)
         return schema
 
     @property
@@ -43,17 +112,10 @@ class Schema:
         # Late import to avoid import loops
         from nagra.table import Table
         from nagra.view import View
+        import toml
 
         # load table definitions
-        match toml_src:
-            case IOBase():
-                content = toml_src.read()
-            case Path():
-                with toml_src.open() as toml_src:
-                    content = toml_src.read()
-            case _:
-                content = toml_src
-        tables = toml.loads(content)
+        tables = plain(toml.loads(read_toml(toml_src)))
         # Instanciate tables
         for name, info in tables.items():
             logger.debug("Instanciate '%s' table from toml", name)
@@ -71,16 +133,62 @@ class Schema:
     def add_table(self, name: str, table: "Table"):
         if name in self.tables:
             raise RuntimeError(f"Table {name} already in schema!")
-        self.tables[name] = table
+        if self.lazy:
+            # Other threads may iterate on the tables while lazy
+            # introspection adds new ones, replace the dict instead of
+            # updating it
+            self.tables = {**self.tables, name: table}
+        else:
+            self.tables[name] = table
+        self.invalidate()
 
     def add_view(self, name: str, view: "View"):
         if name in self.views:
             raise RuntimeError(f"View {name} already in schema!")
-        self.views[name] = view
+        if self.lazy:
+            # See add_table
+            self.views = {**self.views, name: view}
+        else:
+            self.views[name] = view
+        self.invalidate()
 
     def reset(self):
         self.tables = {}
         self.views = {}
+        self._missing = set()
+        self.invalidate()
+
+    def invalidate(self):
+        """
+        Clear resolved joins and compiled statements. Called when a
+        table or a view is added, must be called after modifying the
+        columns or keys of an existing table.
+        """
+        self._join_paths.clear()
+        self.stm_cache.clear()
+
+    def __getstate__(self):
+        # Caches are not pickled (see dump_snapshot)
+        state = self.__dict__.copy()
+        state.update(_join_paths={}, stm_cache=None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.stm_cache = LRUCache(size=2048)
+
+    def join_path(self, table: "Table", path: tuple[str, ...]) -> tuple["Table", str, str]:
+        """
+        Return the table reached from `table` by following the
+        foreign keys (or one2many aliases) in `path`, with the
+        columns to join on (see `Table.join_on`). Results are cached
+        until a table or a view is added to the schema.
+        """
+        key = (table.name, path)
+        res = self._join_paths.get(key)
+        if res is None:
+            res = self._join_paths[key] = table._join_on(path)
+        return res
 
     def get(self, name: str) -> "Table | View":
         """
@@ -88,14 +196,28 @@ class Schema:
         """
         # We must get() on views first, since each view is also
         # registered as a table
-        res = self.views.get(name) or self.tables[name]
+        res = self.views.get(name) or self.tables.get(name)
+        if not res and self.lazy:
+            self._introspect_lazily(name)
+            res = self.views.get(name) or self.tables.get(name)
         if not res:
             raise KeyError(f"No view or table named {name}")
         return res
 
+    @classmethod
+    def _catalog(cls, name: str, tables: tuple[str, ...], trn: Transaction, **params):
+        """
+        Execute the catalog query `name`, if `tables` is not empty
+        the results are restricted to those tables (the filter is
+        applied by the database).
+        """
+        stmt = Statement(name, trn.flavor, whitelist=bool(tables), **params)
+        args = (sequence_arg(tables, trn.flavor),) if tables else ()
+        return trn.execute(stmt(), args)
+
     @classmethod
     def _db_columns(
-        cls, trn=None, pg_schema="public"
+        cls, *tables, trn=None, pg_schema="public"
     ) -> defaultdict[str, dict[str, str]]:
         """
         Return a mapping of table -> column -> type by introspecting the database
@@ -104,8 +226,8 @@ class Schema:
 
         trn = trn or Transaction.current()
         res = defaultdict(dict)
-        stmt = Statement("find_columns", trn.flavor, pg_schema=pg_schema)
-        for tbl, col_name, col_type, *hints in trn.execute(stmt()):
+        rows = cls._catalog("find_columns", tables, trn, pg_schema=pg_schema)
+        for tbl, col_name, col_type, *hints in rows:
             # handle array types
             if col_type.upper() == "ARRAY" and hints:
                 # Try to find type of elements, rely on the fact that
@@ -138,11 +260,10 @@ class Schema:
         res = [n for (n,) in trn.execute(stmt())]
         return res
 
-    def _db_views(self, trn=None, pg_schema="public") -> dict[str, str]:
+    def _db_views(self, *tables, trn=None, pg_schema="public") -> dict[str, str]:
         trn = trn or Transaction.current()
-        stmt = Statement("find_views", trn.flavor, pg_schema=pg_schema)
         # The statement returns tuples of (name, view_def)
-        res = dict(trn.execute(stmt()))
+        res = dict(self._catalog("find_views", tables, trn, pg_schema=pg_schema))
         return res
 
     @classmethod
@@ -151,16 +272,15 @@ class Schema:
     ) -> defaultdict[str, dict[str, "FKConstraint"]]:
         trn = trn or Transaction.current()
         res = defaultdict(dict)
-        stmt = Statement(
+        rows = cls._catalog(
             "find_foreign_keys",
-            trn.flavor,
+            whitelist,
+            trn,
             pg_schema=pg_schema,  # FIXME put schema on transaction
             mssql_schema="dbo",  # should come from the dsn
         )
         skip_fk = []
-        for name, tbl, col, ftable, fcol in trn.execute(stmt()):
-            if whitelist and tbl not in whitelist:
-                continue
+        for name, tbl, col, ftable, fcol in rows:
             if name in skip_fk:
                 continue
             if name in res[tbl]:
@@ -172,12 +292,12 @@ class Schema:
         return res
 
     @classmethod
-    def _db_pk(cls, trn=None, pg_schema="public"):
+    def _db_pk(cls, *tables, trn=None, pg_schema="public"):
         trn = trn or Transaction.current()
         res = {}
-        stmt = Statement("find_primary_keys", trn.flavor, pg_schema=pg_schema)
+        rows = cls._catalog("find_primary_keys", tables, trn, pg_schema=pg_schema)
         skip_tables = []
-        for tbl, pk_col in trn.execute(stmt()):
+        for tbl, pk_col in rows:
             if tbl in skip_tables:
                 continue
             if tbl in res:
@@ -190,32 +310,26 @@ class Schema:
         return res
 
     @classmethod
-    def _db_unique(cls, db_pk, trn=None, pg_schema="public") -> dict[str, list[str]]:
+    def _db_unique(
+        cls, db_pk, *tables, trn=None, pg_schema="public"
+    ) -> dict[str, list[str]]:
         trn = trn or Transaction.current()
         by_constraint = defaultdict(list)
 
-        if trn.flavor == "sqlite":
-            stmt = Statement("find_unique_constraint", trn.flavor)
-            constraints = trn.execute(stmt()).fetchall()
-            for (tbl, idx_name), rows in groupby(constraints, key=lambda x: x[:2]):
-                rows = list(rows)
-                by_constraint[tbl].append([col_name for _, _, col_name in rows])
-
-        else:
-            stmt = Statement("find_unique_constraint", trn.flavor, pg_schema=pg_schema)
-            constraints = trn.execute(stmt()).fetchall()
-            for tbl, constraint_name in constraints:
-                col_stmt = Statement(
-                    "find_index_columns",
-                    trn.flavor,
-                    pg_schema=pg_schema,
-                    name=constraint_name,
-                )
-                columns = [c for (c,) in trn.execute(col_stmt())]
-                # Postgresql will wrap columns names with quotes for
-                # reserved words
-                columns = [c.strip('"') for c in columns]
-                by_constraint[tbl].append(columns)
+        # Rows of (table, index, column), ordered by index and position
+        # of the column in the index
+        constraints = cls._catalog(
+            "find_unique_constraint", tables, trn, pg_schema=pg_schema
+        ).fetchall()
+        for (tbl, idx_name), rows in groupby(constraints, key=lambda x: x[:2]):
+            col_names = [col_name for _, _, col_name in rows]
+            # Expression columns (null on sqlite) can not be part of
+            # a natural key
+            if None in col_names:
+                continue
+            # Postgresql will wrap columns names with quotes for
+            # reserved words
+            by_constraint[tbl].append([col_name.strip('"') for col_name in col_names])
 
         # Keep the unique constraint with the lowest number of columns for
         # each table
@@ -230,9 +344,72 @@ class Schema:
                 break
         return res
 
-    def _create_views(self, trn: Transaction):
-        # Create tables
+    def _stored_definitions(self, prefix: str, trn: Transaction) -> dict[str, str]:
+        """
+        Return the definitions of the views (or indexes, depending on
+        `prefix`) created by `Schema.create_tables`, as stored in the
+        metadata table (see `Schema.view_definition` and
+        `Schema.index_definition`)
+        """
+        meta = self._meta_table(trn)
+        if meta is None:
+            return {}
+        rows = meta.select("name", "value", trn=trn).where(f"(like name '{prefix}%')")
+        return {name[len(prefix) :]: value for name, value in rows}
+
+    @staticmethod
+    def view_definition(view: "View") -> str:
+        """
+        Return the kind of `view` and a hash of its definition
+        """
+        kind = "materialized" if view.materialized else "view"
+        return f"{kind}:{sha256(view.view_def().encode()).hexdigest()}"
+
+    @staticmethod
+    def index_definition(stmt: str) -> str:
+        """
+        Return a hash of the create statement of an index
+        """
+        return sha256(stmt.encode()).hexdigest()
+
+    def _drop_changed_views(self, trn: Transaction):
+        # Drop views whose definition or kind (plain or materialized)
+        # changed since their creation, the new definition is
+        # applied by _create_views. Yield the name of each view
+        # dropped and the statement.
+        stored = self._stored_definitions(META_VIEW_PREFIX, trn)
+        db_views = None
         for name, view in self.views.items():
+            previous = stored.get(name)
+            if previous == self.view_definition(view):
+                continue
+            if previous is not None:
+                was_materialized = previous.startswith("materialized:")
+            elif view.materialized:
+                # Unknown definition: an existing materialized view is
+                # kept but a plain view with the same name is replaced
+                if db_views is None:
+                    db_views = self._db_views(trn=trn)
+                if name not in db_views:
+                    continue
+                was_materialized = False
+            else:
+                # Plain views are replaced on creation
+                continue
+            tpl = "drop_materialized_view" if was_materialized else "drop_view"
+            yield name, Statement(tpl, trn.flavor, name=name)()
+
+    def _create_views(self, trn: Transaction, db_indexes=()):
+        dropped = []
+        for name, stmt in self._drop_changed_views(trn):
+            dropped.append(f"{name}_idx")
+            yield stmt
+        # Indexes of dropped views are dropped with them
+        db_indexes = [i for i in db_indexes if i not in dropped]
+        for name, view in self.views.items():
+            if view.materialized:
+                yield from self._create_materialized_view(view, db_indexes, trn)
+                continue
             if trn.flavor == "sqlite":
                 # SQLite does not support OR REPLACE
                 stmt = Statement(
@@ -250,6 +427,28 @@ class Schema:
             )
             yield stmt()
 
+    def _create_materialized_view(self, view: "View", db_indexes, trn: Transaction):
+        # Existing materialized views are kept as is (unless their
+        # definition changed, see _drop_changed_views), they are
+        # updated with View.refresh
+        stmt = Statement(
+            "create_materialized_view",
+            trn.flavor,
+            name=view.name,
+            view_def=view.view_def(),
+        )
+        yield stmt()
+        # Unique index, needed by concurrent refresh
+        natural_key = view.table.natural_key
+        if natural_key and f"{view.name}_idx" not in db_indexes:
+            stmt = Statement(
+                "create_unique_index",
+                trn.flavor,
+                table=view.name,
+                natural_key=natural_key,
+            )
+            yield stmt()
+
     def _create_tables(
         self, db_columns: dict[str, dict[str, str]], trn: Transaction | DummyTransaction
     ):
@@ -375,38 +574,326 @@ class Schema:
             )
             yield stmt()
 
+    def _index_statements(self, flavor: str):
+        # Yield declared indexes (and foreign key indexes) supported
+        # by `flavor` along with their create statement
+        for table in self.tables.values():
+            if table.is_view:
+                continue
+            if flavor == "mssql" and table.has_array:
+                continue
+            for index in table.secondary_indexes():
+                if stmt := index.stmt(flavor):
+                    yield index, stmt
+
+    def _create_secondary_indexes(self, db_indexes, trn):
+        # Add indexes missing in the database, indexes whose
+        # definition changed since their creation (see
+        # Schema.create_tables) are dropped and created again
+        stored = self._stored_definitions(META_INDEX_PREFIX, trn)
+        for index, stmt in self._index_statements(trn.flavor):
+            if index.name in db_indexes:
+                previous = stored.get(index.name)
+                if previous is None:
+                    msg = (
+                        f"Index '{index.name}' was not created by nagra, it is "
+                        "kept as is (drop it to apply the schema definition)"
+                    )
+                    warn(msg, RuntimeWarning)
+                    continue
+                if previous == self.index_definition(stmt):
+                    continue
+                yield Statement(
+                    "drop_index", trn.flavor, name=index.name, table=index.table.name
+                )()
+            yield stmt
+
     def setup_statements(self, trn: Optional[Transaction] = None):
         trn = trn or Transaction.current()
         # Find existing tables and columns
-        db_columns = self._db_columns(trn)
+        db_columns = self._db_columns(trn=trn)
         db_fks = self._db_fk(trn=trn)
         db_indexes = self._db_indexes(trn)
 
         yield from self._create_tables(db_columns, trn)
         yield from self._add_columns(db_columns, db_fks=db_fks, trn=trn)
         yield from self._create_indexes(db_indexes, trn)
-        yield from self._create_views(trn)
+        yield from self._create_secondary_indexes(db_indexes, trn)
+        yield from self._create_views(trn, db_indexes)
 
-    def create_tables(self, trn=None):
+    def create_tables(self, trn=None, force: bool = False):
         """
-        Create tables, indexes and foreign keys
+        Create tables, indexes and foreign keys. The fingerprint of
+        the schema (see `Schema.ddl_fingerprint`) is stored in the
+        `nagra_meta` table, in a row per schema (see
+        `Schema.fingerprint_key`): if it matches, the database is not
+        introspected and nothing is done (unless `force` is true).
+        The definitions of the views are also stored, a view whose
+        definition changed is dropped and created again.
+
+        Fingerprints are cleared when tables or views are dropped
+        with nagra (`Table.drop`, `View.drop` or `Schema.drop`),
+        `force` must be used after changing the database by other
+        means (manual DDL, migration tools, ...).
         """
         trn = trn or Transaction.current()
+        fingerprint = self.ddl_fingerprint(trn)
+        key = self.fingerprint_key()
+        meta = self._meta_table(trn)
+        if meta and not force:
+            select = meta.select("value", trn=trn).where("(= name {})")
+            row = select.one(key)
+            if row and row[0] == fingerprint:
+                return
+
+        # Existing indexes not created by nagra are kept, their
+        # definition is unknown
+        stored = self._stored_definitions(META_INDEX_PREFIX, trn)
+        unknown = set(self._db_indexes(trn)) - stored.keys()
+
         # Loop on setup statements and execute them
         for stm in self.setup_statements(trn=trn):
             trn.execute(stm)
 
+        if not meta:
+            meta = self._meta_table(trn, create=True)
+        upsert = meta.upsert("name", "value", trn=trn)
+        upsert.execute(key, fingerprint)
+        upsert.executemany(
+            (META_VIEW_PREFIX + name, self.view_definition(view))
+            for name, view in self.views.items()
+        )
+        upsert.executemany(
+            (META_INDEX_PREFIX + index.name, self.index_definition(stmt))
+            for index, stmt in self._index_statements(trn.flavor)
+            if index.name not in unknown
+        )
+
+    def ddl_fingerprint(self, trn: Optional[Transaction] = None) -> str:
+        """
+        Return a hash of the definitions used to generate the tables
+        and views of the schema (column types, keys, defaults and
+        view definitions)
+        """
+        trn = trn or Transaction.current()
+        tables = [
+            (
+                table.name,
+                table.ctypes(trn.flavor, table.columns),
+                table.natural_key,
+                table.primary_key,
+                table.foreign_keys,
+                sorted(table.not_null),
+                table.default,
+                [idx.stmt(trn.flavor) for idx in table.secondary_indexes()],
+            )
+            for table in self.tables.values()
+            if not table.is_view
+        ]
+        views = [
+            (view.name, view.view_def(), view.materialized)
+            for view in self.views.values()
+        ]
+        return self._fingerprint(trn.flavor, tables, views)
+
+    def fingerprint_key(self) -> str:
+        """
+        Return the name of the row holding the fingerprint of the
+        schema in the metadata table, based on the names of its
+        tables and views. Schemas sharing a database (with different
+        tables) do not overwrite each other's fingerprint.
+        """
+        names = sorted(self.tables)
+        return META_FINGERPRINT_PREFIX + sha256(repr(names).encode()).hexdigest()[:16]
+
     @classmethod
-    def from_db(cls, trn: Optional[Transaction] = None) -> "Schema":
+    def clear_fingerprint(cls, trn: Optional[Transaction] = None):
+        """
+        Remove the fingerprints of all the schemas, next call to
+        `Schema.create_tables` will introspect the database
+        """
+        trn = trn or Transaction.current()
+        if meta := cls._meta_table(trn):
+            meta.delete(trn=trn).where(
+                f"(like name '{META_FINGERPRINT_PREFIX}%')"
+            ).execute()
+
+    @classmethod
+    def _meta_table(cls, trn: Transaction, create: bool = False) -> Optional["Table"]:
+        """
+        Return the metadata table (it is not part of any user schema),
+        or None if it does not exist in the database and `create` is
+        false.
+        """
+        from nagra.table import Table
+
+        schema = cls()
+        meta = Table(
+            META_TABLE,
+            columns={"name": "varchar", "value": "varchar"},
+            natural_key=["name"],
+            schema=schema,
+        )
+        if create:
+            for stm in chain(schema._create_tables({}, trn), schema._create_indexes((), trn)):
+                trn.execute(stm)
+        elif META_TABLE not in cls._db_columns(META_TABLE, trn=trn):
+            return None
+        return meta
+
+    @classmethod
+    def from_db(
+        cls,
+        trn: Optional[Transaction] = None,
+        cache_path: Optional[str | Path] = None,
+        lazy: bool = False,
+    ) -> "Schema":
         """
         Instanciate a nagra Schema (and Tables) based on database
-        schema
+        schema. If `cache_path` is given, the schema is pickled in
+        this file and re-used as long as the fingerprint of the
+        database catalog is unchanged (see `Schema.db_fingerprint`).
+
+        If `lazy` is true, no table is introspected upfront:
+        `Schema.get` introspects a table (and the tables reachable
+        through its foreign keys) on first access, with the current
+        transaction. `Schema.tables` only contains the tables
+        accessed so far. Unknown names are remembered, they are not
+        looked up again until `Schema.reset` (or an explicit
+        `Schema.introspect_db`) is called.
         """
+        if lazy:
+            if cache_path is not None:
+                raise ValueError("Lazy schemas can not be snapshotted")
+            schema = Schema()
+            schema.lazy = True
+            schema._lock = threading.RLock()
+            return schema
+
         trn = trn or Transaction.current()
-        schema = Schema()
-        schema.introspect_db(trn=trn)
+        if cache_path is None:
+            schema = Schema()
+            schema.introspect_db(trn=trn)
+            return schema
+
+        path = Path(cache_path)
+        fingerprint = cls.db_fingerprint(trn=trn)
+        schema = cls.load_snapshot(path, fingerprint)
+        if schema is None:
+            schema = Schema()
+            schema.introspect_db(trn=trn)
+            schema.dump_snapshot(path, fingerprint)
         return schema
 
+    @classmethod
+    def db_fingerprint(cls, trn: Optional[Transaction] = None, pg_schema="public") -> str:
+        """
+        Return a hash of the database catalog (tables, columns,
+        constraints, indexes and views), computed with a single
+        query.
+        """
+        trn = trn or Transaction.current()
+        stmt = Statement("catalog_fingerprint", trn.flavor, pg_schema=pg_schema)
+        rows = list(trn.execute(stmt()))
+        return cls._fingerprint(trn.flavor, rows)
+
+    @staticmethod
+    def _fingerprint(*content) -> str:
+        # Snapshots are also invalidated on nagra upgrades
+        from nagra import __version__
+
+        return sha256(repr((__version__, content)).encode()).hexdigest()
+
+    @classmethod
+    def load_snapshot(cls, path: str | Path, fingerprint: str) -> Optional["Schema"]:
+        """
+        Load the schema pickled in `path`, return None if the file
+        does not exist or if its fingerprint is different. Files
+        that are not owned by the current user, or that other users
+        can write, are ignored (unpickling runs arbitrary code).
+        """
+        try:
+            with open(path, "rb") as fh:
+                stat = os.fstat(fh.fileno())
+                if hasattr(os, "getuid") and (
+                    stat.st_uid != os.getuid() or stat.st_mode & 0o022
+                ):
+                    msg = "Schema snapshot '%s' ignored: not private to the current user"
+                    logger.warning(msg, path)
+                    return None
+                # The fingerprint is pickled first, so that outdated
+                # snapshots are not unpickled
+                if pickle.load(fh) != fingerprint:
+                    return None
+                schema = pickle.load(fh)
+            # Update modification time, used for eviction
+            os.utime(path)
+            return schema
+        except FileNotFoundError:
+            return None
+        except Exception as exc:
+            logger.warning("Unable to load schema snapshot '%s': %s", path, exc)
+            return None
+
+    def dump_snapshot(self, path: str | Path, fingerprint: str):
+        """
+        Pickle the schema in `path`, along with `fingerprint`. The
+        directory is created readable by the current user only and
+        the file is only readable and writable by the current user.
+        """
+        path = Path(path)
+        path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        # Write to temporary file first, concurrent readers only see
+        # complete snapshots
+        tmp = path.with_name(f"{path.name}.{uuid4().hex}.tmp")
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                pickle.dump(fingerprint, fh)
+                pickle.dump(self, fh, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        finally:
+            tmp.unlink(missing_ok=True)
+
+    @staticmethod
+    def evict_snapshots(directory: str | Path, max_age: float = SNAPSHOT_MAX_AGE):
+        """
+        Remove the snapshots of `directory` (`schema-*.pickle` files)
+        not used for `max_age` seconds
+        """
+        limit = time.time() - max_age
+        for path in Path(directory).glob("schema-*.pickle"):
+            try:
+                if path.stat().st_mtime < limit:
+                    path.unlink()
+            except FileNotFoundError:
+                continue
+
+    def _introspect_lazily(self, name: str):
+        """
+        Introspect table `name` and the tables reachable through its
+        foreign keys (one batch of catalog queries per level of
+        foreign keys).
+        """
+        with self._lock:
+            # Table may have been loaded by a concurrent call
+            if name in self.tables or name in self._missing:
+                return
+            trn = Transaction.current()
+            todo = {name}
+            while todo:
+                logger.debug("Introspect tables %s", ", ".join(sorted(todo)))
+                self.introspect_db(*todo, trn=trn)
+                todo = {
+                    ftable
+                    for tbl in todo
+                    if tbl in self.tables
+                    for ftable in self.tables[tbl].foreign_keys.values()
+                    if ftable not in self.tables
+                }
+            if name not in self.tables:
+                self._missing.add(name)
+
     def introspect_db(self, *tables: str, trn: Optional[Transaction] = None):
         """
         Instanciate Table instances based on database content. If
@@ -418,13 +905,14 @@ class Schema:
 
         trn = trn or Transaction.current()
         db_fk = self._db_fk(*tables, trn=trn)
-        db_pk = self._db_pk(trn=trn)
-        db_unique = self._db_unique(db_pk, trn=trn)
-        db_columns = self._db_columns(trn=trn)
-        db_views = self._db_views(trn=trn)
+        db_pk = self._db_pk(*tables, trn=trn)
+        db_unique = self._db_unique(db_pk, *tables, trn=trn)
+        db_columns = self._db_columns(*tables, trn=trn)
+        db_views = self._db_views(*tables, trn=trn)
+        self._missing.difference_update(db_columns)
 
         for table_name, cols in db_columns.items():
-            if tables and table_name not in tables:
+            if table_name == META_TABLE:
                 continue
             fks = {fk.column: fk.foreign_table for fk in db_fk[table_name].values()}
             if view_def := db_views.get(table_name):
@@ -450,8 +938,12 @@ class Schema:
 
     def drop(self, trn=None):
         trn = trn or Transaction.current()
+        # Views first, they depend on tables
+        for view in self.views.values():
+            view.drop(trn)
         for table in self.tables.values():
-            table.drop(trn)
+            if not table.is_view:
+                table.drop(trn)
 
     def generate_d2(self):
         tpl = template("misc/schema.d2")
@@ -482,11 +974,13 @@ class Schema:
     def generate_toml(self):
         tpl = template("misc/schema-table.toml")
         tables = self.tables.values()
+        # Rollup tables are created by the rollup definition
+        rollups = {r.name for t in tables for r in t.rollups.values()}
 
         res = "\n".join(tpl.render(
             table=t,
             skip_col=lambda c: c == "id" and t.primary_key == "id",
-        ) for t in tables if not t.is_view)
+        ) for t in tables if not t.is_view and t.name not in rollups)
 
         tpl = template("misc/schema-view.toml")
         res += "\n".join(tpl.render(view=v) for v in self.views.values())
@@ -1,23 +1,48 @@
+import json
 import re
-from collections.abc import Iterable
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections.abc import Iterable, Iterator
+from copy import copy
 from dataclasses import dataclass, make_dataclass, fields as dataclass_fields
-from datetime import datetime, date
-from itertools import islice, repeat, takewhile
+from datetime import datetime, date, time
+from decimal import Decimal
+from itertools import chain, islice, repeat, takewhile
 from typing import Optional, Union, TYPE_CHECKING
+from uuid import UUID
 
 from nagra import Statement, Schema
+from nagra.cache import freeze, result_cache
 from nagra.exceptions import ValidationError
-from nagra.sexpr import AST, AggToken
-from nagra.utils import snake_to_pascal, get_table_from_dataclass, iter_dataclass_cols
+from nagra.prepared import PreparedQuery
+from nagra.sexpr import AST, AggToken, adapt_args, sequence_positions
+from nagra.transaction import ListCursor
+from nagra.utils import (
+    get_table_from_dataclass,
+    iter_dataclass_cols,
+    logger,
+    snake_to_pascal,
+)
 
 if TYPE_CHECKING:
+    from nagra.cache import DataFrameCache
     from nagra.table import Env, Table
     from nagra.transaction import Transaction
     from pandas import DataFrame
-    from polars import LazyFrame
+    from polars import DataFrame as PolarsDataFrame, LazyFrame, Series
 
 RE_VALID_IDENTIFIER = re.compile(r"\W|^(?=\d)")
 
+# Types of the values encoded with a tag in cursor tokens (see
+# Select.cursor_token), other values are stored as plain json
+CURSOR_TYPES = {
+    "datetime": (datetime, datetime.isoformat, datetime.fromisoformat),
+    "date": (date, date.isoformat, date.fromisoformat),
+    "time": (time, time.isoformat, time.fromisoformat),
+    "decimal": (Decimal, str, Decimal),
+    "uuid": (UUID, str, UUID),
+    "bytes": (bytes, bytes.hex, bytes.fromhex),
+}
+
 
 def clean_col(name):
     return RE_VALID_IDENTIFIER.sub("_", name)
@@ -35,47 +60,63 @@ class Select:
         self.table = table
         self.env = env
         self.where_asts = tuple()
+        self.where_exprs = tuple()
         self._offset = None
         self._limit = None
         self.distinct_on_ast = tuple()
+        self.distinct_on_exprs = tuple()
         self._aliases = tuple()
         self.groupby_ast = tuple()
+        self.groupby_exprs = tuple()
         self.order_ast = tuple()
+        self.order_exprs = tuple()
         self.order_directions = tuple()
         self.columns = tuple()
         self.columns_ast = tuple()
         self.query_columns = tuple()
         self.distinct = distinct
         self.trn = trn
+        # Memoized statement, see Select.stm
+        self._stm = None
+        self._sequences = None
+        # Keyset predicate arguments, see Select.after
+        self._seek_args = None
+        # Result cache, see Select.cached
+        self._cached = False
+        self._cache_ttl = None
+        self._tables = None
         self._add_columns(columns)
 
     def _add_columns(self, columns):
+        asts = tuple(AST.parse(c) for c in columns)
         self.columns += columns
-        self.columns_ast += tuple(AST.parse(c) for c in columns)
-        self.query_columns += tuple(
-            a.eval(self.env, self.trn.flavor) for a in self.columns_ast
-        )
+        self.columns_ast += asts
+        self.query_columns += tuple(a.eval(self.env, self.trn.flavor) for a in asts)
 
     def clone(self, trn: Optional["Transaction"] = None):
         """
-        Return a copy of select with updated parameters
+        Return a copy of select with updated parameters. Parsed
+        expressions and evaluated columns are shared with the copy
+        (they are stored in tuples and never mutated).
         """
         trn = trn or self.trn
-        cln = Select(self.table, *self.columns, trn=trn, env=self.env.clone())
-        cln.where_asts = self.where_asts
-        cln.groupby_ast = self.groupby_ast
-        cln.order_ast = self.order_ast
-        cln.order_directions = self.order_directions
-        cln._limit = self._limit
-        cln._offset = self._offset
-        cln._aliases = self._aliases
-        cln.distinct_on_ast = self.distinct_on_ast
-        cln.distinct = self.distinct
+        cln = copy(self)
+        cln.env = self.env.clone()
+        cln._stm = None
+        cln._sequences = None
+        cln._tables = None
+        if trn.flavor != self.trn.flavor:
+            # Quoting depends on flavor
+            cln.query_columns = tuple(
+                a.eval(cln.env, trn.flavor) for a in self.columns_ast
+            )
+        cln.trn = trn
         return cln
 
     def where(self, *conditions: str):
         cln = self.clone()
         cln.where_asts += tuple(AST.parse(cond) for cond in conditions)
+        cln.where_exprs += conditions
         return cln
 
     def aliases(self, *names: str):
@@ -90,6 +131,7 @@ class Select:
         assert not self.distinct, "distinct and distinct_on can not be combined"
         cln = self.clone()
         cln.distinct_on_ast += tuple(AST.parse(n) for n in names)
+        cln.distinct_on_exprs += names
         return cln
 
     def select(self, *columns: str):
@@ -110,6 +152,7 @@ class Select:
     def groupby(self, *groups: str):
         cln = self.clone()
         cln.groupby_ast += tuple(AST.parse(g) for g in groups)
+        cln.groupby_exprs += groups
         return cln
 
     def orderby(self, *orders: str | tuple[str, str]):
@@ -130,9 +173,193 @@ class Select:
 
         cln = self.clone()
         cln.order_ast += tuple(AST.parse(e) for e in expressions)
+        cln.order_exprs += tuple(expressions)
         cln.order_directions += tuple(directions)
         return cln
 
+    def after(self, cursor_token: Optional[str]):
+        """
+        Return a select restricted to the records following the one
+        identified by `cursor_token` (see `Select.cursor_token`),
+        based on the orderby expressions (keyset pagination). Those
+        expressions must identify records uniquely (for example a
+        natural key) and must not be null. A `None` token returns
+        the select unchanged (first page).
+        """
+        if cursor_token is None:
+            return self
+        try:
+            values = json.loads(urlsafe_b64decode(cursor_token.encode()))
+            if not isinstance(values, list) or len(values) != len(self.order_exprs):
+                raise ValueError
+            values = [decode_cursor_value(v) for v in values]
+        except ValueError as exc:
+            raise ValidationError(f"Invalid cursor token: {cursor_token}") from exc
+        return self._seek(values)
+
+    def cursor_token(self, row: tuple) -> str:
+        """
+        Return a token identifying `row` for `Select.after`. Values
+        are json encoded, dates, decimals, uuids and bytes are tagged
+        with their type so `after` gets back the original values.
+        """
+        values = [encode_cursor_value(row[pos]) for pos in self._order_positions()]
+        return urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+    def paginate(
+        self,
+        *args,
+        by: Iterable[str | tuple[str, str]] = (),
+        page_size: int = 1000,
+    ) -> Iterator[list[tuple]]:
+        """
+        Execute the query and yield lists of at most `page_size`
+        rows. `by` (same format as `Select.orderby`) gives the
+        ordering, each page is selected with a predicate on the last
+        values of the previous page (keyset pagination) so the cost
+        of a page does not depend on its depth. Ordering expressions
+        must identify records uniquely and must not be null.
+        """
+        select = self
+        if by:
+            if self.order_exprs:
+                raise ValidationError("paginate: orderby and by can not be combined")
+            select = select.orderby(*by)
+        if not select.order_exprs:
+            raise ValidationError("paginate: no ordering given")
+
+        # Add ordering expressions not part of the selected columns
+        width = len(select.columns)
+        missing = [e for e in select.order_exprs if e not in select.columns]
+        if missing:
+            select = select.select(*missing)
+            if select._aliases:
+                # Aliases are zipped with the columns (see _compile)
+                select = select.aliases(*missing)
+        select = select.limit(page_size)
+        positions = select._order_positions()
+
+        # Pages are selected from the select without the keyset
+        # predicate of `after` (if any)
+        page_select, select = select, select._without_seek()
+        while True:
+            page = page_select.execute(*args).fetchall()
+            if not page:
+                return
+            last = page[-1]
+            yield [row[:width] for row in page] if missing else page
+            if len(page) < page_size:
+                return
+            page_select = select._seek([last[pos] for pos in positions])
+
+    def _order_positions(self) -> list[int]:
+        positions = []
+        for expr in self.order_exprs:
+            if expr not in self.columns:
+                raise ValidationError(
+                    f"Ordering expression '{expr}' must be part of the selected columns"
+                )
+            positions.append(self.columns.index(expr))
+        return positions
+
+    def _seek(self, values: list):
+        """
+        Add the keyset predicate selecting records after `values`
+        (one per orderby expression)
+        """
+        if not self.order_exprs:
+            raise ValidationError("keyset pagination requires an orderby")
+        if self._seek_args is not None:
+            raise ValidationError("Select.after can only be applied once")
+        # Build one term per expression, eg for 3 expressions:
+        # (or (> a {}) (and (= a {}) (> b {})) (and (= a {}) (= b {}) (> c {})))
+        ops = [
+            "<" if d.lower().startswith("desc") else ">" for d in self.order_directions
+        ]
+        terms = []
+        args = []
+        for pos, (expr, op) in enumerate(zip(self.order_exprs, ops)):
+            conds = [f"(= {e} {{}})" for e in self.order_exprs[:pos]]
+            conds.append(f"({op} {expr} {{}})")
+            terms.append(conds[0] if len(conds) == 1 else f"(and {' '.join(conds)})")
+            args.extend(values[: pos + 1])
+        # Leading predicate on the first expression, usable by an index
+        lead = f"({ops[0]}= {self.order_exprs[0]} {{}})"
+        cond = terms[0] if len(terms) == 1 else f"(and {lead} (or {' '.join(terms)}))"
+        if len(terms) > 1:
+            args.insert(0, values[0])
+
+        cln = self.where(cond)
+        cln._seek_args = (len(self.where_asts), tuple(args))
+        return cln
+
+    def _without_seek(self):
+        # Return a copy of select without the keyset predicate
+        if self._seek_args is None:
+            return self
+        where_pos, _ = self._seek_args
+        cln = self.clone()
+        cln.where_asts = self.where_asts[:where_pos] + self.where_asts[where_pos + 1 :]
+        cln.where_exprs = (
+            self.where_exprs[:where_pos] + self.where_exprs[where_pos + 1 :]
+        )
+        cln._seek_args = None
+        return cln
+
+    def _seek_position(self) -> int:
+        # Position of the first argument of the keyset predicate
+        where_pos, _ = self._seek_args
+        asts = chain(
+            self.distinct_on_ast, self.columns_ast, self.where_asts[:where_pos]
+        )
+        return sum(len(a.params()) for a in asts)
+
+    def _bind_seek(self, args):
+        # Insert arguments of the keyset predicate (see Select._seek)
+        if self._seek_args is None:
+            return args
+        args = tuple(args)
+        pos = self._seek_position()
+        return args[:pos] + self._seek_args[1] + args[pos:]
+
+    def cached(self, ttl: Optional[float] = None) -> "Select":
+        """
+        Return a copy of select whose results are cached (by
+        statement and arguments) in the process-level
+        `nagra.cache.result_cache`, for at most `ttl` seconds. Cached
+        results are invalidated when one of the tables read by the
+        query (see `Select.tables`) is written by an upsert, update,
+        delete or copy_from.
+        """
+        cln = self.clone()
+        cln._cached = True
+        cln._cache_ttl = ttl
+        return cln
+
+    def tables(self) -> frozenset[str]:
+        """
+        Return names of the tables read by the query: the base table,
+        the joined ones and the tables behind views.
+        """
+        if self._tables is None:
+            self._tables = self._read_tables()
+        return self._tables
+
+    def _read_tables(self, opaque: bool = True) -> frozenset[str]:
+        # Tables behind views defined with `as_select` are only
+        # listed when `opaque` is true (see View.tables)
+        env = self.env.clone()
+        for ast in self._param_asts():
+            ast.eval(env, self.trn.flavor)
+        names = {self.table.name}
+        names.update(self.table.join_on(prefix)[0].name for prefix in env.refs)
+        schema = self.table.schema
+        for name in list(names):
+            view = schema.views.get(name)
+            if view and (opaque or not view.as_select):
+                names.update(view.tables())
+        return frozenset(names)
+
     def to_dataclass(self, *aliases: str, model_name=None, nest=False) -> dataclass:
         aliases = aliases or self._aliases
         fields = {}
@@ -241,7 +468,82 @@ class Select:
             groupby_ast.append(a)
         return groupby_ast
 
+    def _param_asts(self):
+        # Expressions in the order of their placeholders in the statement
+        groupby_ast = self.groupby_ast or self.infer_groupby()
+        return chain(
+            self.distinct_on_ast,
+            self.columns_ast,
+            self.where_asts,
+            groupby_ast,
+            self.order_ast,
+        )
+
+    def params(self) -> tuple[str, ...]:
+        """
+        Return names of the query parameters (an empty string for
+        anonymous ones) in the order of their placeholders. The
+        parameters of the keyset predicate added by `Select.after`
+        are bound to the select and are not part of the result.
+        """
+        params = tuple(name for ast in self._param_asts() for name in ast.params())
+        if self._seek_args is None:
+            return params
+        pos = self._seek_position()
+        return params[:pos] + params[pos + len(self._seek_args[1]) :]
+
+    def sequence_params(self) -> tuple[int, ...]:
+        """
+        Return positions of the parameters expecting a sequence of
+        values (see `AST.is_in_sequence`), among all the parameters
+        including the ones bound by `Select.after`
+        """
+        if self._sequences is None:
+            self._sequences = sequence_positions(self._param_asts())
+        return self._sequences
+
+    def prepare(self) -> "PreparedQuery":
+        """
+        Return a PreparedQuery, the statement is compiled once and
+        can be executed many times with named parameters, eg:
+        `select.where("(= name {name})").prepare().execute(name="Bob")`
+        """
+        return PreparedQuery(self)
+
+    def shape(self) -> tuple:
+        """
+        Return a hashable description of the query, two selects with
+        the same shape generate the same statement.
+        """
+        return (
+            "select",
+            self.table,
+            self.trn.flavor,
+            self.columns,
+            self.where_exprs,
+            self.groupby_exprs,
+            self.order_exprs,
+            self.order_directions,
+            self.distinct_on_exprs,
+            self.distinct,
+            self._limit,
+            self._offset,
+            self._aliases,
+        )
+
     def stm(self):
+        """
+        Return the SQL statement. It is memoized on the instance
+        (clones are created on each change) and shared with other
+        instances with the same shape.
+        """
+        if self._stm is None:
+            self._stm = self.table.schema.stm_cache.get_or_set(
+                self.shape(), self._compile
+            )
+        return self._stm
+
+    def _compile(self):
         # Eval where conditions
         where_conditions = [
             ast.eval(self.env, self.trn.flavor) for ast in self.where_asts
@@ -286,38 +588,85 @@ class Select:
         )
         return stm()
 
-    def to_polars(self, *args, schema_overrides: dict | None = None) -> "LazyFrame":
+    def to_polars(
+        self,
+        *args,
+        schema_overrides: dict | None = None,
+        batch_size: int = 10_000,
+        cache: Optional["DataFrameCache"] = None,
+    ) -> "LazyFrame":
         """
         Execute the query with given args and return a polars
         LazyFrame. Optionally, `schema_overrides` can be provided to
         override the column types inferred from the database schema
-        and the query operations.
-
-        Only supported with PostgreSQL.
+        and the query operations. Records are fetched by batches of
+        `batch_size` rows, see `Select.iter_polars`. If `cache` is
+        given, the dataframe is read from (or stored in) the on-disk
+        cache, see `nagra.cache.DataFrameCache`.
         """
-        assert self.trn.flavor != "sqlite", "Polars is only supported with Postgresql"
+        if cache is not None:
+            return cache.to_polars(
+                self, *args, schema_overrides=schema_overrides, batch_size=batch_size
+            )
         import polars
 
-        schema = self.dtypes(with_optional=False)
-        cursor = self.execute(*args)
-        pl_schema = dict(schema)
-        if self._aliases:
-            mapping = zip((n for n, _ in schema), self._aliases)
-            for old, new in mapping:
-                pl_schema[new] = pl_schema.pop(old)
+        frames = self.iter_polars(
+            *args, schema_overrides=schema_overrides, batch_size=batch_size
+        )
+        df = polars.concat(frames, how="vertical_relaxed", rechunk=False)
+        return df.lazy()
+
+    def iter_polars(
+        self,
+        *args,
+        schema_overrides: dict | None = None,
+        batch_size: int = 10_000,
+    ) -> Iterator["PolarsDataFrame"]:
+        """
+        Execute the query with given args and yield polars
+        DataFrames of at most `batch_size` rows. Each dataframe is
+        built column-wise from a `fetchmany` batch, based on the
+        types returned by `Select.dtypes`. At least one (possibly
+        empty) dataframe is yielded.
+        """
+        from polars import DataFrame
+
+        names = self._aliases or self.columns
+        types = [dt for _, dt in self.dtypes(with_optional=False)]
+        pl_schema = dict(zip(names, types))
         if schema_overrides:
             pl_schema.update(schema_overrides)
-        df = polars.LazyFrame(cursor, schema=pl_schema)
-        return df
+
+        cursor = self.execute(*args)
+        empty = True
+        while rows := cursor.fetchmany(batch_size):
+            empty = False
+            by_col = zip(*rows)
+            yield DataFrame(
+                [
+                    polars_series(name, col, dt)
+                    for (name, dt), col in zip(pl_schema.items(), by_col)
+                ]
+            )
+        if empty:
+            yield DataFrame(
+                [polars_series(name, [], dt) for name, dt in pl_schema.items()]
+            )
 
     def to_pandas(
-        self, *args, chunked: int = 0
+        self, *args, chunked: int = 0, cache: Optional["DataFrameCache"] = None
     ) -> Union["DataFrame", Iterable["DataFrame"]]:
         """
         Execute the query with given args and return a pandas
         DataFrame. If chunked is bigger than 0, return an iterable
-        yielding dataframes.
+        yielding dataframes. If `cache` is given, the dataframe is
+        read from (or stored in) the on-disk cache, see
+        `nagra.cache.DataFrameCache`.
         """
+        if cache is not None:
+            if chunked > 0:
+                raise ValidationError("Chunked dataframes can not be cached")
+            return cache.to_pandas(self, *args)
         names, dtypes = zip(*(self.dtypes(with_optional=False)))
         cursor = self.execute(*args)
         if chunked <= 0:
@@ -330,37 +679,27 @@ class Select:
             self.create_df(chunk, names, dtypes) for chunk in takewhile(bool, chunkify)
         )
 
-    def create_df(self, cursor: Iterable[tuple], names: tuple[str, ...], dtypes: tuple):
+    def create_df(
+        self,
+        cursor: Iterable[tuple],
+        names: tuple[str, ...],
+        dtypes: tuple,
+        batch_size: int = 10_000,
+    ):
         """
         Create a Dataframe, whose columns name are `names` and
-        types `dtypes`.
+        types `dtypes`. Records are consumed by batches of
+        `batch_size` rows and accumulated in a `ColumnBuilder`.
         """
-        from pandas import DataFrame, Series, to_datetime
-
-        df = DataFrame()
-        by_col = zip(*cursor)
-        for name, dt, col in zip(names, dtypes, by_col):
-            # FIXME Series(col, dtype=dt) fail on json cols!
-            srs = Series(col)
-            if dt in (datetime, date):
-                srs = to_datetime(srs)
-            else:
-                if dt == int:
-                    # Make sure we have no nan for int columns
-                    srs = srs.fillna(0)
-                try:
-                    srs = srs.astype(dt)
-                except TypeError:
-                    # Fallback to string if type is not supported by pandas
-                    srs = srs.astype(str)
-            df[name] = srs
-
-        if df.columns.empty:
-            # No records were returned by the cursor
-            df = DataFrame(columns=names)
-        if self._aliases:
-            df.columns = self._aliases
-        return df
+        if isinstance(cursor, list):
+            builder = ColumnBuilder(dtypes, capacity=len(cursor))
+            builder.add(cursor)
+        else:
+            builder = ColumnBuilder(dtypes, capacity=batch_size)
+            cursor = iter(cursor)
+            while batch := list(islice(cursor, batch_size)):
+                builder.add(batch)
+        return builder.to_pandas(self._aliases or names)
 
     def to_dict(self, *args, nest=False) -> Iterable[dict]:
         if nest:
@@ -381,18 +720,229 @@ class Select:
             yield autonest(record)
 
     def execute(self, *args):
+        args = self._bind_seek(args)
+        args = adapt_args(args, self.sequence_params(), self.trn.flavor)
+        if self._cached:
+            return self._execute_cached(args)
         return self.trn.execute(self.stm(), args)
 
+    def _execute_cached(self, args):
+        try:
+            key = (self.trn.cache_id, self.stm(), freeze(args))
+            hash(key)
+        except TypeError:
+            # Unhashable arguments
+            return self.trn.execute(self.stm(), args)
+        tables = self.tables()
+        # Results depending on uncommitted writes are neither shared
+        # nor read from the cache (they would hide those writes)
+        if tables & self.trn._written:
+            return self.trn.execute(self.stm(), args)
+        rows = result_cache.get(key)
+        if rows is None:
+            # Tables written while the query runs make its result stale
+            generation = result_cache.generation(tables)
+            rows = tuple(self.trn.execute(self.stm(), args))
+            result_cache.set(
+                key, rows, tables, ttl=self._cache_ttl, generation=generation
+            )
+        return ListCursor(rows)
+
     def executemany(self, args):
+        positions = self.sequence_params()
+        if self._seek_args is not None or positions:
+            args = [
+                adapt_args(self._bind_seek(a), positions, self.trn.flavor)
+                for a in args
+            ]
         return self.trn.executemany(self.stm(), args)
 
     def one(self, *args):
-        return self.trn.execute(self.stm(), args).fetchone()
+        return self.execute(*args).fetchone()
 
     def __iter__(self):
         return iter(self.execute())
 
 
+class ColumnBuilder:
+    """
+    Accumulate records into one pre-allocated numpy buffer per
+    column. Buffers of int, float and bool columns are typed and null
+    values are tracked in a mask (int and bool columns with nulls give
+    nullable Int64 and boolean columns), other columns are kept as
+    object arrays. Buffers grow (by doubling their capacity) when
+    needed.
+    """
+
+    typed = {int: "int64", float: "float64", bool: "bool"}
+    # Value used in place of nulls in typed buffers
+    fill_values = {int: 0, float: float("nan"), bool: False}
+
+    def __init__(self, dtypes: tuple, capacity: int = 1024):
+        import numpy
+
+        self.dtypes = list(dtypes)
+        self.capacity = max(capacity, 1)
+        self.size = 0
+        self.buffers = [
+            numpy.empty(self.capacity, dtype=self.typed.get(dt, object))
+            for dt in self.dtypes
+        ]
+        self.masks = [
+            numpy.zeros(self.capacity, dtype=bool) if dt in self.typed else None
+            for dt in self.dtypes
+        ]
+
+    def grow(self, min_capacity: int):
+        import numpy
+
+        capacity = self.capacity
+        while capacity < min_capacity:
+            capacity *= 2
+        for pos, buf in enumerate(self.buffers):
+            new_buf = numpy.empty(capacity, dtype=buf.dtype)
+            new_buf[: self.size] = buf[: self.size]
+            self.buffers[pos] = new_buf
+            mask = self.masks[pos]
+            if mask is not None:
+                new_mask = numpy.zeros(capacity, dtype=bool)
+                new_mask[: self.size] = mask[: self.size]
+                self.masks[pos] = new_mask
+        self.capacity = capacity
+
+    def add(self, rows: list[tuple]):
+        """
+        Copy a batch of rows into the buffers
+        """
+        import numpy
+
+        if not rows:
+            return
+        start = self.size
+        stop = start + len(rows)
+        if stop > self.capacity:
+            self.grow(stop)
+
+        for pos, col in enumerate(zip(*rows)):
+            values = numpy.empty(len(col), dtype=object)
+            values[:] = col
+            mask = self.masks[pos]
+            if mask is None:
+                self.buffers[pos][start:stop] = values
+                continue
+
+            is_null = values == None  # noqa: E711
+            values[is_null] = self.fill_values[self.dtypes[pos]]
+            try:
+                self.buffers[pos][start:stop] = values
+            except (TypeError, ValueError, OverflowError):
+                # Unexpected value for the column type (or int out
+                # of the int64 range), fallback
+                # to an object buffer
+                buf = self.buffers[pos].astype(object)
+                buf[:start][mask[:start]] = None
+                values[is_null] = None
+                buf[start:stop] = values
+                self.buffers[pos] = buf
+                self.masks[pos] = None
+                continue
+            mask[start:stop] = is_null
+        self.size = stop
+
+    def to_pandas(self, names: tuple[str, ...]) -> "DataFrame":
+        """
+        Assemble buffers into a pandas DataFrame
+        """
+        from pandas import DataFrame, Series, to_datetime
+        from pandas.arrays import BooleanArray, IntegerArray
+
+        nullable = {int: IntegerArray, bool: BooleanArray}
+        columns = {}
+        for name, dt, buf, mask in zip(names, self.dtypes, self.buffers, self.masks):
+            if mask is not None:
+                values, mask = buf[: self.size], mask[: self.size]
+                if dt in nullable and mask.any():
+                    # Nullable Int64 or boolean array
+                    columns[name] = nullable[dt](values, mask.copy())
+                else:
+                    # Floats nulls are already replaced by nan
+                    columns[name] = values
+                continue
+
+            # FIXME Series(col, dtype=dt) fail on json cols!
+            srs = Series(buf[: self.size])
+            if dt in (datetime, date):
+                srs = to_datetime(srs)
+            else:
+                try:
+                    if dt == int:
+                        # Make sure we have no nan for int columns
+                        srs = srs.fillna(0).astype(dt)
+                    else:
+                        srs = srs.astype(dt)
+                except OverflowError:
+                    # Ints out of the int64 range are kept as objects
+                    pass
+                except TypeError:
+                    # Fallback to string if type is not supported by pandas
+                    srs = srs.astype(str)
+            columns[name] = srs
+        return DataFrame(columns, columns=list(names))
+
+
+def polars_series(name: str, values: Iterable, dtype) -> "Series":
+    """
+    Create a polars Series of type `dtype`. Values that do not
+    match the expected type (like booleans returned as integers by
+    sqlite) are cast, unsupported types (like json) are inferred.
+    """
+    from polars import Series
+    from polars.exceptions import InvalidOperationError
+
+    values = list(values)
+    try:
+        return Series(name, values, dtype=dtype)
+    except TypeError as exc:
+        # Raised by strict construction on mismatching values
+        logger.debug("Column '%s': cast to %s (%s)", name, dtype, exc)
+    srs = Series(name, values, strict=False)
+    try:
+        return srs.cast(dtype, strict=False)
+    except InvalidOperationError as exc:
+        logger.debug("Column '%s': keep inferred type %s (%s)", name, srs.dtype, exc)
+        return srs
+
+
+def encode_cursor_value(value):
+    """
+    Encode `value` for a cursor token, values that are not native
+    json types are stored as `[type name, string]`
+    """
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    for name, (cls, encode, _) in CURSOR_TYPES.items():
+        if isinstance(value, cls):
+            return [name, encode(value)]
+    raise ValidationError(f"Unsupported value in cursor token: {value!r}")
+
+
+def decode_cursor_value(value):
+    """
+    Decode a value encoded by `encode_cursor_value`, raise a
+    ValueError on unexpected content
+    """
+    if not isinstance(value, list):
+        return value
+    if len(value) != 2 or value[0] not in CURSOR_TYPES:
+        raise ValueError(f"Unexpected value: {value}")
+    name, encoded = value
+    _, _, decode = CURSOR_TYPES[name]
+    try:
+        return decode(encoded)
+    except (TypeError, ArithmeticError) as exc:
+        raise ValueError(f"Unexpected value: {value}") from exc
+
+
 def autonest(record: dict) -> dict:
     clone = {}
     for key, value in record.items():
@@ -28,17 +28,90 @@ ValueError: Unexpected token: "x"
 
 """
 
-import shlex
-from datetime import date, datetime
-from functools import cached_property
+import json
+import re
+from datetime import date, datetime, time
+from decimal import Decimal
 
 from nagra.exceptions import EvalTypeError
-from nagra.utils import quote_identifier
+from nagra.utils import LRUCache, quote_identifier
 
 
 DEFAULT_FLAVOR = "postgresql"
 __all__ = ["AST"]
 
+# Parsed expressions, keyed by expression string. AST are never
+# mutated after parsing so they can be shared across queries and
+# threads.
+parse_cache = LRUCache(size=4096)
+
+
+# SQL of `(in col {name...})` per flavor, the parameter is adapted by
+# `sequence_arg`
+IN_SEQUENCE = {
+    "postgresql": "{} = ANY(%s)",
+    "sqlite": "{} IN (SELECT value FROM json_each(?))",
+    "mssql": "{} IN (SELECT value FROM OPENJSON(?))",
+    "duckdb": "{} IN (SELECT unnest(?))",
+}
+
+
+def json_value(value):
+    """
+    Encode `value` for the json parameter of an `(in col {name...})`
+    expression, so that it compares equal to the value stored by the
+    database driver.
+    """
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, datetime):
+        return value.isoformat(" ")
+    if isinstance(value, (date, time)):
+        return value.isoformat()
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        raise TypeError("Binary values are not supported in sequence parameters")
+    # Other types (uuid, ...) are given as strings
+    return str(value)
+
+
+def sequence_arg(values, flavor):
+    """
+    Adapt `values` to the parameter of an `(in col {name...})`
+    expression: an array on postgresql and duckdb, a json string on
+    sqlite and mssql (see `json_value`).
+    """
+    if isinstance(values, (str, bytes)):
+        raise TypeError("Sequence parameter expected, got a string")
+    if hasattr(values, "tolist"):
+        # Numpy arrays & pandas series: get python values
+        values = values.tolist()
+    else:
+        values = list(values)
+    if flavor in ("sqlite", "mssql"):
+        return json.dumps(values, default=json_value)
+    return values
+
+
+def sequence_positions(asts):
+    """
+    Return positions of the parameters expecting a sequence among
+    all the parameters of `asts`
+    """
+    params = (is_seq for ast in asts for _, is_seq in ast.iter_params())
+    return tuple(pos for pos, is_seq in enumerate(params) if is_seq)
+
+
+def adapt_args(args, positions, flavor):
+    """
+    Adapt arguments at `positions` with `sequence_arg`
+    """
+    if not positions:
+        return args
+    args = list(args)
+    for pos in positions:
+        args[pos] = sequence_arg(args[pos], flavor)
+    return tuple(args)
+
 
 def list_to_dict(*items):
     it = iter(items)
@@ -63,29 +136,87 @@ class Alias:
         self.name = name
 
 
+# Characters handled like shlex (non-posix mode, see `lex`) with the
+# extra word chars used by nagra
+WORDCHARS = frozenset(
+    "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_"
+    ".!=<>:{}-|"
+)
+WHITESPACE = frozenset(" \t\r\n")
+QUOTES = frozenset("'\"")
+# First char of the words that can be numbers
+NUMERIC_START = frozenset("-0123456789")
+WORD_RE = re.compile(r"[a-zA-Z0-9_.!=<>:{}\-|'\"]*")
+
+
+def skip_comment(expr, pos):
+    # Comments start with "#" and end with the line
+    end = expr.find("\n", pos)
+    return len(expr) if end < 0 else end + 1
+
+
+def lex(expr):
+    """
+    Split `expr` into strings, a quoted string is kept as one item
+    (with its quotes), other chars that are not part of a word are
+    returned one by one.
+    """
+    pos, size = 0, len(expr)
+    while pos < size:
+        char = expr[pos]
+        if char in WHITESPACE:
+            pos += 1
+        elif char == "#":
+            pos = skip_comment(expr, pos)
+        elif char in WORDCHARS:
+            # Quotes are accepted inside words
+            end = WORD_RE.match(expr, pos).end()
+            word = expr[pos:end]
+            while end < size and expr[end] == "#":
+                # Like shlex, the comment is dropped and the word
+                # goes on on the next line
+                pos = skip_comment(expr, end)
+                end = WORD_RE.match(expr, pos).end()
+                word += expr[pos:end]
+            yield word
+            pos = end
+        elif char in QUOTES:
+            end = expr.find(char, pos + 1)
+            if end < 0:
+                raise ValueError("No closing quotation")
+            yield expr[pos : end + 1]
+            pos = end + 1
+        else:
+            yield char
+            pos += 1
+
+
 def tokenize(expr):
-    lexer = shlex.shlex(expr)
-    lexer.wordchars += ".!=<>:{}-|"
     prev_tk = None
-    for i in lexer:
-        tk = Token.from_value(i, prev_tk)
+    for value in lex(expr):
+        tk = Token.from_value(value, prev_tk)
         prev_tk = tk
         yield tk
 
 
-def scan(tokens, end_tk=")"):
+def scan(tokens):
+    """
+    Nest tokens into lists based on parenthesis. An unmatched closing
+    parenthesis ends the scan, unclosed ones are implicitly closed.
+    """
     res = []
+    stack = [res]
     for tk in tokens:
-        if tk.value == end_tk:
-            return res
+        if tk.value == ")":
+            if len(stack) == 1:
+                break
+            stack.pop()
         elif tk.value == "(":
-            res.append(scan(tokens))
+            sub = []
+            stack[-1].append(sub)
+            stack.append(sub)
         else:
-            res.append(tk)
-
-    tail = next(tokens, None)
-    if tail:
-        raise ValueError(f'Unexpected token: "{tail.value}"')
+            stack[-1].append(tk)
     return res
 
 
@@ -176,12 +307,21 @@ class AST:
     }
     aggregates = agg_unary | agg_variadic
 
+    __slots__ = ("tokens",)
+
     def __init__(self, tokens):
         # Auto-wrap sublist into AST
-        self.tokens = [tk if isinstance(tk, Token) else AST(tk) for tk in tokens]
+        self.tokens = tuple(tk if isinstance(tk, Token) else AST(tk) for tk in tokens)
 
     @classmethod
     def parse(cls, expr):
+        """
+        Return AST of `expr`, results are cached (see `parse_cache`)
+        """
+        return parse_cache.get_or_set(expr, lambda: cls._parse(expr))
+
+    @classmethod
+    def _parse(cls, expr):
         res = tokenize(expr)
         tokens = scan(res)[0]
         if isinstance(tokens, Token):
@@ -198,7 +338,13 @@ class AST:
     def _eval(self, env, flavor, top=False):
         head, tail = self.tokens[0], self.tokens[1:]
         args = [tk._eval(env, flavor) for tk in tail]
-        res = head._eval(env, flavor, *args)
+        if self.is_in_sequence():
+            res = IN_SEQUENCE.get(flavor, IN_SEQUENCE["sqlite"]).format(args[0])
+        elif any(isinstance(tk, ParamToken) and tk.sequence for tk in tail):
+            msg = "Sequence parameters are only supported in `(in col {name...})`"
+            raise ValueError(msg)
+        else:
+            res = head._eval(env, flavor, *args)
         # id = (ANY(%s)) is invalid syntax, it only works a without
         # the external parenthesis
         no_parent = top or head.value == "any"
@@ -229,6 +375,42 @@ class AST:
             if not isinstance(tk, (BuiltinToken, ))
         )
 
+    def params(self):
+        """
+        Return names of parameters (an empty string for anonymous
+        ones) in the order of their placeholders
+        """
+        return [name for name, _ in self.iter_params()]
+
+    def iter_params(self):
+        """
+        Yield name of each parameter and a boolean telling if the
+        parameter is expected to be a sequence (see `is_in_sequence`)
+        """
+        in_sequence = self.is_in_sequence()
+        for pos, tk in enumerate(self.tokens):
+            if isinstance(tk, AST):
+                yield from tk.iter_params()
+            elif isinstance(tk, ParamToken):
+                yield tk.value, in_sequence and pos == 2
+
+    def is_in_sequence(self):
+        """
+        True for `(in col {name...})` (or `(in col {...})`): the
+        values to test against are given as one parameter holding a
+        sequence. Unlike multiple placeholders, the statement does not
+        depend on the number of values. A plain parameter, as in `(in
+        col {name})`, is a scalar value.
+        """
+        tokens = self.tokens
+        return (
+            len(tokens) == 3
+            and isinstance(tokens[0], Token)
+            and tokens[0].value == "in"
+            and isinstance(tokens[2], ParamToken)
+            and tokens[2].sequence
+        )
+
     def get_args(self):
         """
         Return token that should be treated as query arguments
@@ -244,6 +426,8 @@ class AST:
 
 
 class Token:
+    __slots__ = ("value",)
+
     def __init__(self, value):
         self.value = value
 
@@ -275,6 +459,8 @@ class Token:
 
         if (value[0], value[-1]) == ("{", "}"):
             return ParamToken(value)
+        if value[0] not in NUMERIC_START:
+            return StrToken(value) if value[0] in "\"'" else VarToken(value)
         try:
             if "." in value:
                 value = float(value)
@@ -300,16 +486,21 @@ class Token:
 class LParen(Token):
     "Left Parenthesis"
 
+    __slots__ = ()
+
 
 class ParamToken(Token):
     "Parameterized Token"
 
+    __slots__ = ("sequence",)
+
     def __init__(self, value):
-        # Remove braces
-        self.value = value[1:-1]
-        # TODO self.value placeholder name we should use it to apply
-        # param, for example when we do:
-        # select.where('(= col {my_input})').execute(my_input=42)
+        # Remove braces, value is the parameter name (empty for
+        # anonymous parameters). A trailing "..." marks a sequence
+        # parameter (see `AST.is_in_sequence`)
+        value = value[1:-1]
+        self.sequence = value.endswith("...")
+        self.value = value[:-3] if self.sequence else value
 
     def _eval(self, env, flavor, *args):
         placeholder = "%s" if flavor == "postgresql" else "?"
@@ -317,17 +508,16 @@ class ParamToken(Token):
 
 
 class VarToken(Token):
-    def __init__(self, value):
-        self.join_alias = None
-        super().__init__(value)
+    __slots__ = ()
 
     def is_relation(self):
         return "." in self.value
 
     def _eval(self, env, flavor, *args):
         if self.is_relation():
-            self.join_alias = env.add_ref(self.value.split("."), flavor)
-            return self.join_alias
+            return env.add_ref(self.value.split("."), flavor)
+        if not env.qualified:
+            return quote_identifier(self.value, flavor)
         table_name = quote_identifier(env.table.name, flavor)
         column_name = quote_identifier(self.value, flavor)
         return f"{table_name}.{column_name}"
@@ -336,7 +526,7 @@ class VarToken(Token):
         # TODO handle paramtoken here?
         if self.is_relation():
             *head, tail = self.value.split(".")
-            ftable, _, _ = env.table.join_on(tuple(head), env=env)
+            ftable, _, _ = env.table.join_on(tuple(head))
             if tail not in ftable.columns and tail == ftable.primary_key:
                 # implicit type for pk is int
                 # FIXME this would be simpler with id in columns
@@ -367,13 +557,17 @@ class VarToken(Token):
 
 
 class OpToken(Token):
-    @cached_property
-    def op(self):
-        if self.value in AST.builtins:
-            return AST.builtins[self.value]
-        if self.value in AST.infix:
-            return lambda *xs: f" {self.value.upper()} ".join(map(str, xs))
-        return lambda *xs: f"{self.value}(%s)" % ", ".join(map(str, xs))
+    __slots__ = ("op",)
+
+    def __init__(self, value):
+        super().__init__(value)
+        if value in AST.builtins:
+            self.op = AST.builtins[value]
+        elif value in AST.infix:
+            sep = f" {value.upper()} "
+            self.op = lambda *xs: sep.join(map(str, xs))
+        else:
+            self.op = lambda *xs: f"{value}(%s)" % ", ".join(map(str, xs))
 
     def _eval(self, env, flavor, *args):
         if self.value in AST.literals:
@@ -382,6 +576,7 @@ class OpToken(Token):
 
 
 class BuiltinToken(OpToken):
+    __slots__ = ()
     num_like = set(['+', '-', '*', '/'])
     bool_like = set([
         "!=",
@@ -447,6 +642,8 @@ class BuiltinToken(OpToken):
 class LitToken(Token):
     "Litteral Token"
 
+    __slots__ = ()
+
     def _eval_type(self, env):
         return self._type
 
@@ -459,17 +656,21 @@ class LitToken(Token):
 
 class FloatToken(LitToken):
     "Float Token"
+    __slots__ = ()
     _type = float
 
 
 class IntToken(LitToken):
     "Integer Token"
+    __slots__ = ()
     _type = int
 
 
 class StrToken(LitToken):
     "String Token"
 
+    __slots__ = ()
+
     def __init__(self, value):
         # Remove quotes
         self.value = value[1:-1]
@@ -485,6 +686,9 @@ class LiteralToken(OpToken):
     """
     Class for hard-coded litteral token, one of `AST.literals`
     """
+
+    __slots__ = ()
+
     def _eval_type(self, env, *operands):
         if self.value == "null":
             return None
@@ -495,6 +699,7 @@ class LiteralToken(OpToken):
 
 
 class AggToken(OpToken):
+    __slots__ = ()
     ops = AST.aggregates
 
     num_like = ["sum", "avg"]
@@ -1,5 +1,6 @@
 from functools import partial
 
+from nagra.emitters import EMITTERS
 from nagra.utils import template
 from nagra.transaction import dummy_transaction
 
@@ -11,7 +12,10 @@ class Statement:
         self._flavor = flavor or dummy_transaction.flavor
 
     def __call__(self):
-        path = f"{self._flavor}/{self._template}.sql"
+        key = f"{self._flavor}/{self._template}"
+        if emitter := EMITTERS.get(key):
+            return emitter(**self._params)
+        path = f"{key}.sql"
         return template(path).render(**self._params, _all_params=self._params)
 
     def __getattr__(self, name):
@@ -38,12 +38,13 @@ temperature = Table(
 
 import warnings
 from datetime import date, datetime
-from functools import lru_cache
 from typing import Iterable, Optional, Union, TYPE_CHECKING
 
 from nagra.delete import Delete
 from nagra.exceptions import IncorrectSchema
-from nagra.schema import Schema
+from nagra.index import Index
+from nagra.rollup import Rollup
+from nagra.schema import META_TABLE, Schema
 from nagra.select import Select
 from nagra.sexpr import AST
 from nagra.statement import Statement
@@ -216,6 +217,9 @@ class Table:
         primary_key: Optional[str] = "id",
         schema: Schema = Schema.default,
         is_view: Optional[bool] = False,
+        rollups: Optional[dict[str, dict]] = None,
+        indexes: Optional[dict[str, dict]] = None,
+        index_fk: bool = False,
     ):
         self.name = name
         self.columns: dict[str, Column] = {
@@ -229,6 +233,7 @@ class Table:
         self.primary_key = primary_key
         self.schema = schema
         self.is_view = is_view
+        self.index_fk = index_fk
 
         # Detect malformed fk definitions
         if len(self.natural_key) == 1:
@@ -255,11 +260,41 @@ class Table:
         # Add table to schema
         self.schema.add_table(self.name, self)
 
+        # Create rollups (and their tables)
+        self.rollups: dict[str, Rollup] = {
+            rollup_name: Rollup(rollup_name, self, **info)
+            for rollup_name, info in (rollups or {}).items()
+        }
+        # Secondary indexes
+        self.indexes: dict[str, Index] = {
+            index_name: Index(index_name, self, **info)
+            for index_name, info in (indexes or {}).items()
+        }
+
+    def secondary_indexes(self) -> list[Index]:
+        """
+        Return declared indexes, and an index for each foreign key
+        column if `index_fk` is true (unless the column is the
+        primary key, or the first column of the natural key or of a
+        declared index).
+        """
+        res = list(self.indexes.values())
+        if not self.index_fk:
+            return res
+        covered = {self.primary_key, *self.natural_key[:1]}
+        covered.update(idx.columns[0] for idx in res)
+        for col_name in self.foreign_keys:
+            if col_name not in covered:
+                res.append(Index(f"{self.name}_{col_name}_idx", self, [col_name]))
+        return res
+
     @classmethod
     def get(self, name, schema=Schema.default) -> "Table":
         """
         Shortcut method to Schema.default().get()
         """
+        if schema.lazy and name not in schema.tables:
+            schema._introspect_lazily(name)
         return schema.tables[name]
 
     def select(self, *columns, distinct: bool = False, trn=None):
@@ -340,8 +375,13 @@ class Table:
 
     def drop(self, trn: Optional[Transaction] = None):
         trn = trn or Transaction.current()
+        if self.is_view:
+            self.schema.views[self.name].drop(trn)
+            return
         stmt = Statement("drop_table", trn.flavor, name=self.name)
         trn.execute(stmt())
+        if self.name != META_TABLE:
+            self.schema.clear_fingerprint(trn)
 
     def required(self, col_name):
         return (
@@ -386,18 +426,39 @@ class Table:
             *head, tail = prefix
             prev_table = env.refs[tuple(head)] if head else self.name
             # Identify last table & column of the chain
-            ftable, alias_col, join_col = self.join_on(prefix, env)
-            yield (ftable.name, alias, prev_table, alias_col, join_col)
+            ftable, alias_col, join_col = self.join_on(prefix)
+            # A join on required foreign keys always matches
+            join_type = "INNER" if self.required_path(prefix) else "LEFT"
+            yield (ftable.name, alias, prev_table, alias_col, join_col, join_type)
 
-    @lru_cache
-    def join_on(self, path: tuple[str, ...], env: "Env") -> tuple["Table", str, str]:
+    def required_path(self, path: tuple[str, ...]) -> bool:
+        """
+        Return True if each item of `path` is a required (not null)
+        foreign key
+        """
+        table = self
+        for name in path:
+            if name in table.one2many or name not in table.foreign_keys:
+                return False
+            if not table.required(name):
+                return False
+            table = table.schema.get(table.foreign_keys[name])
+        return True
+
+    def join_on(
+        self, path: tuple[str, ...], env: Optional["Env"] = None
+    ) -> tuple["Table", str, str]:
         """
         `path` is a tuple containing names of column, each of
         which is a foreign key to another table.
 
         Returns the next table to join and the column to join on.
-
+        Results are cached on the schema (see `Schema.join_path`),
+        `env` is ignored and kept for backward compatibility.
         """
+        return self.schema.join_path(self, path)
+
+    def _join_on(self, path: tuple[str, ...]) -> tuple["Table", str, str]:
         if len(path) == 1:
             head = path[0]
             if alias := self.one2many.get(head):
@@ -416,9 +477,9 @@ class Table:
             return ftable, alias_col, join_col
 
         # Recurse to find the previous table in the chain
-        prev_table, *_ = self.join_on(path[:-1], env)
+        prev_table, *_ = self.join_on(path[:-1])
         # Resolve last step
-        return prev_table.join_on(path[-1:], env)
+        return prev_table.join_on(path[-1:])
 
     def ctypes(self, flavor: str, column_names: Iterable[str]):
         # detect arrays
@@ -476,31 +537,72 @@ class Table:
             self.one2many == other.one2many,
             self.default == other.default,
             self.is_view == other.is_view,
+            self.index_fk == other.index_fk,
+            self.indexes.keys() == other.indexes.keys(),
+            all(idx.eq(other.indexes.get(name)) for name, idx in self.indexes.items()),
+            self.rollups.keys() == other.rollups.keys(),
+            all(r.eq(other.rollups.get(name)) for name, r in self.rollups.items()),
         ))
         return ok
 
 
 class Env:
-    def __init__(self, table: "Table", refs: Optional[dict] = None):
+    def __init__(
+        self, table: "Table", refs: Optional[dict] = None, qualified: bool = True
+    ):
         self.table = table
         self.refs = refs or {}
+        # Prefix columns with the table name (index definitions only
+        # accept bare column names)
+        self.qualified = qualified
 
     def add_ref(self, path, flavor):
+        """
+        Register the joins needed by `path` (a dotted column name
+        split on dots) and return the qualified column. When `path`
+        ends with the primary key of a table referenced by a foreign
+        key, the foreign key column is returned and the last join is
+        skipped (join elimination).
+        """
         *head, name, tail = path
-        prefix = tuple([*head, name])
+        if self.is_fk_pk(head, name, tail):
+            table_alias = self.register(tuple(head)) if head else self.table.name
+            tail = name
+        else:
+            table_alias = self.register((*head, name))
+        alias = quote_identifier(table_alias, flavor)
+        column = quote_identifier(tail, flavor)
+        return f"{alias}.{column}"
+
+    def register(self, prefix):
+        """
+        Return alias of the table joined with `prefix`, register it
+        (and the previous ones in the chain) if needed
+        """
         table_alias = self.refs.get(prefix)
         if not table_alias:
             if len(prefix) >= 2:
-                self.add_ref(prefix, flavor)
-            table_alias = f"{name}_{len(self.refs)}"
+                self.register(prefix[:-1])
+            table_alias = f"{prefix[-1]}_{len(self.refs)}"
             self.refs[prefix] = table_alias
-        alias = quote_identifier(table_alias, flavor)
-        column = quote_identifier(tail, flavor)
-        return f"{alias}.{column}"
+        return table_alias
+
+    def is_fk_pk(self, head, name, tail):
+        # True if name is a foreign key and tail the primary key of
+        # the referenced table
+        try:
+            table = self.table.join_on(tuple(head))[0] if head else self.table
+        except KeyError:
+            # Invalid path, reported when joins are generated
+            return False
+        if name in table.one2many or name not in table.foreign_keys:
+            return False
+        ftable = table.schema.get(table.foreign_keys[name])
+        return tail == ftable.primary_key
 
     def __repr__(self):
         content = repr(self.refs)
         return f"<Env {self.table.name} {content}>"
 
     def clone(self):
-        return Env(self.table, self.refs.copy())
+        return Env(self.table, self.refs.copy(), self.qualified)
@@ -0,0 +1 @@
+SELECT COUNT(*), MAX(modify_date) FROM sys.objects WHERE is_ms_shipped = 0;
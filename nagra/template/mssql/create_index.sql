@@ -0,0 +1,13 @@
+CREATE {{ "UNIQUE " if unique }}INDEX [{{name}}] ON [{{table}}] (
+  {{ columns | join(', ') }}
+)
+{%- if include %}
+INCLUDE (
+  {%- for col in include -%}
+  [{{ col }}]{{ ", " if not loop.last }}
+  {%- endfor -%}
+)
+{%- endif %}
+{%- if where %}
+WHERE {{where}}
+{%- endif %};
@@ -0,0 +1,2 @@
+IF OBJECT_ID(N'{{ name }}', N'U') IS NULL
+  SELECT * INTO [{{ name }}] FROM ({{ view_def }}) AS src;
@@ -0,0 +1 @@
+DROP INDEX IF EXISTS [{{ name }}] ON [{{ table }}];
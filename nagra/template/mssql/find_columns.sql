@@ -1,5 +1,9 @@
 SELECT table_name, column_name, data_type, character_maximum_length
 FROM information_schema.columns
+WHERE 1 = 1
+{%- if whitelist %}
+  AND table_name IN (SELECT value FROM OPENJSON(?))
+{%- endif %}
 ORDER BY
  table_name,
  ordinal_position;
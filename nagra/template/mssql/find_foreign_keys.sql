@@ -24,3 +24,6 @@ INNER JOIN
     ON fkc.referenced_object_id = c_dest.object_id
     AND fkc.referenced_column_id = c_dest.column_id
 WHERE SCHEMA_NAME(t_origin.schema_id) = '{{mssql_schema}}'
+{%- if whitelist %}
+  AND t_origin.name IN (SELECT value FROM OPENJSON(?))
+{%- endif %}
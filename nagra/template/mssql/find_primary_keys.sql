@@ -3,6 +3,9 @@ FROM information_schema.table_constraints AS tc
 JOIN information_schema.key_column_usage AS kcu
   ON tc.constraint_name = kcu.constraint_name
 WHERE tc.constraint_type = 'PRIMARY KEY'
+{%- if whitelist %}
+  AND tc.table_name IN (SELECT value FROM OPENJSON(?))
+{%- endif %}
 ORDER BY
  tc.table_name,
  kcu.ordinal_position;
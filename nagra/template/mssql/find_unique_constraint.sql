@@ -1,11 +1,22 @@
 SELECT
  t.name AS table_name,
- i.name AS index_name
+ i.name AS index_name,
+ c.name AS column_name
 FROM sys.indexes AS i
 JOIN sys.tables AS t
   ON t.object_id = i.object_id
 JOIN sys.schemas AS s
   ON s.schema_id = t.schema_id
+JOIN sys.index_columns AS ic
+  ON ic.object_id = i.object_id AND ic.index_id = i.index_id
+JOIN sys.columns AS c
+  ON c.object_id = ic.object_id AND c.column_id = ic.column_id
 WHERE i.is_unique = 1
   AND i.is_primary_key = 0
+  AND i.has_filter = 0
+  AND ic.is_included_column = 0
+{%- if whitelist %}
+  AND t.name IN (SELECT value FROM OPENJSON(?))
+{%- endif %}
+ORDER BY t.name, i.name, ic.key_ordinal
 ;
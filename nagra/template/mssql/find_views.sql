@@ -1,3 +1,7 @@
 SELECT table_name, view_definition
 FROM information_schema.views
+WHERE 1 = 1
+{%- if whitelist %}
+  AND table_name IN (SELECT value FROM OPENJSON(?))
+{%- endif %}
 ;
@@ -3,8 +3,8 @@ SELECT{% if limit and not use_offset %} TOP {{ limit }}{% endif %}
   {{ columns | join(', ') }}
 FROM [{{ table }}]
 
-{%- for next_table, alias, prev_table, alias_col, prev_col in joins %}
- LEFT JOIN [{{ next_table }}] AS [{{ alias }}] ON (
+{%- for next_table, alias, prev_table, alias_col, prev_col, join_type in joins %}
+ {{ join_type }} JOIN [{{ next_table }}] AS [{{ alias }}] ON (
     [{{ alias }}].[{{ alias_col }}] = [{{ prev_table }}].[{{ prev_col }}]
  )
 {%- endfor -%}
@@ -0,0 +1,13 @@
+SELECT md5(string_agg(item, ',' ORDER BY item)) FROM (
+  SELECT table_name || '.' || column_name || ':' || data_type || ':' || is_nullable AS item
+  FROM information_schema.columns WHERE table_schema = '{{pg_schema}}'
+  UNION ALL
+  SELECT c.conrelid::regclass::text || ':' || c.conname || ':' || pg_get_constraintdef(c.oid)
+  FROM pg_constraint c JOIN pg_namespace n ON n.oid = c.connamespace
+  WHERE n.nspname = '{{pg_schema}}'
+  UNION ALL
+  SELECT indexdef FROM pg_indexes WHERE schemaname = '{{pg_schema}}'
+  UNION ALL
+  SELECT table_name || ':' || view_definition
+  FROM information_schema.views WHERE table_schema = '{{pg_schema}}'
+) AS catalog;
@@ -0,0 +1,10 @@
+CREATE {{ "UNIQUE " if unique }}INDEX IF NOT EXISTS "{{name}}" ON "{{table}}"
+{%- if method %} USING {{method}}{% endif %} (
+  {{ columns | join(', ') }}
+)
+{%- if include %}
+INCLUDE ({{ include | map('autoquote') | join(', ') }})
+{%- endif %}
+{%- if where %}
+WHERE {{where}}
+{%- endif %};
@@ -0,0 +1 @@
+CREATE MATERIALIZED VIEW IF NOT EXISTS "{{name}}" AS {{view_def}};
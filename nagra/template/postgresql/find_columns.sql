@@ -1,6 +1,9 @@
 SELECT table_name, column_name, data_type, udt_name
 FROM information_schema.columns
 WHERE table_schema = '{{pg_schema}}'
+{%- if whitelist %}
+  AND table_name::text = ANY(%s)
+{%- endif %}
 ORDER BY
  table_name,
  ordinal_position
@@ -10,6 +10,9 @@ SELECT DISTINCT
  JOIN information_schema.constraint_column_usage
    AS ccu ON ccu.constraint_name = tc.constraint_name
  WHERE constraint_type = 'FOREIGN KEY'
+{%- if whitelist %}
+  AND tc.table_name::text = ANY(%s)
+{%- endif %}
  ORDER BY
    tc.constraint_name,
    tc.table_name
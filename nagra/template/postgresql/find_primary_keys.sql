@@ -8,3 +8,6 @@ FROM information_schema.table_constraints tc
 WHERE tc.constraint_type = 'PRIMARY KEY'
   AND kc.ordinal_position is not null
   AND tc.table_schema = '{{pg_schema}}'
+{%- if whitelist %}
+  AND tc.table_name::text = ANY(%s)
+{%- endif %}
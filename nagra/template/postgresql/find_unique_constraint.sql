@@ -1,12 +1,20 @@
 
 select
  tbl.relname as table_name,
- idx.relname as index_name
+ idx.relname as index_name,
+ pg_get_indexdef(pgi.indexrelid, k.n, true) as column_name
 from pg_index pgi
   join pg_class idx on idx.oid = pgi.indexrelid
   join pg_namespace insp on insp.oid = idx.relnamespace
   join pg_class tbl on tbl.oid = pgi.indrelid
   join pg_namespace tnsp on tnsp.oid = tbl.relnamespace
+  cross join lateral generate_series(1, pgi.indnkeyatts) as k(n)
 where pgi.indisunique
   and not pgi.indisprimary
+  and pgi.indpred is null
+  and pgi.indexprs is null
   and tnsp.nspname = '{{pg_schema}}'
+{%- if whitelist %}
+  AND tbl.relname::text = ANY(%s)
+{%- endif %}
+order by table_name, index_name, k.n
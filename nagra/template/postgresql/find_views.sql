@@ -1 +1,5 @@
-select table_name, view_definition from  information_schema.views where table_schema = '{{pg_schema}}';
+select table_name, view_definition from  information_schema.views where table_schema = '{{pg_schema}}'
+{%- if whitelist %}
+  AND table_name::text = ANY(%s)
+{%- endif %}
+;
@@ -0,0 +1 @@
+REFRESH MATERIALIZED VIEW {% if concurrently %}CONCURRENTLY {% endif %}"{{name}}";
@@ -0,0 +1,6 @@
+CREATE {{ "UNIQUE " if unique }}INDEX IF NOT EXISTS "{{name}}" ON "{{table}}" (
+  {{ columns | join(', ') }}
+)
+{%- if where %}
+WHERE {{where}}
+{%- endif %};
@@ -0,0 +1 @@
+CREATE TABLE IF NOT EXISTS "{{name}}" AS {{view_def}};
@@ -7,6 +7,9 @@ FROM
   pragma_table_info(m.name) AS ti
 WHERE
   m.type in ('table', 'view')
+{%- if whitelist %}
+  AND m.name IN (SELECT value FROM json_each(?))
+{%- endif %}
 ORDER BY
  table_name,
   ti.cid
@@ -7,4 +7,9 @@ SELECT
 FROM
   sqlite_master AS m,
   pragma_foreign_key_list(m.name) AS fk
+WHERE
+  m.type = 'table'
+{%- if whitelist %}
+  AND m.name IN (SELECT value FROM json_each(?))
+{%- endif %}
 ;
@@ -7,4 +7,7 @@ FROM
 WHERE
   m.type = 'table'
   AND ti.pk = 1
+{%- if whitelist %}
+  AND m.name IN (SELECT value FROM json_each(?))
+{%- endif %}
 ;
@@ -9,5 +9,9 @@ FROM
 WHERE
   m.type = 'table'
   AND il."unique"
-ORDER BY table_name, idx_name
+  AND NOT il.partial
+{%- if whitelist %}
+  AND m.name IN (SELECT value FROM json_each(?))
+{%- endif %}
+ORDER BY table_name, idx_name, ii.seqno
 ;
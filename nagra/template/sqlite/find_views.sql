@@ -1 +1,5 @@
-SELECT name, sql from sqlite_master WHERE type = 'view';
+SELECT name, sql from sqlite_master WHERE type = 'view'
+{%- if whitelist %}
+  AND name IN (SELECT value FROM json_each(?))
+{%- endif %}
+;
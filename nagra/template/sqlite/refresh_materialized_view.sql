@@ -0,0 +1 @@
+INSERT INTO "{{name}}" {{view_def}};
@@ -1,8 +1,9 @@
 import sqlite3
 import threading
-from itertools import islice
+from itertools import count, islice
 from typing import Callable
 
+from nagra.cache import result_cache
 from nagra.utils import logger, UNSET, mssql_connection_string
 from nagra.exceptions import NoActiveTransaction, TransactionReenterError
 
@@ -75,10 +76,16 @@ class Transaction:
     # _local_stack: ContextVar[list["Transaction"]] = ContextVar('_local_stack', default=[])
     _local = threading.local()
     _local.stack = []
+    # Used to distinguish in-memory databases
+    _counter = count()
 
     def __init__(self, dsn, rollback=False, fk_cache=False):
         self.auto_rollback = rollback
         self._fk_cache = {} if fk_cache else None
+        # Identify the database in result cache keys
+        self.cache_id = dsn
+        # Tables written in the transaction, see Transaction.mark_written
+        self._written = set()
 
         if dsn.startswith("postgresql://"):
             try:
@@ -93,6 +100,8 @@ class Transaction:
         elif dsn.startswith("sqlite://"):
             self.flavor = "sqlite"
             filename = dsn[9:]
+            if filename in ("", ":memory:"):
+                self.cache_id = f"{dsn}#{next(self._counter)}"
             self.connection = sqlite3.connect(filename)
             self.connection.execute("PRAGMA foreign_keys = 1")
         elif dsn.startswith("mssql://"):
@@ -114,15 +123,27 @@ class Transaction:
 
             self.flavor = "duckdb"
             filename = dsn[9:]
+            if filename in ("", ":memory:"):
+                self.cache_id = f"{dsn}#{next(self._counter)}"
             self.connection = duckdb.connect(filename)
             self.connection.begin()
         else:
             raise ValueError(f"Invalid dsn string: {dsn}")
 
-    def execute(self, stmt, args=tuple()) -> "ResultCursor":
+    def execute(self, stmt, args=tuple(), prepare=None) -> "ResultCursor":
+        """
+        Execute `stmt` with `args`. With postgresql, `prepare` is
+        passed to psycopg: `True` forces a server-side prepared
+        statement, `False` disables it and `None` let psycopg decide
+        (a statement is prepared once executed a few times). The
+        other drivers prepare statements implicitly.
+        """
         logger.debug(stmt)
         cursor = self.connection.cursor()
-        cursor.execute(stmt, args)
+        if self.flavor == "postgresql":
+            cursor.execute(stmt, args, prepare=prepare)
+        else:
+            cursor.execute(stmt, args)
         match self.flavor:
             case "postgresql" | "sqlite":
                 return ResultCursor(cursor)
@@ -171,9 +192,26 @@ class Transaction:
 
     def rollback(self):
         self.connection.rollback()
+        self._flush_written()
 
     def commit(self):
         self.connection.commit()
+        self._flush_written()
+
+    def mark_written(self, *tables: str):
+        """
+        Invalidate the results cached for `tables` (see
+        `Select.cached`). They are invalidated again when the
+        transaction ends, results read in the meantime by other
+        transactions may be outdated once it is committed.
+        """
+        self._written.update(tables)
+        result_cache.invalidate(*tables)
+
+    def _flush_written(self):
+        if self._written:
+            result_cache.invalidate(*self._written)
+            self._written.clear()
 
     def __enter__(self):
         Transaction.push(self)
@@ -331,6 +369,26 @@ class RowCursor:
         yield from (r and tuple(r) for r in self.rows)
 
 
+class ListCursor(CursorMixin):
+    """
+    Cursor look-alike iterating over a sequence of rows (like
+    cached results)
+    """
+
+    def __init__(self, rows):
+        self.rows = rows
+        self._iter = iter(rows)
+
+    def __iter__(self):
+        return self._iter
+
+    def __next__(self):
+        return next(self._iter)
+
+    def close(self):
+        pass
+
+
 class ExecMany:
     """
     Helper class that can consume an iterator and feed the values
@@ -368,9 +426,10 @@ class DummyTransaction(Transaction):
     flavor = "postgresql"
 
     def __init__(self):
-        pass
+        self.cache_id = None
+        self._written = set()
 
-    def execute(self, stmt, args=tuple()):
+    def execute(self, stmt, args=tuple(), prepare=None):
         raise NoActiveTransaction()
 
     def executemany(self, stmt, args=None, returning=True):
@@ -29,7 +29,10 @@ class Update(WriterMixin):
         self.lenient = lenient or []
         self._check = list(check)
         self.trn = trn
+        # Memoized statement, see Update.stm
+        self._stm = None
         super().__init__()
+        self._arg_order = self._sort_groups()
 
     def clone(
         self,
@@ -53,7 +56,20 @@ class Update(WriterMixin):
     def check(self, *conditions: str):
         return self.clone(check=conditions)
 
+    def shape(self) -> tuple:
+        """
+        Return a hashable description of the statement
+        """
+        return ("update", self.table, self.trn.flavor, tuple(self.groups))
+
     def stm(self):
+        if self._stm is None:
+            self._stm = self.table.schema.stm_cache.get_or_set(
+                self.shape(), self._compile
+            )
+        return self._stm
+
+    def _compile(self):
         pk = self.table.primary_key
         condition_key = [pk] if pk in self.groups else self.table.natural_key
         if not all(c in self.groups for c in condition_key):
@@ -72,14 +88,16 @@ class Update(WriterMixin):
         )
         return stm()
 
-    def _exec_args(self, arg_df):
+    def _sort_groups(self):
         # We need to reshuffle args values because they must be split
         # into SET and WHERE blocks in the sql statement
         pk = self.table.primary_key
         condition_key = [pk] if pk in self.groups else self.table.natural_key
         set_cols = [c for c in self.groups if c not in condition_key]
-        sorted_groups = set_cols + condition_key
-        args = zip(*(arg_df[c] for c in sorted_groups))
+        return set_cols + condition_key
+
+    def _exec_args(self, arg_df):
+        args = zip(*(arg_df[c] for c in self._arg_order))
         return args
 
     @staticmethod
@@ -2,11 +2,6 @@ from typing import Union, Optional, TYPE_CHECKING
 from collections.abc import Iterable
 from dataclasses import dataclass
 
-try:
-    from pandas import DataFrame
-except ImportError:
-    DataFrame = None
-
 from nagra import Statement, Schema
 from nagra.exceptions import ValidationError
 from nagra.transaction import Transaction
@@ -35,6 +30,8 @@ class Upsert(WriterMixin):
         self._check = list(check)
         self.trn = trn
         self.env = env
+        # Memoized statement, see Upsert.stm
+        self._stm = None
         super().__init__()
 
     def clone(
@@ -66,7 +63,26 @@ class Upsert(WriterMixin):
     def check(self, *conditions: str):
         return self.clone(check=conditions)
 
+    def shape(self) -> tuple:
+        """
+        Return a hashable description of the statement
+        """
+        return (
+            "upsert",
+            self.table,
+            self.trn.flavor,
+            tuple(self.groups),
+            self._insert_only,
+        )
+
     def stm(self):
+        if self._stm is None:
+            self._stm = self.table.schema.stm_cache.get_or_set(
+                self.shape(), self._compile
+            )
+        return self._stm
+
+    def _compile(self):
         pk = self.table.primary_key
         with_pk = pk in self.groups
         conflict_key = [pk] if with_pk else self.table.natural_key
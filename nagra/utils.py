@@ -1,9 +1,10 @@
-import csv
 import os
 import bisect
 import logging
 import re
 import sys
+import threading
+from collections import OrderedDict
 from contextlib import contextmanager
 from dataclasses import dataclass, fields, is_dataclass
 from enum import StrEnum
@@ -13,20 +14,19 @@ from time import perf_counter
 from typing import Iterator, TYPE_CHECKING, get_args
 from urllib.parse import parse_qs, unquote_plus, urlparse
 
-from jinja2 import FileSystemLoader, Environment, StrictUndefined
-from rich import box
-from rich.console import Console
-from rich.markup import escape
-import rich.table
-
 if TYPE_CHECKING:
+    from jinja2 import Environment
     from nagra.schema import Schema
 
 HERE = Path(__file__).parent
 fmt = "%(levelname)s:%(asctime).19s: %(message)s"
-logging.basicConfig(format=fmt)
+# Logging configuration is left to the application (the cli calls
+# logging.basicConfig), except when debugging
 logger = logging.getLogger("nagra")
 if os.environ.get("NAGRA_DEBUG"):
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter(fmt))
+    logger.addHandler(handler)
     logger.setLevel("DEBUG")
     logger.debug("Log level set to debug")
 UNSET = object()
@@ -56,12 +56,31 @@ def autoquote(x):
     return f'"{x}"'
 
 
-# Setup jinja env
-jinja_env = Environment(
-    loader=FileSystemLoader(HERE / "template"),
-    undefined=StrictUndefined,
-)
-jinja_env.filters["autoquote"] = autoquote
+_jinja_env = None
+
+
+def get_jinja_env() -> "Environment":
+    # Jinja env is created on first use, common statements are
+    # generated by emitters (see nagra.emitters)
+    global _jinja_env
+    if _jinja_env is None:
+        from jinja2 import FileSystemLoader, Environment, StrictUndefined
+
+        env = Environment(
+            loader=FileSystemLoader(HERE / "template"),
+            undefined=StrictUndefined,
+        )
+        env.filters["autoquote"] = autoquote
+        _jinja_env = env
+    return _jinja_env
+
+
+def __getattr__(name):
+    # `nagra.utils.jinja_env` is still available, it is created on
+    # first access
+    if name == "jinja_env":
+        return get_jinja_env()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def snake_to_pascal(name: str) -> str:
@@ -74,7 +93,7 @@ def pascal_to_snake(name: str) -> str:
 
 
 def template(name):
-    return jinja_env.get_template(name)
+    return get_jinja_env().get_template(name)
 
 
 def strip_lines(stmt):
@@ -113,12 +132,19 @@ class TableFmt(StrEnum):
 
 def print_table(rows, headers, pivot=False, format:TableFmt = None):
     if format == TableFmt.CSV:
+        import csv
+
         writer = csv.writer(sys.stdout)
         writer.writerow(headers)
         for row in rows:
             writer.writerow(row)
         return
 
+    from rich import box
+    from rich.console import Console
+    from rich.markup import escape
+    import rich.table
+
     console = Console()
     escstr = lambda s: escape(str(s))
     if pivot:
@@ -199,6 +225,71 @@ def mssql_connection_string(dsn: str) -> str:
     return ";".join(parts)
 
 
+class LRUCache:
+    """
+    Thread-safe mapping holding at most `size` items, the least
+    recently used ones are evicted first. Hits and misses are
+    counted (see `LRUCache.stats`).
+    """
+
+    def __init__(self, size: int = 1000):
+        self.size = size
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self.lock:
+            try:
+                value = self.data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self.data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.data[key] = value
+            self.data.move_to_end(key)
+            while len(self.data) > self.size:
+                self.data.popitem(last=False)
+
+    def get_or_set(self, key, fn):
+        """
+        Return value for `key`, if not present `fn()` is called and
+        its result is stored
+        """
+        value = self.get(key, UNSET)
+        if value is UNSET:
+            value = fn()
+            self.set(key, value)
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self.data),
+                "maxsize": self.size,
+            }
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def __len__(self):
+        return len(self.data)
+
+
 def partition(pred, iterable):
     # partition(is_odd, range(10)) --> 0 2 4 6 8   and  1 3 5 7 9
     t1, t2 = tee(iterable)
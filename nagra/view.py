@@ -2,8 +2,10 @@ from typing import Optional
 
 
 from nagra.schema import Schema
+from nagra.statement import Statement
 from nagra.table import Table
-from nagra.exceptions import IncorrectSchema
+from nagra.transaction import Transaction
+from nagra.exceptions import IncorrectSchema, ValidationError
 
 
 class View:
@@ -17,12 +19,14 @@ class View:
         as_select: Optional[str] = None,
         view_select: Optional[str] = None,
         view_where: Optional[str] = None,
+        materialized: bool = False,
         schema: Schema = Schema.default,
     ):
         self.name = name
         self.view_columns = view_columns
         self.as_select = as_select
         self.view_select = view_select
+        self.materialized = materialized
         self.schema = schema
         self.foreign_keys = foreign_keys or {}
 
@@ -70,11 +74,68 @@ class View:
         )
         return stm.rstrip(";")
 
+    def refresh(self, concurrently: bool = False, trn: Optional[Transaction] = None):
+        """
+        Refresh a materialized view. With `concurrently`, postgresql
+        keeps the view readable during the refresh, this requires a
+        natural key (a unique index is created on it). On sqlite and
+        mssql, the table backing the view is emptied and filled
+        again, in the current transaction.
+        """
+        if not self.materialized:
+            raise ValidationError(f"View '{self.name}' is not materialized")
+        if concurrently and not self.table.natural_key:
+            msg = f"View '{self.name}': concurrent refresh requires a natural key"
+            raise ValidationError(msg)
+        trn = trn or Transaction.current()
+        if trn.flavor != "postgresql":
+            stmt = Statement("delete", trn.flavor, table=self.name, conditions=[])
+            trn.execute(stmt())
+        stmt = Statement(
+            "refresh_materialized_view",
+            trn.flavor,
+            name=self.name,
+            view_def=self.view_def(),
+            concurrently=concurrently,
+        )
+        trn.execute(stmt())
+        trn.mark_written(self.name)
+
+    def drop(self, trn: Optional[Transaction] = None):
+        """
+        Drop the view (and clear the schema fingerprints, see
+        `Schema.create_tables`)
+        """
+        trn = trn or Transaction.current()
+        tpl = "drop_materialized_view" if self.materialized else "drop_view"
+        stmt = Statement(tpl, trn.flavor, name=self.name)
+        trn.execute(stmt())
+        self.schema.clear_fingerprint(trn)
+
+    def tables(self) -> frozenset[str]:
+        """
+        Return names of the tables the view reads from. The view
+        definition is opaque when `as_select` is used, all the tables
+        of the schema are returned (see also Select._read_tables).
+        A materialized view only reads
+        from its own storage (it changes on refresh).
+        """
+        if self.materialized:
+            return frozenset()
+        if self.as_select:
+            return frozenset(
+                name for name, tbl in self.schema.tables.items() if not tbl.is_view
+            )
+        select = self.schema.get(self.view_select).select(*self.view_columns.values())
+        return select.tables()
+
     @classmethod
     def get(self, name: str, schema: Schema = Schema.default):
         """
         Return view object for the given `name`
         """
+        if schema.lazy and name not in schema.tables:
+            schema._introspect_lazily(name)
         return schema.views.get(name)
 
     def eq(self, other):
@@ -84,6 +145,7 @@ class View:
             return True
         ok = (
             self.name == other.name and
+            self.materialized == other.materialized and
             self.view_def().strip() == other.view_def().strip()
         )
         return ok
@@ -1,17 +1,18 @@
-import dataclasses
 from collections import defaultdict
-from collections.abc import Iterable
+from collections.abc import Callable, Iterable
 from functools import partial
 from itertools import islice
+from operator import attrgetter, itemgetter
 from typing import TYPE_CHECKING
 
 from nagra.exceptions import UnresolvedFK, ValidationError
+from nagra.select import clean_col
 from nagra.utils import logger
 from nagra.transaction import ExecMany
 
 
 if TYPE_CHECKING:
-    from pandas import DataFrame
+    from pandas import DataFrame, Series
     from polars import LazyFrame
 
 
@@ -22,6 +23,10 @@ class WriterMixin:
 
     def __init__(self):
         self.groups, self.resolve_stm = self.prepare()
+        # Field names as generated by Select.to_dataclass
+        self.field_names = [clean_col(c) for c in self.columns]
+        # Compiled record extractors, see from_dict and from_objects
+        self._extractors = {}
 
     def prepare(self):
         """
@@ -56,6 +61,43 @@ class WriterMixin:
         value_df = dict(zip(self.columns, zip(*records)))
         if not value_df:
             return []
+        return self._write(value_df)
+
+    def execute_columns(self, columns: dict[str, Iterable]) -> list:
+        """
+        Write values given column-wise, `columns` maps each column
+        of the statement to a sequence of values (list, numpy array,
+        pandas Series, ...). Example:
+
+        >>> upsert = temperature.upsert("city.name", "timestamp", "value")
+        >>> upsert.execute_columns({
+        ...     "city.name": ["Brussels", "Paris"],
+        ...     "timestamp": ["2023-11-27 17:00", "2023-11-27 17:00"],
+        ...     "value": numpy.array([7.0, 9.0]),
+        ... })
+        """
+        missing = [c for c in self.columns if c not in columns]
+        if missing:
+            msg = f"Missing column(s): {', '.join(missing)} (table: {self.table.name})"
+            raise ValidationError(msg)
+
+        value_df = {}
+        for col in self.columns:
+            values = columns[col]
+            if hasattr(values, "tolist"):
+                # Numpy arrays & pandas series: get python values
+                values = values.tolist()
+            value_df[col] = values
+
+        lengths = set(map(len, value_df.values()))
+        if len(lengths) > 1:
+            msg = f"Columns must have the same length (table: {self.table.name})"
+            raise ValidationError(msg)
+        if lengths == {0}:
+            return []
+        return self._write(value_df)
+
+    def _write(self, value_df: dict[str, Iterable]) -> list:
         arg_df = {}
         for col, to_select in self.groups.items():
             if to_select:
@@ -70,10 +112,20 @@ class WriterMixin:
             else:
                 arg_df[col] = value_df[col]
 
+        # Rows updated by primary key can change of rollup bucket,
+        # keep the buckets they belong to before the write
+        previous_keys = {}
+        if self.table.rollups and self.table.primary_key in arg_df:
+            previous_keys = {
+                name: rollup.keys(arg_df[self.table.primary_key], trn=self.trn)
+                for name, rollup in self.table.rollups.items()
+            }
+
         # Build arg iterable
         args = self._exec_args(arg_df)
         # Work by chunks
         stm = self.stm()
+        self.trn.mark_written(self.table.name)
         ids = []
         returning = self.table.primary_key is not None
         while True:
@@ -97,18 +149,21 @@ class WriterMixin:
         # If conditions are present, enforce those
         if self._check:
             self.validate(ids)
+        # Recompute buckets of the written rows
+        for name, rollup in self.table.rollups.items():
+            rollup.update(ids, trn=self.trn, previous_keys=previous_keys.get(name, ()))
         return ids
 
     def validate(self, ids: list[int]):
         iter_ids = iter(ids)
         pk = self.table.primary_key
+        cond = self._check + [f"(in {pk} {{ids...}})"]
+        select = self.table.select("(count *)", trn=self.trn).where(*cond)
         while True:
-            chunk = list(islice(iter_ids, 1000))
+            chunk = list(islice(iter_ids, 10_000))
             if not chunk:
                 return
-            cond = self._check + [f"(in {pk} %s)" % (" {}" * len(chunk))]
-            select = self.table.select("(count *)").where(*cond)
-            (count,) = select.execute(*chunk).fetchone()
+            (count,) = select.execute(chunk).fetchone()
             if count != len(chunk):
                 msg = f"Validation failed! Condition is: {self._check} )"
                 raise ValidationError(msg)
@@ -117,11 +172,27 @@ class WriterMixin:
         # XXX Detect situation where more than on result is found for
         # a given value (we could also enforce that we only resolve
         # columns with unique constraints) ?
-        stm = self.resolve_stm[col]
-        exm = ExecMany(stm, values, trn=self.trn)
-        for res, vals in zip(exm, values):
-            if res is not None:
-                yield res[0]
+        found = self._resolve_batch(col, values)
+        # Resolve one by one the values not found by the batch (the
+        # batch only supports single-column keys, and values not
+        # matching exactly the ones from the db, like a string given
+        # for a date, are also resolved here)
+        missing = list(
+            {
+                vals: None
+                for vals in values
+                if vals not in found and not any(v is None for v in vals)
+            }
+        )
+        if missing:
+            exm = ExecMany(self.resolve_stm[col], missing, trn=self.trn)
+            for res, vals in zip(exm, missing):
+                if res is not None:
+                    found[vals] = res[0]
+
+        for vals in values:
+            if vals in found:
+                yield found[vals]
             elif any(v is None for v in vals):
                 # One of the values is not given
                 yield None
@@ -135,30 +206,46 @@ class WriterMixin:
                     f"{col} of table {self.table.name})"
                 )
 
+    def _resolve_batch(self, col, values) -> dict:
+        """
+        Resolve all `values` with one query per chunk (see
+        `AST.is_in_sequence`), returns a dict mapping values to ids
+        """
+        to_select = self.groups[col]
+        if len(to_select) != 1:
+            return {}
+        (name,) = to_select
+        keys = list({vals[0] for vals in values if vals[0] is not None})
+        ftable = self.table.schema.get(self.table.foreign_keys[col])
+        select = ftable.select(ftable.primary_key, name, trn=self.trn).where(
+            f"(in {name} {{keys...}})"
+        )
+        found = {}
+        for start in range(0, len(keys), 10_000):
+            for fid, key in select.execute(keys[start : start + 10_000]):
+                found[(key,)] = fid
+        return found
+
     def __call__(self, records):
         return self.executemany(records)
 
-    def from_pandas(self, df: "DataFrame"):
+    def from_pandas(self, df: "DataFrame", chunk_size: int = 10_000):
+        """
+        Write data from a pandas DataFrame. The frame is processed
+        by chunks of `chunk_size` rows, each column of the chunk is
+        converted to native python values (see `pandas_values`).
+        """
         if df.empty:
             return self.executemany([])
 
-        # Convert non-basic types to string
-        is_copy = False
-        for col in self.columns:
-            if df[col].dtype in ("int", "float", "bool", "str"):
-                continue
-            if df[col].dtype == "object":
-                # bytes is not a dedicated type, we rely on the first
-                # value and hope the column type is consistent
-                if isinstance(df[col][0], bytes):
-                    continue
-            if not is_copy:
-                df = df.copy()
-                is_copy = True
-            df[col] = df[col].astype(str)
-
-        rows = df[self.columns].values
-        return self.executemany(rows)
+        ids = []
+        for start in range(0, len(df), chunk_size):
+            stop = start + chunk_size
+            columns = {
+                col: pandas_values(df[col].iloc[start:stop]) for col in self.columns
+            }
+            ids += self.execute_columns(columns)
+        return ids
 
     def from_polars(self, df: "LazyFrame", batch: bool = False):
         """
@@ -186,30 +273,153 @@ class WriterMixin:
             res += self.executemany(rows)
         return res
 
-    def from_dict(self, records):
-        # Create select object in order to generate the same column names
-        select = self.table.select(*self.columns)
-        field_names = [f.name for f in dataclasses.fields(select.to_dataclass())]
+    def from_dict(self, records: Iterable[dict]):
+        """
+        Write records given as dicts. Keys can be field names (as
+        generated by `Select.to_dataclass` or `Select.to_dict`) or
+        column names (with dots).
+        """
+        rows = self._extract(records, self._dict_extractor)
+        return self.executemany(rows)
 
-        # Extract dict values - allows for field names or dotted column format
-        f_or_c = list(zip(field_names, self.columns))
-        rows = (
-            tuple(getter(record, field, col) for col, field in f_or_c)
-            for record in records
-        )
+    def from_objects(self, objects: Iterable[object]):
+        """
+        Write records given as objects (dataclasses, pydantic
+        models, ...). Values are read from attributes named after
+        fields (as generated by `Select.to_dataclass`) or, for nested
+        objects (as generated by `Select.to_dataclass(nest=True)`),
+        by following the dotted column names.
+        """
+        rows = self._extract(objects, self._object_extractor)
         return self.executemany(rows)
 
+    def _extract(self, records: Iterable, compile_fn: Callable):
+        """
+        Yield a tuple of values per record, the extractor is
+        re-compiled only when the shape of records changes.
+        """
+        extractor = None
+        for record in records:
+            if extractor is not None:
+                try:
+                    yield extractor(record)
+                    continue
+                except (KeyError, AttributeError):
+                    # Shape of record has changed
+                    pass
+            extractor = compile_fn(record)
+            yield extractor(record)
+
+    def _dict_extractor(self, record: dict) -> Callable:
+        keys = []
+        for field, col in zip(self.field_names, self.columns):
+            if field in record:
+                keys.append(field)
+            elif col in record:
+                keys.append(col)
+            else:
+                raise KeyError(f"KeyError: neither {field} or {col} found")
+        keys = tuple(keys)
+        if extractor := self._extractors.get(keys):
+            return extractor
+        extractor = compile_getter(itemgetter, keys)
+        self._extractors[keys] = extractor
+        return extractor
 
-def getter(record, field, col):
+    def _object_extractor(self, obj: object) -> Callable:
+        cls = type(obj)
+        if extractor := self._extractors.get(cls):
+            return extractor
+
+        paths = []
+        for field, col in zip(self.field_names, self.columns):
+            if hasattr(obj, field):
+                paths.append(field)
+            elif "." in col:
+                paths.append(col)
+            else:
+                raise AttributeError(f"AttributeError: neither {field} or {col} found")
+
+        if any("." in p for p in paths):
+            # Nested objects may be None
+            getters = [nested_getter(p) for p in paths]
+            extractor = lambda obj: tuple(get(obj) for get in getters)  # noqa: E731
+        else:
+            extractor = compile_getter(attrgetter, tuple(paths))
+        self._extractors[cls] = extractor
+        return extractor
+
+
+def compile_getter(getter: Callable, keys: tuple[str, ...]) -> Callable:
     """
-    Utility function to extract value as a column name (with
-    potentially dots) or a field name from record
+    Return a function that extract values for `keys` (as a tuple)
+    based on `getter` (itemgetter or attrgetter)
     """
-    if field in record:
-        return record[field]
-    if col in record:
-        return record[col]
-    raise KeyError(f"KeyError: neither {field} or {col} found")
+    get = getter(*keys)
+    if len(keys) == 1:
+        return lambda record: (get(record),)
+    return get
+
+
+def nested_getter(path: str) -> Callable:
+    """
+    Return a function that follows the dotted `path` through
+    attributes, stopping on the first None
+    """
+    names = path.split(".")
+
+    def get(obj):
+        for name in names:
+            if obj is None:
+                return None
+            obj = getattr(obj, name)
+        return obj
+
+    return get
+
+
+def pandas_values(srs: "Series") -> list:
+    """
+    Convert a pandas Series into a list of values that can be
+    handed to the database driver: datetimes, numbers, booleans
+    and categoricals are kept typed and missing values are
+    replaced by None.
+    """
+    from numpy import dtype as np_dtype
+    from pandas import CategoricalDtype
+
+    dtype = srs.dtype
+    if isinstance(dtype, CategoricalDtype):
+        # Convert categories once and dispatch them based on codes
+        categories = pandas_values(srs.cat.categories.to_series())
+        return [categories[c] if c >= 0 else None for c in srs.cat.codes.tolist()]
+
+    if dtype.kind == "M":
+        # Datetimes, with or without timezone
+        values = srs.array.to_pydatetime()
+        values[srs.isna().to_numpy()] = None
+        return values.tolist()
+
+    if isinstance(dtype, np_dtype):
+        if dtype.kind in "biu":
+            return srs.tolist()
+        isna = srs.isna().to_numpy()
+        if dtype.kind == "f":
+            if not isna.any():
+                return srs.tolist()
+            values = srs.to_numpy(dtype=object, copy=True)
+        elif dtype.kind == "O" and len(srs) and isinstance(srs.iloc[0], bytes):
+            # bytes is not a dedicated type, we rely on the first
+            # value and hope the column type is consistent
+            values = srs.to_numpy(dtype=object, copy=True)
+        else:
+            # Convert other types to string
+            values = srs.astype(str).to_numpy(dtype=object, copy=True)
+        values[isna] = None
+        return values.tolist()
+
+    # Extension types (nullable ints, floats, booleans and strings)
+    return srs.to_numpy(dtype=object, na_value=None).tolist()
 
 
 def _slicer(chunk_size=10_000):
@@ -0,0 +1,31 @@
+import subprocess
+import sys
+
+CHECK = """
+import logging, sys
+import nagra.cli
+lazy = ["importlib.metadata", "jinja2", "pandas", "polars", "rich", "toml"]
+print(*(m for m in lazy if m in sys.modules))
+print(len(logging.getLogger().handlers))
+"""
+
+
+def test_lazy_imports():
+    # Heavy dependencies are only imported when used, and importing
+    # nagra does not configure logging
+    proc = subprocess.run(
+        [sys.executable, "-c", CHECK], capture_output=True, text=True, check=True
+    )
+    loaded, handlers = proc.stdout.splitlines()
+    assert loaded == ""
+    assert handlers == "0"
+
+
+def test_jinja_env():
+    from jinja2 import Environment
+    from nagra import utils
+    from nagra.utils import jinja_env
+
+    assert isinstance(jinja_env, Environment)
+    assert utils.jinja_env is jinja_env
+    assert jinja_env.filters["autoquote"]("x") == '"x"'
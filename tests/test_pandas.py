@@ -1,11 +1,14 @@
 import zoneinfo
 from datetime import datetime, date
-from pandas import concat, DataFrame, to_datetime
+from pandas import concat, DataFrame, Series, to_datetime
 from uuid import UUID
 
 import pytest
 
 from nagra import Transaction
+from nagra.cache import DataFrameCache
+from nagra.select import ColumnBuilder
+from nagra.writer import pandas_values
 
 
 def test_to_pandas(transaction, temperature):
@@ -34,6 +37,22 @@ def test_to_pandas(transaction, temperature):
     assert sorted(df.city) == ["London"]
 
 
+def test_to_pandas_cache(transaction, temperature, tmp_path):
+    pytest.importorskip("pyarrow")
+    temperature.upsert("timestamp", "city", "value").executemany(
+        [
+            ("1970-01-02", "Berlin", 10),
+            ("1970-01-02", "London", 12),
+        ]
+    )
+    cache = DataFrameCache(tmp_path)
+    select = temperature.select("city", "value").orderby("city")
+    df = select.to_pandas(cache=cache)
+    cached = select.to_pandas(cache=cache)
+    assert cache.stats()["hits"] == 1
+    assert cached.equals(df)
+
+
 def test_from_pandas(transaction, kitchensink):
     if transaction.flavor == "mssql":
         pytest.skip("TZ-aware timestamps are not supported by MSSQL")
@@ -82,7 +101,7 @@ def test_from_pandas(transaction, kitchensink):
             1,
             1.0,
             1,
-            "1970-01-01",
+            "1970-01-01 00:00:00",
             "1970-01-01 00:00:00+00:00",
             1,
             "1970-01-01",
@@ -119,3 +138,83 @@ def test_from_pandas(transaction, kitchensink):
         new_df.columns = ["float", "int"]
         assert str(new_df.float.dtype) == "float64"
         assert str(new_df.int.dtype) == "int64"
+
+
+def test_to_pandas_nulls(transaction, kitchensink):
+    kitchensink.upsert("varchar", "int", "float", "bool").executemany(
+        [
+            ("ham", 1, 1.5, True),
+            ("spam", 2, None, None),
+        ]
+    )
+    select = kitchensink.select("varchar", "int", "float", "bool")
+    df = select.orderby("varchar").to_pandas()
+    assert str(df.int.dtype) == "int64"
+    assert str(df.float.dtype) == "float64"
+    assert str(df.bool.dtype) == "boolean"
+    assert df.float.isna().tolist() == [False, True]
+    assert df.bool.isna().tolist() == [False, True]
+    assert df.bool[0]
+
+
+def test_column_builder():
+    builder = ColumnBuilder((int, float, str), capacity=1)
+    builder.add([(1, 1.0, "a"), (None, None, None)])
+    # Buffers grow when needed
+    builder.add([(3, 3.0, "c")])
+    assert builder.capacity == 4
+    df = builder.to_pandas(("i", "f", "s"))
+    assert str(df.i.dtype) == "Int64"
+    assert df.i.isna().tolist() == [False, True, False]
+    assert (df.i[0], df.i[2]) == (1, 3)
+    assert df.f.isna().tolist() == [False, True, False]
+    assert (df.s[0], df.s[2]) == ("a", "c")
+
+    # Unexpected values trigger a fallback to object buffers
+    builder.add([("four", 4.0, "d")])
+    assert builder.masks[0] is None
+    assert builder.buffers[0][: builder.size].tolist() == [1, None, 3, "four"]
+
+    # Same for ints out of the int64 range
+    builder = ColumnBuilder((int,))
+    builder.add([(1,), (2**70,)])
+    assert builder.masks[0] is None
+    assert builder.buffers[0][: builder.size].tolist() == [1, 2**70]
+    assert builder.to_pandas(("i",)).i.tolist() == [1, 2**70]
+
+
+def test_from_pandas_typed(transaction, kitchensink):
+    df = DataFrame(
+        {
+            "varchar": Series(["ham", "spam", "foo"], dtype="category"),
+            "int": Series([1, 2, 3], dtype="Int64"),
+            "bigint": Series([1, None, 3], dtype="Int64"),
+            "float": [1.5, 2.5, None],
+            "bool": Series([True, None, False], dtype="boolean"),
+        }
+    )
+    kitchensink.upsert(*df.columns).from_pandas(df, chunk_size=2)
+    rows = list(kitchensink.select(*df.columns).orderby("varchar"))
+    assert rows == [
+        ("foo", 3, 3, None, False),
+        ("ham", 1, 1, 1.5, True),
+        ("spam", 2, None, 2.5, None),
+    ]
+
+
+def test_pandas_values():
+    srs = Series(to_datetime(["1970-01-01", None]))
+    assert pandas_values(srs) == [datetime(1970, 1, 1), None]
+
+    srs = Series(["b", None, "a", "b"], dtype="category")
+    assert pandas_values(srs) == ["b", None, "a", "b"]
+
+    srs = Series([1, None], dtype="Int64")
+    values = pandas_values(srs)
+    assert values == [1, None]
+    assert type(values[0]) is int
+
+    # Numpy floats and objects
+    assert pandas_values(Series([1.5, float("nan")])) == [1.5, None]
+    assert pandas_values(Series(["a", None], dtype=object)) == ["a", None]
+    assert pandas_values(Series([], dtype=object)) == []
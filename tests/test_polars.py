@@ -7,11 +7,11 @@ import polars.datatypes
 import polars.testing
 import pytest
 
+from nagra.cache import DataFrameCache
+from nagra.exceptions import ValidationError
 
-def test_to_polars(transaction, temperature):
-    if transaction.flavor != "postgresql":
-        pytest.skip("Sqlite not supported with polars")
 
+def test_to_polars(transaction, temperature):
     # Upsert
     temperature.upsert("timestamp", "city", "value").executemany(
         [
@@ -33,6 +33,83 @@ def test_to_polars(transaction, temperature):
     assert list(df.columns) == ["timestamp", "city", "value"]
     assert sorted(df["city"]) == ["London"]
 
+    # Empty result
+    df = temperature.select().where(cond).to_polars(0).collect()
+    assert list(df.columns) == ["timestamp", "city", "value"]
+    assert df.is_empty()
+
+
+def test_to_polars_cache(transaction, temperature, max_pop, tmp_path):
+    temperature.upsert("timestamp", "city", "value").executemany(
+        [
+            ("1970-01-02", "Berlin", 10),
+            ("1970-01-02", "London", 12),
+        ]
+    )
+    cache = DataFrameCache(tmp_path)
+    select = temperature.select("city", "value").orderby("city")
+    df = select.to_polars(cache=cache).collect()
+    assert cache.stats()["misses"] == 1
+    # Second read comes from the cache
+    cached = select.to_polars(cache=cache)
+    assert cache.stats()["hits"] == 1
+    # Cached frames do not depend on the file
+    cache.clear()
+    polars.testing.assert_frame_equal(df, cached.collect())
+    select.to_polars(cache=cache)
+    assert not list(tmp_path.glob("*.tmp"))
+
+    # Arguments are part of the key
+    df = select.where("(= value {})").to_polars(12, cache=cache).collect()
+    assert list(df["city"]) == ["London"]
+    (entry, _) = cache.entries()
+    assert entry["tables"] == ["temperature"]
+    assert entry["kind"] == "polars"
+
+    # A new row changes the table watermark
+    temperature.upsert("timestamp", "city", "value").execute("1970-01-03", "Paris", 9)
+    df = select.to_polars(cache=cache).collect()
+    assert list(df["city"]) == ["Berlin", "London", "Paris"]
+    assert cache.stats()["misses"] == 4
+
+    # Eviction and clear
+    cache.max_bytes = entry["bytes"] * 2
+    cache.evict()
+    assert len(cache.entries()) == 2
+    assert cache.clear("person") == 0
+    assert cache.clear("temperature") == 2
+    assert cache.entries() == []
+
+    # Views defined with as_select require a version column and are
+    # watermarked directly
+    with pytest.raises(ValidationError):
+        max_pop.select().to_polars(cache=cache)
+    watermarked = []
+    watermark = cache.watermark
+    cache.watermark = lambda t, trn: watermarked.append(t.name) or watermark(t, trn)
+    cache.versions = {"max_pop": "max"}
+    max_pop.select().to_polars(cache=cache)
+    assert watermarked == ["max_pop"]
+
+
+def test_iter_polars(transaction, temperature):
+    temperature.upsert("timestamp", "city", "value").executemany(
+        [
+            ("1970-01-02", "Berlin", 10),
+            ("1970-01-02", "London", 12),
+            ("1970-01-02", "Paris", 14),
+        ]
+    )
+    select = temperature.select().orderby("city")
+    dfs = list(select.iter_polars(batch_size=2))
+    assert [len(df) for df in dfs] == [2, 1]
+    assert str(dfs[0]["timestamp"].dtype) == "Datetime(time_unit='us', time_zone=None)"
+    assert dfs[1]["city"].to_list() == ["Paris"]
+
+    # Batches are concatenated by to_polars
+    df = select.to_polars(batch_size=2).collect()
+    assert df["value"].to_list() == [10.0, 12.0, 14.0]
+
 
 @pytest.mark.parametrize("batch", [True, False])
 def test_from_polars(transaction, kitchensink, batch):
@@ -127,3 +204,14 @@ def test_with_chunking(transaction, temperature_no_nk_pk, batch):
     result = temperature_no_nk_pk.select().to_polars().sort("timestamp").collect()
 
     polars.testing.assert_frame_equal(result, df)
+
+
+def test_polars_series():
+    from nagra.select import polars_series
+
+    # Integers returned by sqlite for booleans are cast
+    srs = polars_series("flag", iter([1, 0, None]), polars.Boolean)
+    assert srs.to_list() == [True, False, None]
+    # Unsupported casts keep the inferred type
+    srs = polars_series("data", [[1, 2], [3]], polars.String)
+    assert srs.dtype == polars.List(polars.Int64)
@@ -0,0 +1,63 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from nagra import Transaction
+from nagra.exceptions import ValidationError
+
+
+def test_params(person):
+    select = person.select("name", "(= parent.name {parent})").where(
+        "(= name {})", "(or (= name {name}) (= name {}))"
+    )
+    assert select.params() == ("parent", "", "name", "")
+
+
+def test_prepared_query(transaction, person):
+    person.upsert("name").execute("Alice")
+    person.upsert("name", "parent.name").executemany(
+        [("Bob", "Alice"), ("Charly", "Alice")]
+    )
+
+    query = (
+        person.select("name")
+        .where("(= parent.name {parent})", "(!= name {})")
+        .orderby("name")
+        .prepare()
+    )
+    assert query.params == ("parent", "")
+    assert query.execute("Bob", parent="Alice").fetchall() == [("Charly",)]
+    assert query.execute("Eve", parent="Alice").fetchall() == [("Bob",), ("Charly",)]
+    assert query.one("Bob", parent="Bob") is None
+
+    # Same name used twice
+    query = person.select("name").where("(or (= name {n}) (= parent.name {n}))")
+    query = query.orderby("name").prepare()
+    assert query.bind(n="Bob") == ("Bob", "Bob")
+    assert query.execute(n="Bob").fetchall() == [("Bob",)]
+
+    with pytest.raises(ValidationError):
+        query.execute()
+    with pytest.raises(ValidationError):
+        query.execute(n="Bob", other=1)
+    with pytest.raises(ValidationError):
+        query.execute("Bob", n="Bob")
+
+
+def test_prepared_query_current_transaction(person, dsn):
+    # Prepared outside of any transaction, the current one is used
+    query = person.select("name").where("(= name {name})").prepare()
+
+    def run(name):
+        with Transaction(dsn, rollback=True) as trn:
+            person.schema.create_tables(trn)
+            person.upsert("name").execute(name)
+            return query.execute(name=name).fetchall()
+
+    if dsn.startswith("sqlite"):
+        # One in-memory database per connection
+        with ThreadPoolExecutor(4) as executor:
+            names = [f"person-{i}" for i in range(8)]
+            assert list(executor.map(run, names)) == [[(n,)] for n in names]
+    else:
+        assert run("Bob") == [("Bob",)]
@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 import pytest
@@ -6,6 +7,7 @@ from nagra import Table, Schema
 from nagra.table import Column
 from nagra.exceptions import IncorrectSchema
 from nagra.transaction import Transaction
+from nagra.utils import strip_lines
 
 
 HERE = Path(__file__).parent
@@ -126,6 +128,178 @@ def test_create_tables(schema, empty_transaction):
     person.columns.pop("email")
 
 
+def test_create_tables_fingerprint(schema, transaction: Transaction, monkeypatch):
+    queries = []
+    execute = transaction.execute
+
+    def counting_execute(stmt, *args, **kwargs):
+        queries.append(stmt)
+        return execute(stmt, *args, **kwargs)
+
+    monkeypatch.setattr(transaction, "execute", counting_execute)
+
+    # Schema is unchanged: a catalog lookup and a select
+    schema.create_tables(trn=transaction)
+    assert len(queries) == 2
+
+    # Forced
+    queries.clear()
+    schema.create_tables(trn=transaction, force=True)
+    assert len(queries) > 2
+
+    # Schema is changed
+    person = schema.tables["person"]
+    person.columns["email"] = Column("email", "varchar")
+    try:
+        schema.create_tables(trn=transaction)
+        assert "email" in schema._db_columns("person", trn=transaction)["person"]
+    finally:
+        person.columns.pop("email")
+
+    # Dropping a table clears the fingerprint
+    schema.tables["skill"].drop(trn=transaction)
+    schema.create_tables(trn=transaction)
+    assert "skill" in schema._db_columns("skill", trn=transaction)
+
+    # Schemas sharing the database have their own fingerprint
+    other = Schema()
+    Table("fp_other", columns={"name": "varchar"}, natural_key=["name"], schema=other)
+    other.create_tables(trn=transaction)
+    queries.clear()
+    schema.create_tables(trn=transaction)
+    other.create_tables(trn=transaction)
+    assert len(queries) == 4
+
+    # Dropping a view clears the fingerprints
+    schema.get("min_pop").drop(trn=transaction)
+    assert "min_pop" not in schema._db_views(trn=transaction)
+    schema.create_tables(trn=transaction)
+    assert "min_pop" in schema._db_views(trn=transaction)
+    other.drop(trn=transaction)
+    assert "fp_other" not in schema._db_columns(trn=transaction)
+
+    # Metadata table is not introspected
+    assert "nagra_meta" not in Schema.from_db(trn=transaction).tables
+
+
+INDEX_TOML = """
+[ix_city]
+natural_key = ["name"]
+[ix_city.columns]
+name = "varchar"
+
+[ix_temperature]
+natural_key = ["timestamp", "city"]
+index_fk = true
+[ix_temperature.columns]
+timestamp = "timestamp"
+city = "bigint"
+station = "bigint"
+value = "float"
+[ix_temperature.foreign_keys]
+city = "ix_city"
+station = "ix_city"
+[ix_temperature.indexes.ix_temperature_value_idx]
+columns = ["city", "(abs value)"]
+where = "(> value 0)"
+include = ["timestamp"]
+[ix_temperature.indexes.ix_temperature_brin]
+columns = ["timestamp"]
+method = "brin"
+"""
+
+
+def test_secondary_indexes(empty_transaction):
+    trn = empty_transaction
+    schema = Schema.from_toml(INDEX_TOML)
+    temperature = schema.get("ix_temperature")
+    # city is the first column of a declared index
+    names = [idx.name for idx in temperature.secondary_indexes()]
+    assert names == [
+        "ix_temperature_value_idx",
+        "ix_temperature_brin",
+        "ix_temperature_station_idx",
+    ]
+
+    stmt = temperature.indexes["ix_temperature_value_idx"].stmt(trn.flavor)
+    if trn.flavor == "sqlite":
+        assert strip_lines(stmt) == [
+            'CREATE INDEX IF NOT EXISTS "ix_temperature_value_idx" ON "ix_temperature" (',
+            '"city", abs("value")',
+            ')',
+            'WHERE "value" > 0;',
+        ]
+    # Methods are specific to postgresql
+    brin = temperature.indexes["ix_temperature_brin"]
+    assert (brin.stmt(trn.flavor) is None) == (trn.flavor != "postgresql")
+
+    schema.create_tables(trn=trn)
+    db_indexes = schema._db_indexes(trn)
+    expected = {"ix_temperature_value_idx", "ix_temperature_station_idx"}
+    if trn.flavor == "postgresql":
+        expected.add("ix_temperature_brin")
+    assert expected <= set(db_indexes)
+
+    # Only missing indexes are created
+    trn.execute('DROP INDEX "ix_temperature_station_idx"')
+    stmts = [s for s in schema.setup_statements(trn) if "INDEX" in s]
+    assert len(stmts) == 1
+    assert "ix_temperature_station_idx" in stmts[0]
+    schema.create_tables(trn=trn, force=True)
+
+    # Toml round trip
+    clone = Schema.from_toml(schema.generate_toml())
+    for name, index in temperature.indexes.items():
+        assert index.eq(clone.get("ix_temperature").indexes[name])
+    assert clone.get("ix_temperature").index_fk
+    assert clone.get("ix_temperature").eq(temperature)
+
+    # Changed definitions are applied
+    changed = Schema.from_toml(INDEX_TOML)
+    index = changed.get("ix_temperature").indexes["ix_temperature_value_idx"]
+    index.unique = True
+    index.where = "(> value 10)"
+    assert not changed.get("ix_temperature").eq(temperature)
+    stmts = [s for s in changed.setup_statements(trn) if "INDEX" in s]
+    assert len(stmts) == 2
+    assert stmts[0].startswith("DROP INDEX")
+    assert "UNIQUE" in stmts[1]
+    changed.create_tables(trn=trn, force=True)
+    stmts = [s for s in changed.setup_statements(trn) if "INDEX" in s]
+    assert stmts == []
+    if trn.flavor == "sqlite":
+        (sql,) = trn.execute(
+            "SELECT sql FROM sqlite_master WHERE name = 'ix_temperature_value_idx'"
+        ).fetchone()
+        assert sql.startswith('CREATE UNIQUE INDEX "ix_temperature_value_idx"')
+        assert sql.endswith('WHERE "value" > 10')
+
+    # Unique expression indexes do not prevent introspection
+    db_schema = Schema.from_db(trn=trn)
+    assert db_schema.get("ix_temperature").natural_key == ["timestamp", "city"]
+
+    # Indexes not created by nagra are kept
+    trn.execute(
+        "DELETE FROM nagra_meta WHERE name = 'index:ix_temperature_station_idx'"
+    )
+    with pytest.warns(RuntimeWarning):
+        stmts = [s for s in changed.setup_statements(trn) if "INDEX" in s]
+    assert stmts == []
+
+    # Mssql does not index expressions
+    assert index.stmt("mssql") is None
+
+    # Indexes only accept columns of the table
+    with pytest.raises(IncorrectSchema):
+        Table(
+            "ix_bogus",
+            columns={"name": "varchar"},
+            natural_key=["name"],
+            indexes={"ix_bogus_idx": {"columns": ["(lower city.name)"]}},
+            schema=Schema(),
+        )
+
+
 def test_custom_id_type(empty_transaction):
     sch = Schema()
     city = Table(
@@ -209,6 +383,138 @@ def test_schema_from_nagra_db(transaction: Transaction):
     assert parameter.natural_key == ["name"]
 
 
+def test_introspection_whitelist(transaction: Transaction, monkeypatch):
+    # One query per catalog, filtered by the database
+    queries = []
+    execute = transaction.execute
+
+    def counting_execute(stmt, *args, **kwargs):
+        queries.append(stmt)
+        return execute(stmt, *args, **kwargs)
+
+    monkeypatch.setattr(transaction, "execute", counting_execute)
+    schema = Schema()
+    schema.introspect_db(trn=transaction)
+    assert len(queries) == 5
+
+    schema = Schema()
+    schema.introspect_db("person", "org", "min_pop", trn=transaction)
+    assert sorted(schema.tables) == ["min_pop", "org", "person"]
+    assert sorted(schema.views) == ["min_pop"]
+    assert schema.get("org").foreign_keys == {"person": "person"}
+    assert schema.get("org").natural_key == ["name"]
+    assert schema.get("person").primary_key == "id"
+    assert Schema._db_unique({}, "org", trn=transaction) == {"org": ["name"]}
+
+
+def test_schema_snapshot(transaction: Transaction, tmp_path, monkeypatch):
+    cache_path = tmp_path / "schema.pickle"
+    schema = Schema.from_db(trn=transaction, cache_path=cache_path)
+    assert cache_path.exists()
+
+    # Second call loads the snapshot
+    introspect_db = Schema.introspect_db
+
+    def failing_introspect(*args, **kwargs):
+        raise AssertionError("Unexpected introspection")
+
+    monkeypatch.setattr(Schema, "introspect_db", failing_introspect)
+    snapshot = Schema.from_db(trn=transaction, cache_path=cache_path)
+    assert snapshot.eq(schema)
+    assert snapshot.get("org").schema is snapshot
+
+    # Snapshot is refreshed when the catalog changes
+    transaction.execute("CREATE TABLE extra (name varchar(10))")
+    monkeypatch.setattr(Schema, "introspect_db", introspect_db)
+    snapshot = Schema.from_db(trn=transaction, cache_path=cache_path)
+    assert "extra" in snapshot.tables
+    fingerprint = Schema.db_fingerprint(trn=transaction)
+    assert "extra" in Schema.load_snapshot(cache_path, fingerprint).tables
+
+
+def test_lazy_schema(transaction: Transaction, monkeypatch):
+    queries = []
+    execute = transaction.execute
+
+    def counting_execute(stmt, *args, **kwargs):
+        queries.append(stmt)
+        return execute(stmt, *args, **kwargs)
+
+    monkeypatch.setattr(transaction, "execute", counting_execute)
+    schema = Schema.from_db(lazy=True)
+    assert schema.tables == {}
+    assert queries == []
+
+    # Tables reachable through foreign keys are also loaded
+    org = schema.get("org")
+    assert sorted(schema.tables) == ["org", "person"]
+    assert org.foreign_keys == {"person": "person"}
+    assert schema.get("person").foreign_keys == {"parent": "person"}
+    # One batch of queries for org, one for person
+    assert len(queries) == 10
+
+    # Cached
+    assert schema.get("org") is org
+    assert Table.get("person", schema=schema) is schema.get("person")
+    assert len(queries) == 10
+    assert "person" in org.select("person.name").stm()
+
+    # Lazy introspection does not update dicts being iterated on
+    tables = iter(schema.tables)
+    next(tables)
+    schema.get("country")
+    assert len(list(tables)) == 1
+
+    assert sorted(schema.get("min_pop").columns) == ["country", "min"]
+    with pytest.raises(KeyError):
+        schema.get("unknown")
+
+    # Unknown names are not looked up again
+    nb_queries = len(queries)
+    with pytest.raises(KeyError):
+        schema.get("unknown")
+    with pytest.raises(KeyError):
+        Table.get("unknown", schema=schema)
+    assert len(queries) == nb_queries
+
+    # Until an explicit reload
+    transaction.execute("CREATE TABLE unknown (name varchar(10))")
+    with pytest.raises(KeyError):
+        schema.get("unknown")
+    schema.introspect_db("unknown")
+    assert schema.get("unknown").columns.keys() == {"name"}
+    schema.reset()
+    assert schema.get("unknown").columns.keys() == {"name"}
+
+
+def test_toml_snapshot(tmp_path, monkeypatch):
+    monkeypatch.setenv("NAGRA_CACHE_DIR", str(tmp_path))
+    src = HERE / "assets" / "sample_schema.toml"
+    schema = Schema.from_toml(src, cache=True)
+    assert len(list(tmp_path.glob("schema-*.pickle"))) == 1
+
+    (path,) = tmp_path.glob("schema-*.pickle")
+    assert path.stat().st_mode & 0o777 == 0o600
+
+    load_toml = Schema.load_toml
+    monkeypatch.setattr(Schema, "load_toml", None)
+    snapshot = Schema.from_toml(src, cache=True)
+    assert snapshot.eq(schema)
+    assert list(snapshot.views) == ["top_user"]
+
+    # Snapshots writable by other users are ignored
+    path.chmod(0o666)
+    fingerprint = Schema._fingerprint(src.read_text())
+    assert Schema.load_snapshot(path, fingerprint) is None
+
+    # Unused snapshots are evicted
+    monkeypatch.setattr(Schema, "load_toml", load_toml)
+    os.utime(path, (0, 0))
+    Schema.from_toml(src.read_text() + "\n", cache=True)
+    assert len(list(tmp_path.glob("schema-*.pickle"))) == 1
+    assert not path.exists()
+
+
 def test_schema_from_db(transaction: Transaction):
     """
     Check introspection on various coner cases
@@ -230,7 +536,14 @@ def test_schema_from_db(transaction: Transaction):
         )
         """,
         "CREATE UNIQUE INDEX visit_idx ON visit (patient_id, visit_date)",
+        "CREATE TABLE appointment (id int primary key, slot int, room varchar(10))",
+        # Columns of the index are not in the table order
+        "CREATE UNIQUE INDEX appointment_idx ON appointment (room, slot)",
+        # Partial and expression indexes are not natural keys
+        "CREATE UNIQUE INDEX appointment_slot_idx ON appointment (slot) WHERE room IS NULL",
     ]
+    if transaction.flavor != "mssql":
+        stmts.append("CREATE UNIQUE INDEX appointment_room_idx ON appointment (lower(room))")
     for stm in stmts:
         transaction.execute(stm)
 
@@ -252,6 +565,8 @@ def test_schema_from_db(transaction: Transaction):
     assert visit.natural_key == ["patient_id", "visit_date"]
     assert visit.foreign_keys == {"patient_id": "patient"}
 
+    assert schema.get("appointment").natural_key == ["room", "slot"]
+
 
 def test_suspend_fk(transaction: Transaction):
     if transaction.flavor == "mssql":
@@ -298,3 +613,28 @@ def test_default_columns():
     assert list(table.default_columns(skip_pk=True)) == ["name", "description", "data"]
     assert list(table.default_columns(skip_blob=True)) == ["id", "name", "description"]
     assert list(table.default_columns(skip_pk=True, skip_blob=True)) == ["name", "description"]
+
+
+def test_join_path():
+    schema = Schema()
+    person = Table(
+        "person",
+        columns={"name": "varchar", "parent": "bigint", "country": "bigint"},
+        foreign_keys={"parent": "person", "country": "country"},
+        natural_key=["name"],
+        schema=schema,
+    )
+    ftable, alias_col, join_col = person.join_on(("parent", "parent", "parent"))
+    assert (ftable, alias_col, join_col) == (person, "id", "parent")
+    # Cached on the schema, keyed by table and path
+    assert ("person", ("parent", "parent", "parent")) in schema._join_paths
+    assert person.join_on(("parent", "parent", "parent")) is schema.join_path(
+        person, ("parent", "parent", "parent")
+    )
+
+    # Invalidated on schema changes
+    country = Table("country", columns={"name": "varchar"}, schema=schema)
+    assert schema._join_paths == {}
+    assert person.join_on(("parent", "country")) == (country, "id", "country")
+    schema.reset()
+    assert schema._join_paths == {}
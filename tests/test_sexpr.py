@@ -1,4 +1,8 @@
-from nagra.sexpr import AST
+import random
+import shlex
+from concurrent.futures import ThreadPoolExecutor
+
+from nagra.sexpr import AST, Token, lex, parse_cache
 from nagra.table import Table, Env
 from nagra.utils import strip_lines
 
@@ -7,48 +11,48 @@ def test_sexpr():
     # Simple dot reference
     expr = "ham.spam"
     ast = AST.parse(expr)
-    assert str(ast.tokens) == "[<VarToken ham.spam>]"
+    assert str(list(ast.tokens)) == "[<VarToken ham.spam>]"
 
     # With int literal
     expr = "(= ham.spam 1)"
     ast = AST.parse(expr)
-    assert str(ast.tokens) == "[<BuiltinToken =>, <VarToken ham.spam>, <IntToken 1>]"
+    assert str(list(ast.tokens)) == "[<BuiltinToken =>, <VarToken ham.spam>, <IntToken 1>]"
 
     # With string literal
     expr = "(= ham.spam 'one')"
     ast = AST.parse(expr)
-    assert str(ast.tokens) == "[<BuiltinToken =>, <VarToken ham.spam>, <StrToken one>]"
+    assert str(list(ast.tokens)) == "[<BuiltinToken =>, <VarToken ham.spam>, <StrToken one>]"
 
     # With placeholder
     expr = "(= ham.spam {})"
     ast = AST.parse(expr)
-    assert str(ast.tokens) == "[<BuiltinToken =>, <VarToken ham.spam>, <ParamToken >]"
+    assert str(list(ast.tokens)) == "[<BuiltinToken =>, <VarToken ham.spam>, <ParamToken >]"
 
     # With string operator
     expr = "(|| 'one' 'two')"
     ast = AST.parse(expr)
-    assert str(ast.tokens) == "[<BuiltinToken ||>, <StrToken one>, <StrToken two>]"
+    assert str(list(ast.tokens)) == "[<BuiltinToken ||>, <StrToken one>, <StrToken two>]"
 
     # With variable clashing with an aggregate
     expr = "(max min)"
     ast = AST.parse(expr)
-    assert str(ast.tokens) == "[<AggToken max>, <VarToken min>]"
+    assert str(list(ast.tokens)) == "[<AggToken max>, <VarToken min>]"
 
     # With lone aggregate
     expr = "(count)"
     ast = AST.parse(expr)
-    assert str(ast.tokens) == "[<AggToken count>]"
+    assert str(list(ast.tokens)) == "[<AggToken count>]"
 
     # With an operator sign as variable
     expr = "(+ 1 1)"
     ast = AST.parse(expr)
-    assert str(ast.tokens) == "[<BuiltinToken +>, <IntToken 1>, <IntToken 1>]"
+    assert str(list(ast.tokens)) == "[<BuiltinToken +>, <IntToken 1>, <IntToken 1>]"
 
     # With litterals
     expr = "(is null true)"
     ast = AST.parse(expr)
     assert (
-        str(ast.tokens)
+        str(list(ast.tokens))
         == "[<BuiltinToken is>, <LiteralToken null>, <LiteralToken true>]"
     )
 
@@ -56,18 +60,82 @@ def test_sexpr():
     expr = "(is null .true))"
     ast = AST.parse(expr)
     assert (
-        str(ast.tokens) == "[<BuiltinToken is>, <LiteralToken null>, <VarToken true>]"
+        str(list(ast.tokens)) == "[<BuiltinToken is>, <LiteralToken null>, <VarToken true>]"
     )
 
     # Compare litterals
     expr = "(!= true false)"
     ast = AST.parse(expr)
     assert (
-        str(ast.tokens)
+        str(list(ast.tokens))
         == "[<BuiltinToken !=>, <LiteralToken true>, <LiteralToken false>]"
     )
 
 
+def shlex_lexer(expr):
+    # Reference implementation of lex
+    lexer = shlex.shlex(expr)
+    lexer.wordchars += ".!=<>:{}-|"
+    return lexer
+
+
+def shlex_lex(expr):
+    return list(shlex_lexer(expr))
+
+
+def shlex_parse(expr):
+    # Reference implementation of AST.parse
+    def tokenize():
+        prev_tk = None
+        for value in shlex_lexer(expr):
+            prev_tk = Token.from_value(value, prev_tk)
+            yield prev_tk
+
+    def scan(tokens):
+        res = []
+        for tk in tokens:
+            if tk.value == ")":
+                return res
+            elif tk.value == "(":
+                res.append(scan(tokens))
+            else:
+                res.append(tk)
+        return res
+
+    tokens = scan(tokenize())[0]
+    return [tokens] if isinstance(tokens, Token) else tokens
+
+
+def as_tree(tokens):
+    if isinstance(tokens, AST):
+        tokens = tokens.tokens
+    return [
+        (tk.__class__.__name__, tk.value) if isinstance(tk, Token) else as_tree(tk)
+        for tk in tokens
+    ]
+
+
+def outcome(fn, expr):
+    try:
+        return fn(expr)
+    except (ValueError, IndexError) as exc:
+        return exc.__class__
+
+
+def test_lex_equivalence():
+    rnd = random.Random(42)
+    alphabet = [
+        "(", ")", " ", "\n", "\t", "'", '"', "#", "{", "}", ".", "-", "=",
+        "<", ">", "!", "|", ":", "+", "*", "/", ",", "%", "é", "_",
+        "a", "b", "max", "null", "true", "1", "0.5", "x.y",
+    ]  # fmt: skip
+    for _ in range(5000):
+        expr = "".join(rnd.choices(alphabet, k=rnd.randint(0, 12)))
+        assert outcome(lambda e: list(lex(e)), expr) == outcome(shlex_lex, expr)
+        expected = outcome(lambda e: as_tree(shlex_parse(e)), expr)
+        assert outcome(lambda e: as_tree(AST._parse(e)), expr) == expected
+
+
 def test_find_relations():
     expr = "(= ham.spam foo.bar)"
     ast = AST.parse(expr)
@@ -138,7 +206,38 @@ def test_join_eval(person):
     assert env.refs == {
         ("parent",): "parent_0",
     }
-    assert res == """("parent_0"."name" = 'Roger') AND ("parent_0"."id" = 1)"""
+    # parent.id is the parent column, no join needed
+    assert res == """("parent_0"."name" = 'Roger') AND ("person"."parent" = 1)"""
+
+    # Join elimination
+    env = Env(table=person)
+    res = AST.parse("(= parent.parent.id 1)").eval(env)
+    assert env.refs == {("parent",): "parent_0"}
+    assert res == '"parent_0"."parent" = 1'
+    env = Env(table=person)
+    assert AST.parse("parent.id").eval(env) == '"person"."parent"'
+    assert env.refs == {}
+
+
+def test_parse_cache(person):
+    expr = "(= parent.name {})"
+    ast = AST.parse(expr)
+    hits = parse_cache.hits
+    assert AST.parse(expr) is ast
+    assert parse_cache.hits == hits + 1
+    assert set(parse_cache.stats()) == {"hits", "misses", "size", "maxsize"}
+
+    # Evaluation is side-effect free, a shared ast gives the same
+    # result in different envs, also when done concurrently
+    first_env = Env(table=person, refs={("orgs",): "orgs_0"})
+    assert ast.eval(first_env) == '"parent_1"."name" = %s'
+
+    def evaluate(_):
+        return ast.eval(Env(table=person))
+
+    with ThreadPoolExecutor(4) as executor:
+        results = set(executor.map(evaluate, range(100)))
+    assert results == {'"parent_0"."name" = %s'}
 
 
 def test_eval_dtype(kitchensink):
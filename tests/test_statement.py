@@ -1,5 +1,9 @@
-from nagra import Statement
-from nagra.utils import strip_lines
+from itertools import product
+
+from nagra import Schema, Statement, Table
+from nagra.table import Column
+from nagra.emitters import EMITTERS
+from nagra.utils import LRUCache, strip_lines, template
 
 
 def test_debug_statement():
@@ -99,3 +103,122 @@ def test_mssql_upsert_uses_merge():
         ';'
 ]
 
+
+def emitter_cases():
+    joins = [
+        ("org", "org_0", "person", "id", "org", "INNER"),
+        ("country", "country_1", "org_0", "id", "country", "LEFT"),
+    ]
+    for cols, jns, conds, limit, offset, groupby, orderby, distinct_on, distinct in product(
+        [["a"], ["a", "b"]],
+        [[], joins],
+        [[], ["x = 1", "y"]],
+        [None, 0, 5],
+        [None, 0, 3],
+        [[], ["a", "b"]],
+        [[], ["a ASC"]],
+        [[], ["a", "b c"]],
+        [False, True],
+    ):
+        yield "select", dict(
+            table="t",
+            columns=cols,
+            joins=jns,
+            conditions=conds,
+            limit=limit,
+            offset=offset,
+            groupby=groupby,
+            orderby=orderby,
+            distinct_on=distinct_on,
+            distinct=distinct,
+        )
+    for cols, conflict_key, do_update, returning, set_identity in product(
+        [{"a": None}, {"a": None, "b": None, "c": None}],
+        [[], ["a"], ["a", "b"]],
+        [False, True],
+        [[], ["id"], ["id", "a"]],
+        [False, True],
+    ):
+        yield "upsert", dict(
+            table="t",
+            columns=cols,
+            conflict_key=conflict_key,
+            do_update=do_update,
+            returning=returning,
+            set_identity=set_identity,
+        )
+    for cols, condition_key, returning in product(
+        [{"a": None}, {"a": None, "b": None, "c": None}],
+        [["a"], ["a", "b"]],
+        [[], ["id"], ["id", "a"]],
+    ):
+        yield "update", dict(
+            table="t", columns=cols, condition_key=condition_key, returning=returning
+        )
+    for conds in [[], ["x"], ["x", "y"]]:
+        yield "delete", dict(table="t", conditions=conds)
+        for jns in [[], joins]:
+            yield "delete-with-join", dict(table="t", joins=jns, conditions=conds)
+
+
+def test_emitters():
+    # Emitters must generate the same sql as the templates
+    for flavor in ("postgresql", "sqlite", "mssql"):
+        for name, params in emitter_cases():
+            key = f"{flavor}/{name}"
+            expected = template(f"{key}.sql").render(**params, _all_params=params)
+            assert EMITTERS[key](**params) == expected
+            assert Statement(name, flavor=flavor, **params)() == expected
+
+
+def test_stm_memoization(person):
+    select = person.select("name").where("(= id {})")
+    stm = select.stm()
+    # Memoized on the instance
+    assert select.stm() is stm
+
+    # Shared across instances with the same shape
+    stm_cache = person.schema.stm_cache
+    hits = stm_cache.hits
+    other = person.select("name").where("(= id {})")
+    assert other.stm() is stm
+    assert stm_cache.hits == hits + 1
+
+    # A different shape gives a different statement
+    assert select.limit(1).stm() != stm
+
+    # Upsert, update and delete are also cached
+    upsert = person.upsert("name")
+    assert upsert.stm() is person.upsert("name").stm()
+    update = person.update("name", "id")
+    assert update.stm() is person.update("name", "id").stm()
+    delete = person.delete().where("(= name {})")
+    assert delete.stm() is person.delete().where("(= name {})").stm()
+
+
+def test_lru_cache():
+    cache = LRUCache(size=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    # "b" is the least recently used
+    cache.set("c", 3)
+    assert "b" not in cache
+    assert cache.get("b") is None
+    assert cache.get_or_set("d", lambda: 4) == 4
+    assert cache.stats() == {"hits": 1, "misses": 2, "size": 2, "maxsize": 2}
+
+
+def test_stm_cache_invalidation():
+    schema = Schema()
+    table = Table("item", columns={"name": "varchar"}, schema=schema)
+    stm = table.select().stm()
+    assert "name" in stm
+
+    # Statements are cached per schema, and invalidated when the
+    # schema changes
+    table.columns["size"] = Column("size", "int")
+    schema.invalidate()
+    assert "size" in table.select().stm()
+    Table("other", columns={"name": "varchar"}, schema=schema)
+    assert len(schema.stm_cache) == 0
@@ -1,7 +1,15 @@
-from datetime import datetime
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import date, datetime
+from decimal import Decimal
+from uuid import UUID
+
 import pytest
 
 from nagra import Transaction
+from nagra.cache import ResultCache, result_cache, sizeof
+from nagra.exceptions import ValidationError
+from nagra.sexpr import sequence_arg
 from nagra.utils import strip_lines
 
 
@@ -28,6 +36,38 @@ def test_select_with_join(person):
     ]
 
 
+def test_join_optimizations(person, skill, org, transaction):
+    # Only the id of the parent is needed: no join
+    stm = person.select("name", "parent.id").stm()
+    assert strip_lines(stm) == [
+        "SELECT",
+        '"person"."name", "person"."parent"',
+        'FROM "person"',
+        ";",
+    ]
+
+    # Required foreign keys give inner joins (up to the first nullable
+    # one in the chain)
+    stm = skill.select("name", "person.name", "person.parent.name").stm()
+    lines = strip_lines(stm)
+    assert 'INNER JOIN "person" as "person_0" ON (' in lines
+    assert 'LEFT JOIN "person" as "parent_1" ON (' in lines
+    assert skill.required_path(("person",))
+    assert not skill.required_path(("person", "parent"))
+    assert not org.required_path(("person",))
+
+    # Results are unchanged
+    person.upsert("name", "parent.name").executemany([("Alice", None)])
+    person.upsert("name", "parent.name").executemany([("Bob", "Alice")])
+    skill.upsert("name", "person.name").executemany([("A", "Alice"), ("B", "Bob")])
+    select = skill.select("name", "person.name", "person.parent.name", "person.id")
+    assert sorted(select) == [
+        ("A", "Alice", None, 1),
+        ("B", "Bob", "Alice", 2),
+    ]
+    assert sorted(person.select("name", "parent.id")) == [("Alice", None), ("Bob", 1)]
+
+
 def test_kitchensink_select(kitchensink):
     stm = kitchensink.select().stm()
     res = strip_lines(stm)
@@ -79,6 +119,17 @@ def test_select_clone(person):
     for q in queries[1:]:
         assert q.stm() == expected
 
+    # Columns are shared with clones, not parsed again
+    select = person.select("name", "parent.name")
+    cln = select.where("(= name 'spam')")
+    assert cln.columns_ast is select.columns_ast
+    assert cln.query_columns is select.query_columns
+    assert cln.env is not select.env
+
+    # Chained select adds columns
+    select = person.select("name").select("parent.name")
+    assert select.query_columns == ('"person"."name"', '"parent_0"."name"')
+
 
 def test_select_with_where(person):
     select = person.select("name").where("(= id {})")
@@ -415,9 +466,8 @@ def test_select_alias(transaction, temperature):
     assert sorted(df) == ["c", "t", "v"]
 
     # Check polars df columns
-    if transaction.flavor == "postgresql":
-        df = select.to_polars().collect()
-        assert sorted(df.columns) == ["c", "t", "v"]
+    df = select.to_polars().collect()
+    assert sorted(df.columns) == ["c", "t", "v"]
 
 
 @pytest.mark.parametrize("nest_with_param", [False, True])
@@ -474,6 +524,238 @@ def test_any_and_values(transaction, person):
         assert res == [(1,)]
 
 
+def test_in_sequence(transaction, person, temperature):
+    person.insert("name").executemany([(f"p{i}",) for i in range(5000)])
+
+    # The statement does not depend on the number of values
+    select = person.select("name").where("(in name {names...})").orderby("name")
+    assert select.sequence_params() == (0,)
+    assert select.execute(["p1", "p2", "x"]).fetchall() == [("p1",), ("p2",)]
+    names = [f"p{i}" for i in range(3000)]
+    assert len(select.execute(names).fetchall()) == 3000
+    assert select.execute([]).fetchall() == []
+
+    # Combined with other params, in a prepared query
+    query = (
+        person.select("(count *)")
+        .where("(!= name {})", "(in name {names...})")
+        .prepare()
+    )
+    assert query.execute("p1", names=("p1", "p2", "p3")).fetchone() == (2,)
+
+    # Ints and datetimes
+    ids = person.select("id").where("(in name {names...})").execute(names[:10])
+    select = person.select("(count *)").where("(in id {ids...})")
+    assert select.execute([i for i, in ids]).fetchone() == (10,)
+    temperature.upsert("timestamp", "city", "value").execute(
+        datetime(2024, 1, 1, 12), "Paris", 1.0
+    )
+    select = temperature.select("value").where("(in timestamp {ts...})")
+    assert select.execute([datetime(2024, 1, 1, 12)]).fetchall() == [(1.0,)]
+
+    # Anonymous sequence parameter
+    select = person.select("(count *)").where("(in name {...})")
+    assert select.execute(["p1", "p2"]).fetchone() == (2,)
+
+    # A plain parameter is a scalar value
+    select = person.select("name").where("(in name {name})")
+    assert select.sequence_params() == ()
+    assert select.execute("p1").fetchall() == [("p1",)]
+
+    # Sequence parameters are only accepted by `in`
+    with pytest.raises(ValueError):
+        person.select("name").where("(= name {names...})").stm()
+
+    # Delete
+    delete = person.delete().where("(in name {names...})")
+    delete.execute(names)
+    assert person.select("(count *)").execute().fetchone() == (2000,)
+
+
+def test_sequence_arg():
+    values = [
+        Decimal("1.5"),
+        datetime(2024, 1, 1, 12),
+        date(2024, 1, 1),
+        UUID(int=1),
+    ]
+    assert json.loads(sequence_arg(values, "sqlite")) == [
+        1.5,
+        "2024-01-01 12:00:00",
+        "2024-01-01",
+        "00000000-0000-0000-0000-000000000001",
+    ]
+    assert sequence_arg(values, "postgresql") == values
+    with pytest.raises(TypeError):
+        sequence_arg([b"abc"], "sqlite")
+    with pytest.raises(TypeError):
+        sequence_arg("abc", "sqlite")
+
+
+def test_paginate(transaction, temperature):
+    records = [
+        (datetime(2024, 1, 1 + day, hour), city, float(day * hour))
+        for day in range(5)
+        for hour in range(6)
+        for city in ("Brussels", "Paris", "Rome")
+    ]
+    temperature.upsert("timestamp", "city", "value").executemany(records)
+
+    select = temperature.select("city", "value")
+    for by in [
+        ("timestamp", "city"),
+        (("timestamp", "desc"), ("city", "desc")),
+        ("city", ("timestamp", "desc")),
+    ]:
+        expected = list(select.orderby(*by).execute())
+        pages = list(select.paginate(by=by, page_size=7))
+        assert [len(p) for p in pages] == [7] * 12 + [6]
+        assert [row for page in pages for row in page] == expected
+
+    # With a where condition and a parameter
+    select = temperature.select("timestamp", "city", "value")
+    select = select.where("(> value {})")
+    expected = list(select.orderby("timestamp", "city").execute(10))
+    pages = select.paginate(10, by=("timestamp", "city"), page_size=5)
+    assert [row for page in pages for row in page] == expected
+
+    # With aliases
+    aliased = temperature.select("value").aliases("v").where("(> value {})")
+    pages = aliased.paginate(10, by=("timestamp", "city"), page_size=5)
+    assert [row for page in pages for row in page] == [(v,) for *_, v in expected]
+
+    # Stateless pagination with cursor tokens
+    select = select.orderby("timestamp", "city").limit(5)
+    rows = []
+    token = None
+    while page := select.after(token).execute(10).fetchall():
+        rows.extend(page)
+        token = select.cursor_token(page[-1])
+    assert rows == expected
+
+    # Seek arguments are bound, only the query parameters are visible
+    token = select.cursor_token(expected[4])
+    after = select.where("(!= city {city})").after(token)
+    assert after.params() == ("", "city")
+    query = after.prepare()
+    assert query.execute(10, city="x").fetchall() == expected[5:10]
+    assert after.execute(10, "x").fetchall() == expected[5:10]
+    # paginate starts after the token
+    pages = select.after(token).paginate(10, page_size=3)
+    assert [row for page in pages for row in page] == expected[5:]
+
+    # Values keep their type
+    ts = datetime(2024, 1, 1, 12)
+    typed = select.cursor_token((ts, "Paris", 1.0))
+    assert json.loads(urlsafe_b64decode(typed)) == [
+        ["datetime", ts.isoformat()],
+        "Paris",
+    ]
+    assert select.after(typed)._seek_args[1] == (ts, ts, ts, "Paris")
+
+    with pytest.raises(ValidationError):
+        select.after("not-a-token")
+    with pytest.raises(ValidationError):
+        bad = urlsafe_b64encode(json.dumps([["decimal", "x"], "a"]).encode())
+        select.after(bad.decode())
+    with pytest.raises(ValidationError):
+        select.after(token).after(token)
+    with pytest.raises(ValidationError):
+        temperature.select("value").orderby("city").cursor_token((1.0,))
+    with pytest.raises(ValidationError, match="requires an orderby"):
+        temperature.select("value").after("W10=")
+
+
+def test_cached_select(tmp_path, schema, person, org, min_pop, max_pop):
+    result_cache.clear()
+    dsn = f"sqlite://{tmp_path / 'cache.db'}"
+    with Transaction(dsn):
+        schema.create_tables()
+        person.upsert("name", "parent.name").executemany([("Alice", None)])
+        person.upsert("name", "parent.name").executemany([("Bob", "Alice")])
+
+    # Tables read by queries
+    assert person.select("name").tables() == {"person"}
+    assert org.select("name", "person.parent.name").tables() == {"org", "person"}
+    assert person.select("name", "orgs.name").tables() == {"org", "person"}
+    assert min_pop.select().tables() == {"min_pop", "country", "population"}
+    assert "person" in max_pop.select().tables()
+
+    def query(name):
+        select = person.select("name").where("(= parent.name {})")
+        return select.cached().execute(name).fetchall()
+
+    with Transaction(dsn):
+        assert query("Alice") == [("Bob",)]
+        assert query("Alice") == [("Bob",)]
+        assert query("Bob") == []
+    assert result_cache.stats()["hits"] == 1
+    assert result_cache.stats()["misses"] == 2
+
+    with Transaction(dsn):
+        assert query("Alice") == [("Bob",)]
+        # Writing another table keeps the entries
+        org.upsert("name", "person.name").execute("Org", "Bob")
+        assert len(result_cache) == 2
+        person.upsert("name", "parent.name").execute("Carol", "Bob")
+        assert len(result_cache) == 0
+        # Results depending on uncommitted writes are not cached
+        assert query("Bob") == [("Carol",)]
+        assert len(result_cache) == 0
+
+    with Transaction(dsn):
+        assert query("Bob") == [("Carol",)]
+        assert len(result_cache) == 1
+        person.delete().where("(= name {})").execute("Carol")
+        assert len(result_cache) == 0
+        assert query("Bob") == []
+
+    with Transaction(dsn):
+        # Expired entries are ignored
+        select = person.select("name").cached(ttl=0)
+        assert len(select.execute().fetchall()) == 2
+        assert len(result_cache) == 1
+        assert select.execute().fetchone() == ("Alice",)
+    assert result_cache.stats()["hits"] == 2
+
+    # A transaction always sees its own writes, even if another one
+    # caches the result meanwhile
+    writer, reader = Transaction(dsn), Transaction(dsn)
+    try:
+        person.upsert("name", trn=writer).execute("Dave")
+        select = person.select("name").where("(= name 'Dave')").cached()
+        size = len(result_cache)
+        assert select.clone(trn=reader).execute().fetchall() == []
+        assert len(result_cache) == size + 1
+        assert select.clone(trn=writer).execute().fetchall() == [("Dave",)]
+    finally:
+        writer.rollback()
+        reader.rollback()
+
+    # Entries are evicted once the budget is exceeded
+    rows = (("a", 1),) * 10
+    cache = ResultCache(max_bytes=2 * sizeof(rows))
+    cache.set("a", rows, ["x"])
+    cache.set("b", rows, ["y"])
+    assert cache.get("a") == rows
+    cache.set("c", rows, ["y"])
+    assert "b" not in cache
+    cache.invalidate("y")
+    assert list(cache.data) == ["a"]
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["invalidations"] == 1
+    assert stats["bytes"] == sizeof(rows)
+
+    # Results read before an invalidation are not stored
+    generation = cache.generation(["x", "y"])
+    cache.invalidate("y")
+    cache.set("d", rows, ["x", "y"], generation=generation)
+    assert "d" not in cache
+    cache.set("d", rows, ["x", "y"], generation=cache.generation(["y", "x"]))
+    assert "d" in cache
+
+
 def test_distinct_on(transaction, person):
     if transaction.flavor != "postgresql":
         pytest.skip("Disctinct on is only supported by PostgreSQL")
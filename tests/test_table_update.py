@@ -134,7 +134,7 @@ def test_from_pandas(transaction, kitchensink):
             2,
             2.0,
             2,
-            "1970-01-02",
+            "1970-01-02 00:00:00",
             "1970-01-02 00:00:00+00:00",
             0,
             "1970-01-02",
@@ -1,9 +1,11 @@
 from datetime import datetime
 
+import numpy
 import pytest
 
+from nagra import Schema
 from nagra.utils import strip_lines
-from nagra.exceptions import UnresolvedFK, ValidationError
+from nagra.exceptions import IncorrectSchema, UnresolvedFK, ValidationError
 
 
 def test_simple_upsert_stm(person):
@@ -179,6 +181,38 @@ def test_many_upsert(cacheable_transaction, person):
     assert len(rows) == 4
 
 
+def test_execute_columns(cacheable_transaction, person):
+    upsert = person.upsert("name")
+    upsert.execute_columns({"name": ["Big Alice", "Big Bob"]})
+
+    upsert = person.upsert("name", "parent.name")
+    ids = upsert.execute_columns(
+        {
+            "name": ("Alice", "Bob"),
+            "parent.name": numpy.array(["Big Alice", "Big Bob"]),
+        }
+    )
+    assert len(ids) == 2
+    rows = list(person.select("name", "parent.name").orderby("name"))
+    assert rows == [
+        ("Alice", "Big Alice"),
+        ("Big Alice", None),
+        ("Big Bob", None),
+        ("Bob", "Big Bob"),
+    ]
+
+    # Empty columns
+    assert upsert.execute_columns({"name": [], "parent.name": []}) == []
+
+    # Missing column
+    with pytest.raises(ValidationError):
+        upsert.execute_columns({"name": ["Charly"]})
+
+    # Length mismatch
+    with pytest.raises(ValidationError):
+        upsert.execute_columns({"name": ["Charly"], "parent.name": []})
+
+
 def test_dbl_fk_upsert(cacheable_transaction, person):
     # GP
     upsert = person.upsert("name")
@@ -264,6 +298,21 @@ def test_resolve(cacheable_transaction, person):
     ids = list(upsert.resolve("parent", values))
     assert ids == [1, 2]
 
+    # Values are resolved in one batch
+    values = [("Big Bob",), ("Big Alice",), ("Big Bob",), (None,), ("Nope",)]
+    assert upsert._resolve_batch("parent", values) == {
+        ("Big Alice",): 1,
+        ("Big Bob",): 2,
+    }
+    upsert = person.upsert("name", "parent.name", lenient=True)
+    assert list(upsert.resolve("parent", [v for v, in values])) == [
+        2,
+        1,
+        2,
+        None,
+        None,
+    ]
+
 
 def test_return_ids(cacheable_transaction, person):
     # Create an "on conflict update" upsert
@@ -448,6 +497,55 @@ def test_from_dict(transaction, person):
     ]
 
 
+def test_from_objects(transaction, person):
+    upsert = person.upsert("name", "parent.name")
+    upsert.execute("Big Bob", None)
+    upsert.execute("Bob", "Big Bob")
+
+    # Flat dataclass
+    select = person.select("name", "parent.name").orderby("id")
+    Person = select.to_dataclass()
+    upsert.from_objects([Person(name="Alice", parent_name="Bob")])
+
+    # Nested dataclass
+    NestedPerson = select.to_dataclass(nest=True)
+    Parent = NestedPerson.__dataclass_fields__["parent"].type.__args__[0]
+    upsert.from_objects(
+        [
+            NestedPerson(name="Charly", parent=Parent(name="Alice")),
+            NestedPerson(name="Dan", parent=None),
+        ]
+    )
+    records = list(select)
+    assert records == [
+        ("Big Bob", None),
+        ("Bob", "Big Bob"),
+        ("Alice", "Bob"),
+        ("Charly", "Alice"),
+        ("Dan", None),
+    ]
+    # One extractor per class
+    assert len(upsert._extractors) == 2
+
+
+def test_from_dict_extractors(transaction, person):
+    upsert = person.upsert("name", "parent.name")
+    upsert.from_dict([{"name": "Big Bob", "parent_name": None}])
+    upsert.from_dict(
+        [
+            {"name": "Bob", "parent.name": "Big Bob"},
+            {"name": "Alice", "parent.name": "Big Bob"},
+        ]
+    )
+    # One extractor per key shape
+    assert sorted(upsert._extractors) == [
+        ("name", "parent.name"),
+        ("name", "parent_name"),
+    ]
+    with pytest.raises(KeyError):
+        upsert.from_dict([{"name": "Charly"}])
+
+
 def test_nk_less_table(transaction, value):
     # Simple insert
     upsert = value.insert("value")
@@ -464,3 +562,112 @@ def test_nk_less_table(transaction, value):
     with pytest.raises(ValidationError):
         upsert.execute(1)
     # return
+
+
+rollup_toml = """
+[rl_sensor]
+natural_key = ["name"]
+[rl_sensor.columns]
+name = "varchar"
+
+[rl_measure]
+natural_key = ["sensor", "step"]
+[rl_measure.columns]
+sensor = "bigint"
+step = "int"
+value = "int"
+[rl_measure.foreign_keys]
+sensor = "rl_sensor"
+[rl_measure.rollups.rl_measure_by_ten]
+groupby = {sensor = "sensor", bucket = "(/ step 10)"}
+aggregates = {total = "(sum value)", nb = "(count *)", top = "(max value)"}
+"""
+
+
+def test_rollup(empty_transaction):
+    schema = Schema.from_toml(rollup_toml)
+    measure = schema.get("rl_measure")
+    rollup = measure.rollups["rl_measure_by_ten"]
+    target = schema.get("rl_measure_by_ten")
+    assert rollup.target is target
+    assert target.natural_key == ["sensor", "bucket"]
+    assert target.foreign_keys == {"sensor": "rl_sensor"}
+    schema.create_tables(empty_transaction)
+
+    schema.get("rl_sensor").upsert("name").executemany([("a",), ("b",)])
+    upsert = measure.upsert("sensor.name", "step", "value")
+    upsert.executemany([("a", i, i) for i in range(25)] + [("b", 1, 100)])
+    select = target.select("sensor.name", "bucket", "total", "nb", "top").orderby(
+        "sensor.name", "bucket"
+    )
+    assert list(select) == [
+        ("a", 0, 45, 10, 9),
+        ("a", 1, 145, 10, 19),
+        ("a", 2, 110, 5, 24),
+        ("b", 0, 100, 1, 100),
+    ]
+
+    # Only the touched buckets are recomputed
+    upsert.executemany([("a", 24, 0), ("a", 30, 1)])
+    measure.update("sensor.name", "step", "value").execute("b", 1, 10)
+    assert list(select) == [
+        ("a", 0, 45, 10, 9),
+        ("a", 1, 145, 10, 19),
+        ("a", 2, 86, 5, 23),
+        ("a", 3, 1, 1, 1),
+        ("b", 0, 10, 1, 10),
+    ]
+
+    # Deletes are handled by a full refresh
+    measure.delete().where("(>= step 20)").execute()
+    rollup.refresh()
+    assert [row[:2] for row in select] == [("a", 0), ("a", 1), ("b", 0)]
+
+
+def test_rollup_moved_row(empty_transaction):
+    schema = Schema.from_toml(rollup_toml)
+    measure = schema.get("rl_measure")
+    target = schema.get("rl_measure_by_ten")
+    schema.create_tables(empty_transaction)
+    schema.get("rl_sensor").upsert("name").executemany([("a",), ("b",)])
+    ids = measure.upsert("sensor.name", "step", "value").executemany(
+        [("a", 1, 1), ("a", 2, 2), ("a", 15, 3)]
+    )
+    select = target.select("sensor.name", "bucket", "total").orderby(
+        "sensor.name", "bucket"
+    )
+    assert list(select) == [("a", 0, 3), ("a", 1, 3)]
+
+    # Update by primary key moving a row to another bucket
+    update = measure.update("id", "step")
+    update.execute(ids[0], 12)
+    assert list(select) == [("a", 0, 2), ("a", 1, 4)]
+    # The last row of a bucket leaves it, the bucket is removed
+    update.execute(ids[1], 13)
+    assert list(select) == [("a", 1, 6)]
+    measure.update("id", "sensor.name").execute(ids[2], "b")
+    assert list(select) == [("a", 1, 3), ("b", 1, 3)]
+
+    # Rollups are part of the generated toml
+    toml = schema.generate_toml()
+    assert "[rl_measure.rollups.rl_measure_by_ten]" in toml
+    assert "[rl_measure_by_ten]" not in toml
+    rollup = Schema.from_toml(toml).get("rl_measure").rollups["rl_measure_by_ten"]
+    assert rollup.groupby == {"sensor": "sensor", "bucket": "(/ step 10)"}
+
+
+def test_rollup_on_nullable_expression():
+    # The chain goes through a nullable foreign key
+    toml = rollup_toml.replace('sensor = "sensor", ', 'sensor = "sensor.parent.name", ')
+    toml = toml.replace(
+        'name = "varchar"',
+        'name = "varchar"\nparent = "bigint"\n[rl_sensor.foreign_keys]\nparent = "rl_sensor"',
+    )
+    with pytest.raises(IncorrectSchema):
+        Schema.from_toml(toml)
+
+
+def test_rollup_on_non_key_column():
+    toml = rollup_toml.replace('"(/ step 10)"', '"(/ value 10)"')
+    with pytest.raises(IncorrectSchema):
+        Schema.from_toml(toml)
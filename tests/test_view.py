@@ -1,6 +1,35 @@
+import pytest
+
 from nagra import View
+from nagra.exceptions import ValidationError
 from nagra.schema import Schema
 
+materialized_toml = """
+[mv_country]
+natural_key = ["name"]
+[mv_country.columns]
+name = "varchar"
+[mv_country.one2many]
+populations = "mv_population.country"
+
+[mv_population]
+natural_key = ["country", "year"]
+[mv_population.columns]
+country = "bigint"
+year = "int"
+value = "int"
+[mv_population.foreign_keys]
+country = "mv_country"
+
+[mv_max_pop]
+view_select = "mv_country"
+materialized = true
+natural_key = ["country"]
+[mv_max_pop.view_columns]
+country = "name"
+max = "(max populations.value)"
+"""
+
 
 def test_select_views(transaction, country, population, max_pop, min_pop):
     country.upsert("name").executemany(
@@ -47,3 +76,85 @@ def test_select_views(transaction, country, population, max_pop, min_pop):
 
 def test_get_view(min_pop, schema: Schema):
     assert min_pop == View.get("min_pop", schema=schema)
+
+
+def test_materialized_view(empty_transaction):
+    schema = Schema.from_toml(materialized_toml)
+    view = schema.get("mv_max_pop")
+    assert view.materialized
+    assert "materialized = true" in schema.generate_toml()
+
+    stmts = list(schema.setup_statements(trn=empty_transaction))
+    if empty_transaction.flavor == "postgresql":
+        assert 'CREATE MATERIALIZED VIEW IF NOT EXISTS "mv_max_pop" AS' in stmts[-2]
+    assert "mv_max_pop_idx" in stmts[-1]
+
+    # Creation is idempotent
+    schema.create_tables(empty_transaction)
+    schema.create_tables(empty_transaction)
+
+    country = schema.get("mv_country")
+    population = schema.get("mv_population")
+    country.upsert("name").executemany([("Belgium",), ("Netherlands",)])
+    population.upsert("country.name", "year", "value").executemany(
+        [
+            ("Belgium", 1970, 10),
+            ("Belgium", 1971, 11),
+            ("Netherlands", 1970, 12),
+        ]
+    )
+    # The view was computed on creation, it is updated on refresh
+    select = view.select().orderby("country")
+    assert list(select) == []
+    view.refresh()
+    assert list(select) == [("Belgium", 11), ("Netherlands", 12)]
+
+    population.upsert("country.name", "year", "value").execute("Netherlands", 1971, 14)
+    view.refresh(concurrently=True)
+    assert list(select) == [("Belgium", 11), ("Netherlands", 14)]
+
+
+def test_view_definition_change(empty_transaction):
+    schema = Schema.from_toml(materialized_toml)
+    schema.create_tables(empty_transaction)
+    schema.get("mv_country").upsert("name").execute("Belgium")
+    population = schema.get("mv_population")
+    population.upsert("country.name", "year", "value").executemany(
+        [("Belgium", 1970, 10), ("Belgium", 1971, 11)]
+    )
+    schema.get("mv_max_pop").refresh()
+
+    # A new definition is applied
+    changed = Schema.from_toml(materialized_toml.replace("(max ", "(min "))
+    changed.create_tables(empty_transaction)
+    view = changed.get("mv_max_pop")
+    view.refresh()
+    assert list(view.select()) == [("Belgium", 10)]
+
+    # The view is no longer materialized
+    plain_toml = materialized_toml.replace("(max ", "(min ")
+    plain = Schema.from_toml(plain_toml.replace("materialized = true", ""))
+    plain.create_tables(empty_transaction)
+    assert list(plain.get("mv_max_pop").select()) == [("Belgium", 10)]
+    population.upsert("country.name", "year", "value").execute("Belgium", 1969, 9)
+    assert list(plain.get("mv_max_pop").select()) == [("Belgium", 9)]
+
+    # And materialized again, with its unique index
+    stmts = list(schema.setup_statements(trn=empty_transaction))
+    assert 'DROP VIEW IF EXISTS "mv_max_pop"' in " ".join(stmts)
+    assert "mv_max_pop_idx" in stmts[-1]
+    schema.create_tables(empty_transaction)
+    view = schema.get("mv_max_pop")
+    view.refresh()
+    assert list(view.select()) == [("Belgium", 11)]
+
+
+def test_refresh_errors(min_pop):
+    with pytest.raises(ValidationError):
+        min_pop.refresh()
+
+    schema = Schema.from_toml(materialized_toml)
+    view = schema.get("mv_max_pop")
+    view.table.natural_key = []
+    with pytest.raises(ValidationError):
+        view.refresh(concurrently=True)